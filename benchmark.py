@@ -0,0 +1,117 @@
+# File: benchmark.py
+"""
+Benchmark the API handlers with unweighted and survey-weighted estimates, and the
+throughput of the in-memory React app routes.
+
+Usage: python benchmark.py [--data PATH] [--repeat N] [--spa-requests N]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import main
+
+# (label, handler, query parameters) for every dashboard endpoint
+CASES = [
+    ('expenditure-overview', main.get_expenditure_overview, {}),
+    ('expenditure-overview?state=Kerala', main.get_expenditure_overview, {'state': 'Kerala'}),
+    ('rural-urban-comparison', main.get_rural_urban_comparison, {}),
+    ('household-type-comparison', main.get_household_type_comparison, {}),
+    ('digital-inclusion', main.get_digital_inclusion, {}),
+    ('essential-services', main.get_essential_services, {}),
+    ('essential-services?state=Kerala', main.get_essential_services, {'state': 'Kerala'}),
+    ('govt-programs', main.get_govt_programs, {}),
+    ('govt-programs?state=Kerala', main.get_govt_programs, {'state': 'Kerala'}),
+    ('household-size-analysis', main.get_household_size_analysis, {}),
+]
+
+def time_handler(loop, handler, params, repeat):
+    """Median wall time of a handler call in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        # Time the computation, not cached response sections
+        main.app.state.cache = {}
+        start = time.perf_counter()
+        loop.run_until_complete(handler(**params))
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+# React app routes timed: the shell and a client-side route, plus a content-hashed asset when built
+SPA_PATHS = ['/', '/states/kerala']
+
+async def asgi_get(path, headers=()):
+    """Status of one GET request driven straight through the ASGI app"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'headers': list(headers), 'client': ('127.0.0.1', 0), 'server': ('localhost', 80)
+    }
+    received = []
+    statuses = []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Never disconnect; listeners are cancelled once the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await main.app(scope, receive, send)
+    return statuses[0]
+
+def spa_throughput(loop, path, requests, headers=()):
+    """Requests per second for a React app route, and the response status"""
+    status = loop.run_until_complete(asgi_get(path, headers))
+    start = time.perf_counter()
+    for _ in range(requests):
+        loop.run_until_complete(asgi_get(path, headers))
+    return requests / (time.perf_counter() - start), status
+
+def run_spa(loop, requests):
+    if not main.SPA_FILES:
+        print(f"\nNo React build in {main.BUILD_DIR}, skipping the SPA benchmark")
+        return
+    assets = [path for path in main.SPA_FILES if main.HASHED_ASSET.search(path)]
+    paths = SPA_PATHS + ['/' + max(assets, key=len)] if assets else SPA_PATHS
+    print(f"\n{'route':<48}{'status':>8}{'req/s':>10}{'revalidated req/s':>20}")
+    for path in paths:
+        rate, status = spa_throughput(loop, path, requests)
+        asset = main.SPA_FILES.get(path.lstrip('/')) or main.SPA_FILES['index.html']
+        etag = (b'if-none-match', asset['headers']['ETag'].encode())
+        revalidated, _ = spa_throughput(loop, path, requests, [etag])
+        print(f"{path:<48}{status:>8}{rate:>10.0f}{revalidated:>20.0f}")
+
+def run(data_path, repeat, spa_requests):
+    # Time the computations and the load, not result store hits or checkpoints
+    main.RESULT_STORE_PATH = ''
+    main.CHECKPOINT_DIR = ''
+    start = time.perf_counter()
+    main.append_round(main.DEFAULT_ROUND, data_path)
+    print(f"Loaded {len(main.app.state.df):,} rows in {time.perf_counter() - start:.2f}s\n")
+
+    loop = asyncio.new_event_loop()
+    print(f"{'endpoint':<36}{'unweighted ms':>15}{'weighted ms':>13}{'ratio':>8}")
+    for label, handler, params in CASES:
+        # Called directly, so no household filters are resolved from the query
+        params = {**params, 'filters': ()}
+        # Warm up once so lazily derived columns are not counted
+        loop.run_until_complete(handler(**params))
+        unweighted = time_handler(loop, handler, {**params, 'weighted': False}, repeat)
+        weighted = time_handler(loop, handler, {**params, 'weighted': True}, repeat)
+        print(f"{label:<36}{unweighted:>15.1f}{weighted:>13.1f}{weighted / unweighted:>8.2f}")
+    run_spa(loop, spa_requests)
+    loop.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default=main.DATA_PATH, help="Path to the standardized survey CSV")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed calls per endpoint and mode")
+    parser.add_argument('--spa-requests', type=int, default=2000, help="Timed requests per React app route")
+    args = parser.parse_args()
+    run(args.data, args.repeat, args.spa_requests)
@@ -0,0 +1,174 @@
+# File: loadtest.py
+"""
+Replay dashboard traffic against the API and check latency SLOs.
+
+Virtual users open the app (page shell, India map and state list), then move
+between dashboard pages and switch states the way the React pages fetch them.
+Runs the app in-process by default, or against a running server with --url.
+Exits with status 1 when an SLO is breached.
+
+Usage: python loadtest.py [--url URL] [--data PATH] [--users N] [--duration SECONDS]
+                          [--seed N] [--slo ROUTE:pNN=MS ...] [--max-error-rate RATE]
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+import httpx
+import numpy as np
+
+import main
+
+# (weight, page, requests) of a page visit; '{state}' is a state picked by the user,
+# and page state switches go through the same routes with a new state
+PAGE_VISITS = [
+    (30, 'LandingPage', ['/api/expenditure-overview?state={state}']),
+    (20, 'EssentialServices', ['/api/essential-services?state={state}']),
+    (20, 'GovtPrograms', ['/api/govt-programs?state={state}']),
+    (8, 'LandingPage (All India)', ['/api/expenditure-overview']),
+    (8, 'DigitalInclusion', ['/api/digital-inclusion']),
+    (7, 'RuralUrbanComparison', ['/api/rural-urban-comparison']),
+    (7, 'HouseholdTypeComparison', ['/api/household-type-comparison'])
+]
+
+# Requests made once per user when the app is opened; the static ones are skipped
+# when the server has no React build to serve
+APP_OPEN = ['/', '/india.topo.json', '/api/states']
+STATIC_PATHS = {'/', '/india.topo.json'}
+
+# Default SLOs in milliseconds per route, '*' for every route
+DEFAULT_SLOS = {'*': {'p95': 500, 'p99': 1000}}
+
+def route_of(template):
+    """Route label a request is reported under: its path, with the state parameter elided"""
+    return template.replace('{state}', '*')
+
+async def wait_until_ready(client, timeout=600):
+    """Wait for /readyz, so the data load is not counted"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get('/readyz')).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    sys.exit(f"Server not ready after {timeout}s")
+
+async def react_app_built(client):
+    """Whether the server serves a React build, rather than its "not built yet" placeholder"""
+    response = await client.get('/')
+    return response.status_code == 200 and not response.headers.get('content-type', '').startswith('application/json')
+
+async def virtual_user(client, rng, states, deadline, samples, app_open):
+    """Open the app, then visit pages until the deadline, recording (route, status, seconds)"""
+    async def get(template, state=None):
+        start = time.perf_counter()
+        try:
+            status = (await client.get(template.format(state=state))).status_code
+        except httpx.TransportError:
+            status = 0
+        samples.append((route_of(template), status, time.perf_counter() - start))
+
+    for path in app_open:
+        await get(path)
+    weights = [weight for weight, _, _ in PAGE_VISITS]
+    while time.monotonic() < deadline:
+        _, _, requests = rng.choices(PAGE_VISITS, weights)[0]
+        state = rng.choice(states)
+        for template in requests:
+            await get(template, state)
+
+def parse_slo(text):
+    """ROUTE:pNN=MS, e.g. /api/govt-programs?state=*:p95=200, or pNN=MS for every route"""
+    route, _, bound = text.rpartition(':')
+    percentile, _, limit = bound.partition('=')
+    try:
+        limit = float(limit)
+    except ValueError:
+        limit = None
+    if not percentile.startswith('p') or not percentile[1:].isdigit() or limit is None:
+        raise argparse.ArgumentTypeError(f"Invalid SLO {text!r}, expected ROUTE:pNN=MS or pNN=MS")
+    return route or '*', percentile, limit
+
+def report(samples, elapsed, slos, max_error_rate):
+    """Print throughput and latency percentiles per route and return the SLO breaches"""
+    routes = sorted({route for route, _, _ in samples})
+    percentiles = sorted({percentile for bounds in slos.values() for percentile in bounds} | {'p50', 'p95', 'p99'},
+                         key=lambda p: int(p[1:]))
+    print(f"\n{'route':<44}{'requests':>9}{'errors':>8}{'req/s':>9}"
+          + ''.join(f"{p + ' ms':>10}" for p in percentiles))
+    breaches = []
+    for route in routes + ['all']:
+        selected = [(status, seconds) for r, status, seconds in samples if route in ('all', r)]
+        errors = sum(1 for status, _ in selected if not 200 <= status < 400)
+        values = dict(zip(percentiles, np.percentile([seconds * 1000 for _, seconds in selected],
+                                                     [int(p[1:]) for p in percentiles])))
+        print(f"{route:<44}{len(selected):>9}{errors:>8}{len(selected) / elapsed:>9.1f}"
+              + ''.join(f"{values[p]:>10.1f}" for p in percentiles))
+        if route == 'all':
+            if errors / len(selected) > max_error_rate:
+                breaches.append(f"error rate {errors / len(selected):.2%} > {max_error_rate:.2%}")
+            continue
+        for percentile, limit in {**slos.get('*', {}), **slos.get(route, {})}.items():
+            if values[percentile] > limit:
+                breaches.append(f"{route} {percentile} {values[percentile]:.1f} ms > {limit:g} ms")
+    return breaches
+
+async def run(args, slos):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        # Measure the computations, not a result store or checkpoint left by an earlier run
+        main.RESULT_STORE_PATH = ''
+        main.CHECKPOINT_DIR = ''
+        main.DATA_PATH = args.data
+        await main.app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://loadtest', timeout=60)
+    try:
+        await wait_until_ready(client)
+        states = (await client.get('/api/states')).json()['states']
+        app_open = APP_OPEN
+        if not await react_app_built(client):
+            print("No React build served, skipping the static page and map fetches")
+            app_open = [path for path in APP_OPEN if path not in STATIC_PATHS]
+        rng = random.Random(args.seed)
+        samples = []
+        print(f"Replaying dashboard traffic: {args.users} users for {args.duration:g}s "
+              f"against {args.url or 'the app in-process'}")
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*[
+            virtual_user(client, random.Random(rng.random()), states, deadline, samples, app_open)
+            for _ in range(args.users)
+        ])
+        elapsed = time.monotonic() - start
+    finally:
+        await client.aclose()
+        if not args.url:
+            await main.app.router.shutdown()
+    return report(samples, elapsed, slos, args.max_error_rate)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8000 (default: in-process)")
+    parser.add_argument('--data', default=main.DATA_PATH, help="Path to the standardized survey CSV (in-process only)")
+    parser.add_argument('--users', type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of traffic to replay")
+    parser.add_argument('--seed', type=int, default=2023, help="Seed of the traffic mix")
+    parser.add_argument('--slo', type=parse_slo, action='append', default=[],
+                        help="Latency SLO as ROUTE:pNN=MS or pNN=MS for every route; repeatable")
+    parser.add_argument('--max-error-rate', type=float, default=0.0, help="Largest allowed share of failed requests")
+    args = parser.parse_args()
+
+    slos = {route: dict(bounds) for route, bounds in DEFAULT_SLOS.items()}
+    for route, percentile, limit in args.slo:
+        slos.setdefault(route, {})[percentile] = limit
+    breaches = asyncio.run(run(args, slos))
+    if breaches:
+        print("\nSLO breached:\n  " + "\n  ".join(breaches))
+        sys.exit(1)
+    print("\nAll SLOs met")
@@ -1,18 +1,467 @@
 # File: main.py
 
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Depends, Query, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import os
 import pandas as pd
 import numpy as np
 from typing import List, Optional
-import os
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import contextvars
+import functools
+import hashlib
+import heapq
+import io
+import json
 import math
+import mimetypes
+import mmap
+import multiprocessing
+import pickle
+import re
+import shutil
+import sqlite3
+import statistics
+import threading
+import time
+import warnings
+import zlib
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow output is optional
+    pa = None
+
+# Location of the standardized survey file
+DATA_PATH = os.environ.get("HCES_DATA_PATH", "data/hces_data_standardized.csv")
+SAMPLE_DATA_PATH = "data/sample_hces_data.csv"
+
+# Survey rounds: DATA_PATH holds DEFAULT_ROUND, and further rounds are read from
+# ROUNDS_DIR/<round>.csv (e.g. data/rounds/2023-24.csv) as separate partitions
+DEFAULT_ROUND = os.environ.get("HCES_DEFAULT_ROUND", "2022-23")
+ROUNDS_DIR = os.environ.get("HCES_ROUNDS_DIR", "data/rounds")
+
+# Household multiplier column used for survey-weighted estimates (weighted=true)
+WEIGHT_COLUMN = os.environ.get("HCES_WEIGHT_COLUMN", "multiplier")
+
+FOOD_COLUMNS = [
+    'cereals_monthly_total_value', 'pulses_monthly_total_value',
+    'milk_products_monthly_total_value', 'edible_oils_monthly_total_value',
+    'egg_fish_meat_monthly_total_value', 'vegetables_monthly_total_value',
+    'fruits_fresh_monthly_total_value', 'fruits_dry_monthly_total_value',
+    'spices_monthly_total_value', 'salt_sugar_monthly_total_value',
+    'beverages_monthly_total_value'
+]
+
+# Metrics precomputed per round and state x sector cell for /api/trends
+TREND_METRICS = [
+    'household_reported_monthly_exp', 'food_monthly_value',
+    'has_electricity', 'has_piped_water', 'has_toilet',
+    'has_internet', 'has_mobile', 'has_laptop',
+    'has_pmgky', 'is_hhmem_pmjay', 'receieved_subsidy_lpg', 'received_free_electricity'
+]
+
+# Metrics with presorted per-state rankings, built at load time for /api/rankings
+# and the top/bottom state lists
+RANKING_METRICS = TREND_METRICS
+
+# Spending categories of the household size analysis: response column -> summed columns
+SIZE_CATEGORIES = {
+    'foodShare': ['food_monthly_value'],
+    'fuelLightShare': ['fuel_light_monthly_value'],
+    'housingShare': ['rent_monthly_value', 'imputed_rent_monthly_value'],
+    'clothingFootwearShare': ['clothing_monthly_value', 'footwear_monthly_value'],
+    'healthcareShare': ['medical_hospitalisation_monthly_value', 'medical_non_hospitalisation_monthly_value'],
+    'transportShare': ['conveyance_monthly_value'],
+    'entertainmentShare': ['entertainment_monthly_value']
+}
+
+# Metrics with per-group presorted arrays, built at load time for /api/distribution;
+# per_capita_monthly_exp is household expenditure over household size
+DISTRIBUTION_METRICS = ['household_reported_monthly_exp', 'per_capita_monthly_exp']
+DISTRIBUTION_GROUPINGS = {'all': [], 'state': ['state'], 'sector': ['sector'], 'state_sector': ['state', 'sector']}
+
+# Variables of /api/regression, with means and co-moment matrices per state x sector
+# cell built at load time over the households that have all of them
+REGRESSION_VARIABLES = [
+    'household_reported_monthly_exp', 'avg_edu_years', 'hh_size',
+    'has_electricity', 'has_piped_water', 'has_toilet', 'has_internet', 'has_mobile',
+    'has_pmgky', 'is_hhmem_pmjay', 'receieved_subsidy_lpg', 'received_free_electricity'
+]
+
+# Union Territories, excluded from rankings with exclude_uts
+UNION_TERRITORIES = [
+    'Chandigarh', 'Puducherry', 'Andaman and Nicobar Islands', 'Lakshadweep',
+    'Dadra and Nagar Haveli', 'Daman and Diu', 'Delhi', 'Ladakh', 
+    'Jammu & Kashmir', 'Andaman and Nicobar'
+]
+
+# Column projection: only the columns the endpoints declare (ENDPOINT_COLUMNS, built
+# after the endpoints), plus WEIGHT_COLUMN, are read at load time; others are loaded on
+# first access by load_columns. Set HCES_PROJECT_COLUMNS=0 to read all.
+# Columns made at load time and the raw survey columns they are made from
+DERIVED_COLUMNS = {
+    'food_monthly_value': FOOD_COLUMNS,
+    'has_electricity': ['source_lighting'],
+    'has_piped_water': ['source_water'],
+    'has_toilet': ['level_access_latrine'],
+    'social_group': ['caste']
+}
+PROJECT_COLUMNS = os.environ.get("HCES_PROJECT_COLUMNS", "1") != "0"
+# Rows sampled to estimate the memory the skipped columns would have taken
+PROJECTION_SAMPLE_ROWS = 1000
+
+# Columns the endpoints group by; stored as categoricals so grouped reductions
+# reuse the integer codes instead of hashing strings on every request
+GROUP_COLUMNS = ['state', 'sector', 'hh_type', 'social_group', 'type_rationcard', 'source_cooking']
+
+# Ingest validation, checked column by column on the raw survey file. Rows breaking a
+# rule are quarantined: left out of the round and written to QUARANTINE_DIR/<round>.csv
+# ("" disables the file). Missing required columns, a numeric column without a single
+# number, or more than QUARANTINE_MAX_SHARE of the rows quarantined fail the load.
+REQUIRED_COLUMNS = ['state', 'sector', 'household_reported_monthly_exp']
+# Numeric columns (entries starting with '*' match a suffix) and their range; zero
+# expenditure would make every expenditure share infinite
+NUMERIC_RULES = {
+    'household_reported_monthly_exp': 'positive',
+    'hh_size': 'positive',
+    WEIGHT_COLUMN: 'positive',
+    '*_monthly_value': 'non_negative',
+    '*_monthly_total_value': 'non_negative',
+    'total_online_expenditure': 'non_negative',
+    'avg_edu_years': 'non_negative'
+}
+# Allowed values of category columns; has_*/is_* flags must be 0 or 1
+CATEGORY_VALUES = {'sector': ['Rural', 'Urban']}
+QUARANTINE_DIR = os.environ.get("HCES_QUARANTINE_DIR", "data/quarantine")
+QUARANTINE_MAX_SHARE = 0.5
+
+# Poisson bootstrap settings for optional confidence intervals (ci=true)
+BOOTSTRAP_REPLICATES = int(os.environ.get("HCES_BOOTSTRAP_REPLICATES", "200"))
+BOOTSTRAP_SEED = 2023
+# Upper bound on resampling-weight matrix cells (replicates x rows) per generation block
+BOOTSTRAP_BATCH_CELLS = 4_000_000
+# Households are resampled within state x sector cells; every interval is built from cell sums
+BOOTSTRAP_STRATA = ['state', 'sector']
+
+# Approximate mode (approx=true): nested samples of these fractions of every state x
+# sector stratum, built at load time and tried smallest first until the error target
+# is met; every stratum keeps at least APPROX_MIN_STRATUM_ROWS households (or all of them)
+APPROX_SAMPLE_FRACTIONS = [0.01, 0.04, 0.16]
+APPROX_MIN_STRATUM_ROWS = 10
+APPROX_SEED = 2023
+
+# Microdata export (/api/export): rows serialised per streamed chunk, and media types
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Response formats negotiated from the Accept header of dashboard requests: row-dict
+# JSON (default), column-oriented JSON, or an Arrow IPC stream
+ARROW_STREAM_TYPE = 'application/vnd.apache.arrow.stream'
+COLUMNAR_JSON_TYPE = 'application/vnd.hces.columnar+json'
+response_format = contextvars.ContextVar('response_format', default='json')
+
+# Shard processes the household table is partitioned across by state (0: one process)
+SHARDS = int(os.environ.get("HCES_SHARDS", "0"))
+# Rows per chunk when a shard reads a round file and keeps the households of its states
+SHARD_LOAD_CHUNK_ROWS = 200_000
+
+# Result store shared by the uvicorn workers and kept across restarts ("" disables it)
+RESULT_STORE_PATH = os.environ.get("HCES_RESULT_STORE", "data/result_store.sqlite")
+RESULT_STORE_MAX_BYTES = int(os.environ.get("HCES_RESULT_STORE_MAX_MB", "256")) * 2**20
+# Last-used times are refreshed at most this often, so hits rarely write
+RESULT_STORE_TOUCH_SECONDS = 60
+# Stored responses are only reused by the code that rendered them
+with open(__file__, 'rb') as source:
+    CODE_VERSION = hashlib.sha256(source.read()).hexdigest()[:16]
+
+# Prepared round partitions saved once the server is ready and memory-mapped back on
+# the next boot while the data file's content is unchanged ("" disables them)
+CHECKPOINT_DIR = os.environ.get("HCES_CHECKPOINT_DIR", "data/checkpoints")
+# Arrays at least this large are stored raw and memory-mapped instead of unpickled
+CHECKPOINT_MMAP_BYTES = 64 * 2**10
+# Cached state built by warm_caches that is saved with a round's checkpoint
+CHECKPOINT_CACHE_KEYS = ('bootstrap_strata', 'bootstrap_resamples')
+
+# React build served from memory; content-hashed assets are cached by browsers for a year
+BUILD_DIR = os.environ.get("HCES_BUILD_DIR", "build")
+HASHED_ASSET = re.compile(r'\.[0-9a-f]{8,}\.')
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+# Phases of the background data load reported by /readyz
+STARTUP_PHASES = (['shards'] if SHARDS else []) + ['load', 'rounds', 'caches']
+# Seconds clients are asked to wait (Retry-After) while the data is loading
+RETRY_AFTER_SECONDS = 5
+
+# Admission control of /api requests. A request's cost is estimated from the last
+# service time of the same query or else a moving average of its route's; requests
+# expected to take under ADMISSION_CHEAP_SECONDS (cheap routes, queries answered from
+# the result store) skip the queue. Others run within the global and per-route
+# concurrency budgets and wait cheapest first; they are shed with 429 beyond
+# ADMISSION_ROUTE_MAX_QUEUE waiting on their route, and with 503 when they would
+# wait longer than ADMISSION_MAX_WAIT_SECONDS. A request identical to one already
+# admitted or queued takes no slots: it waits for that one's admission and then shares
+# its computation (single_flight).
+# Slots are held until the response starts, not while its body is sent.
+# The global budget allows one request per compute thread to wait in the executor's
+# queue, so the threads stay busy while the event loop sends the previous responses;
+# more would wait there unseen by the scheduler. A route gets one request per thread,
+# so a burst on a heavy route always leaves slots for the others.
+COMPUTE_THREADS = 1
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("HCES_MAX_CONCURRENT", str(2 * COMPUTE_THREADS)))
+ADMISSION_ROUTE_MAX_CONCURRENT = int(os.environ.get("HCES_ROUTE_MAX_CONCURRENT", str(COMPUTE_THREADS)))
+ADMISSION_ROUTE_MAX_QUEUE = int(os.environ.get("HCES_ROUTE_MAX_QUEUE", "32"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get("HCES_MAX_WAIT_SECONDS", "10"))
+ADMISSION_CHEAP_SECONDS = 0.01
+# Cost of a route before it has been timed, and the weight of each new timing
+ADMISSION_DEFAULT_COST = 0.1
+ADMISSION_COST_SMOOTHING = 0.2
+# Queries whose last service time is remembered
+ADMISSION_QUERY_MEMORY = 4096
 
 app = FastAPI(title="HCES Data Visualization API")
 
+# Plain ASGI middleware: per-request overhead matters for the React app routes,
+# which pass through here on every page load
+
+class ReadinessGate:
+    """Hold /api requests until the background data load has finished"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith('/api/'):
+            readiness = getattr(app.state, 'readiness', {'status': 'starting'})
+            if readiness['status'] == 'failed':
+                response = JSONResponse(status_code=503, content={"detail": readiness.get('error', "Data not loaded")})
+                return await response(scope, receive, send)
+            if readiness['status'] != 'ready':
+                response = JSONResponse(
+                    status_code=503,
+                    content={"detail": "Data is loading, retry shortly"},
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+                )
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+def admission_state():
+    """Scheduler state of the admission control: learned costs, slots in use and the wait queue"""
+    if not hasattr(app.state, 'admission'):
+        app.state.admission = {
+            'costs': {}, 'queries': {}, 'routes': {}, 'queue': [], 'sequence': 0,
+            'running': 0, 'running_cost': 0.0, 'route_running': {}, 'leaders': {}
+        }
+    return app.state.admission
+
+def start_admitted(state, route, cost):
+    """Take a global and a route slot for a request"""
+    state['running'] += 1
+    state['running_cost'] += cost
+    state['route_running'][route] = state['route_running'].get(route, 0) + 1
+    state['routes'][route]['admitted'] += 1
+
+def dispatch_admissions(state):
+    """Start queued requests, cheapest first, while the budgets allow"""
+    queue, blocked = state['queue'], []
+    while queue and state['running'] < ADMISSION_MAX_CONCURRENT:
+        entry = heapq.heappop(queue)
+        cost, _, route, future = entry
+        if future.done():
+            # Shed or disconnected while waiting
+            continue
+        if state['route_running'].get(route, 0) >= ADMISSION_ROUTE_MAX_CONCURRENT:
+            blocked.append(entry)
+            continue
+        start_admitted(state, route, cost)
+        future.set_result(True)
+    for entry in blocked:
+        heapq.heappush(queue, entry)
+
+def release_admitted(state, route, cost):
+    """Free the slots of a finished request and start the next queued ones"""
+    state['running'] -= 1
+    state['running_cost'] -= cost
+    state['route_running'][route] -= 1
+    dispatch_admissions(state)
+
+def shed_response(status_code, detail, retry_after):
+    return JSONResponse(status_code=status_code, content={"detail": detail},
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+async def admit_request(state, route, cost, future):
+    """
+    Wait for the slots of a request, setting future once they are granted; returns the
+    429/503 response instead if it is shed, with future cancelled
+    """
+    state['sequence'] += 1
+    entry = (cost, state['sequence'], route, future)
+    heapq.heappush(state['queue'], entry)
+    dispatch_admissions(state)
+    if future.done():
+        return None
+    
+    # Shed rather than let the queue grow: per route first, then by the expected wait
+    metrics = state['routes'][route]
+    waiting = [queued for queued in state['queue'] if not queued[3].done()]
+    on_route = sum(1 for queued in waiting if queued[2] == route)
+    # The work ahead drains at the pace of the compute threads, whatever the budget
+    expected_wait = (state['running_cost'] + sum(queued[0] for queued in waiting if queued < entry)) / COMPUTE_THREADS
+    if on_route > ADMISSION_ROUTE_MAX_QUEUE:
+        future.cancel()
+        metrics['shed'] += 1
+        return shed_response(429, f"Too many requests waiting for {route}, retry shortly",
+                             on_route * cost / ADMISSION_ROUTE_MAX_CONCURRENT)
+    if expected_wait > ADMISSION_MAX_WAIT_SECONDS:
+        future.cancel()
+        metrics['shed'] += 1
+        return shed_response(503, "Server busy, retry shortly", expected_wait)
+    
+    metrics['queued'] += 1
+    try:
+        await asyncio.wait_for(asyncio.shield(future), ADMISSION_MAX_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        if not future.done():
+            future.cancel()
+            metrics['shed'] += 1
+            return shed_response(503, "Server busy, retry shortly", RETRY_AFTER_SECONDS)
+    except asyncio.CancelledError:
+        # The client went away; give back a slot granted meanwhile
+        if future.done() and not future.cancelled():
+            release_admitted(state, route, cost)
+        future.cancel()
+        raise
+    return None
+
+async def join_identical(state, key):
+    """
+    Wait for the admission of an identical request admitted or queued before; True
+    once it holds its slots, False if there is none or it was shed
+    """
+    while key in state['leaders']:
+        leader = state['leaders'][key]
+        try:
+            await asyncio.shield(leader)
+            return True
+        except asyncio.CancelledError:
+            if not leader.cancelled():
+                # This client went away
+                raise
+            # Shed: the next identical request takes over
+            await asyncio.sleep(0)
+    return False
+
+def drop_leader(state, key, admitted):
+    """Stop identical requests from joining a request that is done or shed"""
+    if state['leaders'].get(key) is admitted:
+        del state['leaders'][key]
+
+def record_cost(state, route, query, seconds):
+    """Learn the cost of a route and remember the service time of the query"""
+    previous = state['costs'].get(route)
+    state['costs'][route] = seconds if previous is None else (
+        (1 - ADMISSION_COST_SMOOTHING) * previous + ADMISSION_COST_SMOOTHING * seconds
+    )
+    queries = state['queries']
+    queries.pop(query, None)
+    queries[query] = seconds
+    if len(queries) > ADMISSION_QUERY_MEMORY:
+        del queries[next(iter(queries))]
+
+class AdmissionControl:
+    """
+    Admit /api requests by estimated cost, so a burst on a heavy route cannot hold
+    up cheap ones or queue without bound
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith('/api/'):
+            return await self.app(scope, receive, send)
+        state = admission_state()
+        route = scope['path']
+        query = f"{route}?{scope['query_string'].decode('latin-1')}"
+        key = (query, response_format.get())
+        cost = state['queries'].get(query, state['costs'].get(route, ADMISSION_DEFAULT_COST))
+        state['routes'].setdefault(route, {'admitted': 0, 'queued': 0, 'shed': 0, 'cheap': 0, 'joined': 0})
+        admitted = None
+        if await join_identical(state, key):
+            state['routes'][route]['joined'] += 1
+        elif cost < ADMISSION_CHEAP_SECONDS:
+            state['routes'][route]['cheap'] += 1
+        else:
+            # Identical requests arriving from now on wait for this one's slots
+            admitted = asyncio.get_running_loop().create_future()
+            state['leaders'][key] = admitted
+            try:
+                rejection = await admit_request(state, route, cost, admitted)
+            except BaseException:
+                drop_leader(state, key, admitted)
+                raise
+            if rejection is not None:
+                drop_leader(state, key, admitted)
+                return await rejection(scope, receive, send)
+        start = time.perf_counter()
+        released = False
+
+        def release():
+            nonlocal released
+            released = True
+            if admitted is not None:
+                drop_leader(state, key, admitted)
+                release_admitted(state, route, cost)
+            record_cost(state, route, query, time.perf_counter() - start)
+
+        async def send_released(message):
+            # The slots and the timing end where the response starts: a streamed body
+            # (/api/export) is sent at the client's pace, without holding up others
+            if message['type'] == 'http.response.start' and not released:
+                release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_released)
+        finally:
+            if not released:
+                release()
+
+class ResponseFormatNegotiation:
+    """Pick the response format of /api requests from the Accept header"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith('/api/'):
+            return await self.app(scope, receive, send)
+        accept = dict(scope['headers']).get(b'accept', b'').decode('latin-1')
+        fmt = 'arrow' if ARROW_STREAM_TYPE in accept else 'columnar' if COLUMNAR_JSON_TYPE in accept else 'json'
+        if fmt == 'arrow' and pa is None:
+            response = JSONResponse(status_code=406, content={"detail": "Arrow responses need pyarrow installed on the server"})
+            return await response(scope, receive, send)
+
+        async def send_with_vary(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [(b'vary', b'Accept')]
+            await send(message)
+
+        token = response_format.set(fmt)
+        try:
+            await self.app(scope, receive, send_with_vary)
+        finally:
+            response_format.reset(token)
+
+app.add_middleware(AdmissionControl)
+app.add_middleware(ReadinessGate)
+app.add_middleware(ResponseFormatNegotiation)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -21,86 +470,2023 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
-if os.path.exists("build"):
-    app.mount("/", StaticFiles(directory="build", html=True), name="static")
 
-# Add this route to handle all other routes and return the React app
-@app.get("/{full_path:path}")
-async def serve_react_app(full_path: str):
-    if os.path.exists("build"):
-        return FileResponse("build/index.html")
-    return {"message": "React app not built yet"}
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe: the server is accepting connections"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness probe: data loaded and prepared, with progress and timing per phase"""
+    readiness = getattr(app.state, 'readiness', {'status': 'starting', 'phases': []})
+    now = time.time()
+    phases = [
+        {**phase, 'seconds': phase['seconds'] if phase['seconds'] is not None else round(now - phase['startedAt'], 3)}
+        for phase in readiness.get('phases', [])
+    ]
+    done = {phase['name'] for phase in phases if phase['status'] == 'done'}
+    body = {
+        "status": readiness['status'],
+        "progress": 1.0 if readiness['status'] == 'ready' else len(done & set(STARTUP_PHASES)) / len(STARTUP_PHASES),
+        "phases": phases
+    }
+    for key in ('error', 'fallback'):
+        if key in readiness:
+            body[key] = readiness[key]
+    if readiness['status'] != 'ready':
+        headers = {"Retry-After": str(RETRY_AFTER_SECONDS)} if readiness['status'] != 'failed' else None
+        return JSONResponse(status_code=503, content=body, headers=headers)
+    return body
+
+def load_spa_build(build_dir=BUILD_DIR):
+    """Read the React build into memory once: path -> body, media type and headers"""
+    files = {}
+    if not os.path.isdir(build_dir):
+        return files
+    for root, _, filenames in os.walk(build_dir):
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            with open(full_path, 'rb') as f:
+                body = f.read()
+            path = os.path.relpath(full_path, build_dir).replace(os.sep, '/')
+            # index.html and unhashed files are revalidated so deploys show up at once
+            cache_control = IMMUTABLE_CACHE if HASHED_ASSET.search(filename) else "no-cache"
+            files[path] = {
+                'body': body,
+                'media_type': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                'headers': {
+                    'ETag': f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+                    'Cache-Control': cache_control
+                }
+            }
+    return files
+
+SPA_FILES = load_spa_build()
 
 def clean_json_values(df):
     """Replace NaN, infinity with None for JSON compatibility"""
     for col in df.select_dtypes(include=['float64']).columns:
-        df[col] = df[col].apply(lambda x: None if (pd.isna(x) or math.isinf(x)) else x)
+        values = df[col]
+        df[col] = values.astype(object).where(np.isfinite(values), None)
     return df
 
-# Load the data
-@app.on_event("startup")
-async def startup_db_client():
+def finite_or_none(value):
+    """A number for JSON: None for NaN and infinity"""
+    return float(value) if np.isfinite(value) else None
+
+def records_payload(value):
+    """Default JSON shape: every table becomes a list of row dicts"""
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict('records')
+    if isinstance(value, dict):
+        return {key: records_payload(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [records_payload(item) for item in value]
+    return value
+
+def columnar_payload(value):
+    """Column-oriented JSON: every table (or list of row dicts) becomes {column: [values]}"""
+    if isinstance(value, pd.DataFrame):
+        return clean_json_values(value.copy()).to_dict('list')
+    if isinstance(value, dict):
+        return {key: columnar_payload(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            keys = list(dict.fromkeys(key for item in value for key in item))
+            return {key: [item.get(key) for item in value] for key in keys}
+        return [columnar_payload(item) for item in value]
+    return value
+
+def arrow_value(value):
+    """One-element Arrow array holding value: tables become list<struct> columns"""
+    if isinstance(value, pd.DataFrame):
+        table = pa.Table.from_pandas(value, preserve_index=False)
+        if table.num_columns == 0:
+            return pa.array([[]], type=pa.list_(pa.null()))
+        rows = pa.StructArray.from_arrays([column.combine_chunks() for column in table.columns],
+                                          names=table.column_names)
+        return pa.ListArray.from_arrays(pa.array([0, len(rows)], type=pa.int32()), rows)
+    if isinstance(value, dict):
+        if not value:
+            return pa.nulls(1)
+        return pa.StructArray.from_arrays([arrow_value(item) for item in value.values()],
+                                          names=[str(key) for key in value])
+    return pa.array([value])
+
+def arrow_payload(value):
+    """
+    Arrow IPC stream of a response: a table is sent as is, and a dict as one row
+    whose table sections are list<struct> columns.
+    """
+    if isinstance(value, pd.DataFrame):
+        table = pa.Table.from_pandas(value, preserve_index=False)
+    else:
+        table = pa.Table.from_arrays([arrow_value(item) for item in value.values()],
+                                     names=[str(key) for key in value])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def respond(payload):
+    """Render a handler result (dicts, lists and DataFrames) in the negotiated format"""
+    fmt = response_format.get()
+    if fmt == 'arrow':
+        return Response(arrow_payload(payload), media_type=ARROW_STREAM_TYPE)
+    if fmt == 'columnar':
+        return JSONResponse(columnar_payload(payload), media_type=COLUMNAR_JSON_TYPE)
+    return records_payload(payload)
+
+# Survey-weighted aggregation helpers. Each takes the household multipliers as
+# `weights` and falls back to the plain pandas reduction when weights is None; the
+# dashboards aggregate with grouped_sums and its partials instead.
+def survey_weights(df, weighted):
+    """Return the household multipliers for df, or None for unweighted estimates"""
+    if not weighted:
+        return None
+    if WEIGHT_COLUMN not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Weight column '{WEIGHT_COLUMN}' not found in dataset")
+    return df[WEIGHT_COLUMN]
+
+def group_codes(df, by):
+    """Integer group codes for column(s) `by` (-1 where a key is missing) and the sorted group labels"""
+    if not isinstance(by, list):
+        codes, labels = pd.factorize(df[by], sort=True)
+        return codes, pd.Index(labels, name=by)
+    key_codes, key_labels = zip(*(pd.factorize(df[col], sort=True) for col in by))
+    shape = tuple(len(labels) for labels in key_labels)
+    missing = np.logical_or.reduce([codes < 0 for codes in key_codes])
+    combined = np.ravel_multi_index([np.where(missing, 0, codes) for codes in key_codes], shape)
+    codes, uniques = pd.factorize(np.where(missing, -1, combined), sort=True)
+    present = uniques >= 0
+    if not present.all():
+        # The missing-key sentinel sorts first; shift codes so it becomes -1
+        codes = codes - 1
+        uniques = uniques[present]
+    positions = np.unravel_index(uniques, shape)
+    labels = pd.MultiIndex.from_arrays(
+        [labels.take(pos) for labels, pos in zip(key_labels, positions)], names=by
+    )
+    return codes, labels
+
+def grouped_mean(df, by, columns, weights=None):
+    """Per-group means of one column (Series) or several (DataFrame), computed as sum(w*x)/sum(w)"""
+    if weights is None:
+        # observed=True can leave categorical groups in order of appearance
+        return df.groupby(by, observed=True)[columns].mean().sort_index()
+    codes, labels = group_codes(df, by)
+    in_group = codes >= 0
+    if not in_group.all():
+        df, weights, codes = df[in_group], weights[in_group], codes[in_group]
+    w = weights.to_numpy(dtype=float)
+    n_groups = len(labels)
+    weight_totals = np.bincount(codes, weights=w, minlength=n_groups)
+    means = {}
+    for col in (columns if isinstance(columns, list) else [columns]):
+        values = df[col].to_numpy(dtype=float)
+        missing = np.isnan(values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if missing.any():
+                # Missing values drop out of both the weighted sum and the weight total
+                valid_weights = np.where(missing, 0.0, w)
+                means[col] = (np.bincount(codes, weights=np.where(missing, 0.0, values) * valid_weights, minlength=n_groups)
+                              / np.bincount(codes, weights=valid_weights, minlength=n_groups))
+            else:
+                means[col] = np.bincount(codes, weights=values * w, minlength=n_groups) / weight_totals
+    if not isinstance(columns, list):
+        return pd.Series(means[columns], index=labels, name=columns)
+    return pd.DataFrame(means, index=labels)
+
+def cached_result(key, compute, version=None):
+    """Memoise compute() under key for a dataset version (the default round's if None)"""
+    if not hasattr(app.state, 'cache'):
+        app.state.cache = {}
+    full_key = (version or getattr(app.state, 'dataset_version', None),) + tuple(key)
+    if full_key not in app.state.cache:
+        app.state.cache[full_key] = compute()
+    return app.state.cache[full_key]
+
+def is_cached(key, version=None):
+    """Whether cached_result holds a result under key for a dataset version"""
+    full_key = (version or getattr(app.state, 'dataset_version', None),) + tuple(key)
+    return full_key in getattr(app.state, 'cache', {})
+
+# Cumulative Poisson(1) probabilities for 0..7 draws; larger counts (p < 1e-5) are capped at 8
+POISSON_CDF = np.cumsum([math.exp(-1) / math.factorial(k) for k in range(8)])
+
+_bootstrap_pool = None
+
+def bootstrap_pool():
+    """Thread pool for the bootstrap; numpy releases the GIL in the heavy loops"""
+    global _bootstrap_pool
+    if _bootstrap_pool is None:
+        _bootstrap_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+    return _bootstrap_pool
+
+# Handlers run on one worker thread, which serialises the lazy column loads into the
+# shared round frames (load_columns), and the event loop stays free meanwhile
+_compute_pool = None
+
+def compute_pool():
+    """Thread pool the dashboard computations run on"""
+    global _compute_pool
+    if _compute_pool is None:
+        _compute_pool = ThreadPoolExecutor(max_workers=COMPUTE_THREADS, thread_name_prefix="hces-compute")
+    return _compute_pool
+
+_result_store = threading.local()
+
+def result_store():
+    """This thread's connection to the shared result store, None when disabled or unavailable"""
+    if not RESULT_STORE_PATH:
+        return None
+    if not hasattr(_result_store, 'conn'):
+        try:
+            os.makedirs(os.path.dirname(RESULT_STORE_PATH) or '.', exist_ok=True)
+            conn = sqlite3.connect(RESULT_STORE_PATH, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, media_type TEXT NOT NULL, "
+                         "body BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            _result_store.conn = conn
+        except (sqlite3.Error, OSError) as e:
+            print(f"Result store unavailable, computing every response: {e}")
+            _result_store.conn = None
+    return _result_store.conn
+
+def stored_result(key):
+    """A response stored under key by any worker, or None"""
+    conn = result_store()
+    if conn is None:
+        return None
+    try:
+        row = conn.execute("SELECT media_type, body, last_used FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        media_type, body, last_used = row
+        now = time.time()
+        if now - last_used > RESULT_STORE_TOUCH_SECONDS:
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+    except sqlite3.Error as e:
+        print(f"Result store read failed: {e}")
+        return None
+    return Response(body, media_type=media_type)
+
+def store_result(key, response):
+    """Store a response for every worker, evicting least recently used ones beyond RESULT_STORE_MAX_BYTES"""
+    conn = result_store()
+    if conn is None:
+        return
     try:
-        app.state.df = pd.read_csv("data/hces_data_standardized.csv")
-        # Convert binary columns to proper boolean
-        binary_columns = [col for col in app.state.df.columns if col.startswith('has_') or col.startswith('is_')]
-        for col in binary_columns:
-            app.state.df[col] = app.state.df[col].astype(bool)
+        conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                     (key, response.media_type, response.body, len(response.body), time.time()))
+        total, = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+        if total > RESULT_STORE_MAX_BYTES:
+            # Evict down to three quarters of the limit so eviction does not run on every write
+            evicted = []
+            for old_key, size in conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+                if total <= RESULT_STORE_MAX_BYTES * 3 // 4:
+                    break
+                evicted.append((old_key,))
+                total -= size
+            conn.executemany("DELETE FROM results WHERE key = ?", evicted)
+    except sqlite3.Error as e:
+        print(f"Result store write failed: {e}")
+
+def rendered_response(result):
+    """The response FastAPI sends for a handler result, with its body rendered"""
+    if isinstance(result, Response):
+        return result
+    return JSONResponse(jsonable_encoder(result))
+
+def result_version(params):
+    """Dataset version a request depends on: its round's, or every round's for cross-round endpoints"""
+    rounds = getattr(app.state, 'rounds', {})
+    if 'round' in params:
+        partition = rounds.get(params['round'] or DEFAULT_ROUND)
+        return partition['version'] if partition else None
+    return '|'.join(partition['version'] for _, partition in sorted(rounds.items())) or None
+
+def single_flight(handler):
+    """
+    Coalesce identical concurrent requests: callers with the same route, parameters,
+    response format and dataset version await one shared computation of the handler.
+    Responses are also kept in the result store, so other workers and later
+    processes serving the same dataset version do not compute them again.
+    """
+    route = handler.__name__
+
+    @functools.wraps(handler)
+    async def coalesced(**params):
+        if not hasattr(app.state, 'in_flight'):
+            app.state.in_flight = {}
+            app.state.single_flight_metrics = {}
+        version = result_version(params)
+        key = (route, version, response_format.get(), tuple(sorted(params.items())))
+        metrics = app.state.single_flight_metrics.setdefault(route, {'computations': 0, 'coalesced': 0, 'stored': 0})
+        
+        # Join a computation already in flight
+        if key in app.state.in_flight:
+            metrics['coalesced'] += 1
+            return await asyncio.shield(app.state.in_flight[key])
+        
+        # Stored responses are keyed by everything else a response depends on:
+        # code version, weighting, bootstrap replicates and column projection
+        store_key = json.dumps([CODE_VERSION, WEIGHT_COLUMN, BOOTSTRAP_REPLICATES, PROJECT_COLUMNS,
+                                *key[:3], key[3]]) if version else None
+        
+        def compute():
+            response = rendered_response(asyncio.run(handler(**params)))
+            if store_key:
+                store_result(store_key, response)
+            return response
+        
+        async def resolve():
+            # Reuse a response stored by any worker, reading the store off the event loop
+            stored = await asyncio.to_thread(stored_result, store_key) if store_key else None
+            if stored is not None:
+                metrics['stored'] += 1
+                return stored
+            # Otherwise compute it on the compute thread, keeping the request context
+            metrics['computations'] += 1
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(compute_pool(), context.run, compute)
+        
+        # Identical requests arriving during the store lookup join it too
+        future = asyncio.ensure_future(resolve())
+        app.state.in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            app.state.in_flight.pop(key, None)
+
+    return coalesced
+
+def bootstrap_strata(df):
+    """Row order grouped by state x sector cell, the cell boundaries and the cell labels"""
+    codes, cells = group_codes(df, BOOTSTRAP_STRATA)
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    bounds = np.searchsorted(codes[order], np.arange(len(cells) + 1))
+    return order, bounds, cells
+
+def _poisson_block(seed, out):
+    """Fill out with Poisson(1) counts by inverting the CDF on uniform draws"""
+    uniform = np.random.default_rng(seed).random(out.shape, dtype=np.float32)
+    out[:] = 0
+    for threshold in POISSON_CDF:
+        out += uniform > threshold
+
+def poisson_resamples(n_rows, replicates=BOOTSTRAP_REPLICATES):
+    """Replicates x rows matrix of Poisson(1) resampling weights, generated in parallel column blocks"""
+    resamples = np.empty((replicates, n_rows), dtype=np.uint8)
+    block = max(1, BOOTSTRAP_BATCH_CELLS // replicates)
+    starts = range(0, n_rows, block)
+    seeds = np.random.SeedSequence(BOOTSTRAP_SEED).spawn(len(starts))
+    list(bootstrap_pool().map(
+        lambda args: _poisson_block(args[0], resamples[:, args[1]:args[1] + block]), zip(seeds, starts)
+    ))
+    return resamples
+
+def replicate_cell_sums(partition, columns, weighted):
+    """
+    Bootstrap replicate numerators sum(r*w*x) and denominators sum(r*w) of the column
+    means in every state x sector cell of a round partition, shape
+    (replicates, cells, 2 * len(columns)). Any state filter or state/sector/overall
+    grouping is a sum over these cells.
+    """
+    df, version = partition['df'], partition['version']
+
+    def compute():
+        order, bounds, cells = cached_result(('bootstrap_strata',), lambda: bootstrap_strata(df), version)
+        resamples = cached_result(('bootstrap_resamples',), lambda: poisson_resamples(len(order)), version)
+        values = df[columns].to_numpy(dtype=float)[order]
+        w = survey_weights(df, True).to_numpy(dtype=float)[order] if weighted else np.ones(len(order))
+        valid_weights = np.where(np.isnan(values), 0.0, w[:, None])
+        terms = np.hstack([np.nan_to_num(values) * valid_weights, valid_weights])
+        sums = np.empty((resamples.shape[0], len(cells), terms.shape[1]))
+
+        def fill(cell):
+            rows = slice(bounds[cell], bounds[cell + 1])
+            sums[:, cell, :] = resamples[:, rows] @ terms[rows]
+        list(bootstrap_pool().map(fill, range(len(cells))))
+        return cells, sums
+
+    return cached_result(('bootstrap_sums', tuple(columns), weighted), compute, version)
+
+def confidence_intervals(by, columns, weighted, level, state=None, round=None):
+    """
+    Percentile bootstrap confidence intervals for the means of columns grouped by
+    'state', 'sector' or None (overall), optionally within some states (a name or a
+    tuple of names) of a survey round (the default round if None). Returned as
+    <column>_ci_lower/<column>_ci_upper indexed by group; households with a missing
+    state or sector are left out of the replicates.
+    """
+    if not 0 < level < 1:
+        raise HTTPException(status_code=400, detail="ci_level must be between 0 and 1")
+    partition = survey_round(round)
+    if partition['df'] is None:
+        raise HTTPException(status_code=501, detail="ci=true is not available when the data is sharded (HCES_SHARDS)")
+    cells, sums = replicate_cell_sums(partition, columns, weighted)
+    selected = np.ones(len(cells), dtype=bool)
+    if state is not None:
+        selected = np.isin(cells.get_level_values('state'), np.atleast_1d(state))
+    if by is None:
+        cell_groups, labels = np.zeros(selected.sum(), dtype=np.intp), pd.Index(['All'])
+    else:
+        cell_groups, labels = pd.factorize(cells.get_level_values(by)[selected], sort=True)
+    selected_sums = sums[:, selected, :]
+    totals = np.stack([selected_sums[:, cell_groups == g, :].sum(axis=1) for g in range(len(labels))], axis=1)
+    k = len(columns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimates = totals[:, :, :k] / totals[:, :, k:]
+
+    alpha = (1 - level) / 2
+    with warnings.catch_warnings():
+        # Groups with no valid values have all-NaN replicates
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower, upper = np.nanquantile(estimates, [alpha, 1 - alpha], axis=0)
+    intervals = {}
+    for j, col in enumerate(columns):
+        intervals[f'{col}_ci_lower'] = lower[:, j]
+        intervals[f'{col}_ci_upper'] = upper[:, j]
+    return pd.DataFrame(intervals, index=pd.Index(np.asarray(labels, dtype=object), name=by))
+
+def attach_intervals(frame, key, intervals, column, name):
+    """Add name_ci_lower/name_ci_upper columns to frame, looked up by its key column"""
+    bounds = intervals.reindex(frame[key].astype(object).to_numpy())
+    frame[f'{name}_ci_lower'] = bounds[f'{column}_ci_lower'].to_numpy()
+    frame[f'{name}_ci_upper'] = bounds[f'{column}_ci_upper'].to_numpy()
+    return frame
+
+def dataset_version(path):
+    """Identify a data file by its size and modification time"""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def add_derived_columns(df):
+    """Add the columns the endpoints derive from raw survey fields"""
+    if all(col in df.columns for col in FOOD_COLUMNS):
+        df['food_monthly_value'] = df[FOOD_COLUMNS].sum(axis=1)
+    if 'source_lighting' in df.columns:
+        df['has_electricity'] = (df['source_lighting'] == 'Electricity').astype(int)
+    if 'source_water' in df.columns:
+        df['has_piped_water'] = df['source_water'].str.contains('Piped water').astype(int)
+    if 'level_access_latrine' in df.columns:
+        df['has_toilet'] = (df['level_access_latrine'] != 'No access').astype(int)
+    return df
+
+def normalise_columns(df):
+    """Normalise column types and names of raw survey columns"""
+    # Convert binary columns to proper boolean
+    binary_columns = [col for col in df.columns if col.startswith('has_') or col.startswith('is_')]
+    for col in binary_columns:
+        df[col] = df[col].astype(bool)
+
+    # Rename 'caste' to 'social_group' as requested
+    if 'caste' in df.columns:
+        df = df.rename(columns={'caste': 'social_group'})
+
+    for col in GROUP_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+class DataValidationError(ValueError):
+    """A survey file with structural problems, which fails the load instead of being quarantined"""
+
+def numeric_rule(col):
+    """The NUMERIC_RULES range of a column, matched by name or suffix; None if it has none"""
+    if col in NUMERIC_RULES:
+        return NUMERIC_RULES[col]
+    for pattern, rule in NUMERIC_RULES.items():
+        if pattern.startswith('*') and col.endswith(pattern[1:]):
+            return rule
+    return None
+
+def check_numeric_counts(numeric_counts):
+    """Fail on a numeric column with values but not a single number; numeric_counts maps it to [present, numeric]"""
+    for col, (present, numeric) in numeric_counts.items():
+        if present and not numeric:
+            raise DataValidationError(f"Column {col} has no numeric values")
+
+def add_numeric_counts(numeric_counts, counts):
+    """Add the [present, numeric] counts of some rows to those of the rows before"""
+    for col, (present, numeric) in counts.items():
+        totals = numeric_counts.setdefault(col, [0, 0])
+        totals[0] += present
+        totals[1] += numeric
+
+def validate_households(df, numeric_counts=None):
+    """
+    Check the raw survey columns in bulk: required keys, numeric types and ranges,
+    0/1 flags and allowed category values. Returns the valid rows (numeric columns
+    parsed; renumbered if any were quarantined), the quarantined rows with their
+    source row and the rules they broke, and the count of rows breaking each rule.
+    With numeric_counts, a file read in chunks: the present and numeric values of
+    each numeric column are added to it, to be checked once over the whole file
+    (check_numeric_counts), and the chunk only quarantines rows.
+    """
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise DataValidationError(f"Missing required columns: {', '.join(missing)}")
+    checks, counts = {}, {}
+    for col in df.columns:
+        values = df[col]
+        present = values.notna().to_numpy()
+        if col in REQUIRED_COLUMNS:
+            checks[f"{col}: missing"] = ~present
+        rule = numeric_rule(col)
+        if rule is not None:
+            numbers = pd.to_numeric(values, errors='coerce')
+            not_numeric = present & numbers.isna().to_numpy()
+            counts[col] = [int(present.sum()), int(present.sum() - not_numeric.sum())]
+            checks[f"{col}: not numeric"] = not_numeric
+            if rule == 'positive':
+                checks[f"{col}: not positive"] = (numbers <= 0).to_numpy()
+            else:
+                checks[f"{col}: negative"] = (numbers < 0).to_numpy()
+            df[col] = numbers
+        elif col.startswith('has_') or col.startswith('is_'):
+            checks[f"{col}: not 0/1"] = present & ~values.isin([0, 1]).to_numpy()
+        elif col in CATEGORY_VALUES:
+            checks[f"{col}: not one of {', '.join(CATEGORY_VALUES[col])}"] = (
+                present & ~values.isin(CATEGORY_VALUES[col]).to_numpy()
+            )
+    if numeric_counts is None:
+        check_numeric_counts(counts)
+    else:
+        add_numeric_counts(numeric_counts, counts)
+    
+    violations = {name: int(broken.sum()) for name, broken in checks.items() if broken.any()}
+    broken = {name: checks[name] for name in violations}
+    bad = np.logical_or.reduce(list(broken.values())) if broken else np.zeros(len(df), dtype=bool)
+    quarantined = df.take(np.flatnonzero(bad))
+    quarantined.insert(0, 'source_row', quarantined.index)
+    quarantined.insert(1, 'violations', [
+        '; '.join(name for name, rows in broken.items() if rows[i]) for i in np.flatnonzero(bad)
+    ])
+    quarantined.index = pd.RangeIndex(len(quarantined))
+    if broken:
+        df = df.take(np.flatnonzero(~bad))
+        df.index = pd.RangeIndex(len(df))
+    return df, quarantined, violations
+
+def quarantine_rows(round_name, quarantined, violations, households_read):
+    """
+    Report and write the quarantined rows of a round, and return the summary kept
+    with the partition; fails the load when too many rows were quarantined
+    """
+    if households_read and len(quarantined) > QUARANTINE_MAX_SHARE * households_read:
+        raise DataValidationError(f"{len(quarantined):,} of {households_read:,} rows failed validation: "
+                                  + ', '.join(f"{name} ({count:,})" for name, count in violations.items()))
+    quarantine_path = os.path.join(QUARANTINE_DIR, f"{round_name}.csv") if QUARANTINE_DIR else None
+    if quarantine_path and len(quarantined):
+        os.makedirs(QUARANTINE_DIR, exist_ok=True)
+        quarantined.to_csv(quarantine_path, index=False)
+    elif quarantine_path and os.path.exists(quarantine_path):
+        # The file was fixed since the last load
+        os.remove(quarantine_path)
+    if len(quarantined):
+        print(f"Quarantined {len(quarantined):,} rows of round {round_name}"
+              + (f" in {quarantine_path}" if quarantine_path else "") + ": "
+              + ', '.join(f"{name} ({count:,})" for name, count in violations.items()))
+    return {'households': len(quarantined), 'violations': violations,
+            'path': quarantine_path if len(quarantined) else None}
+
+def load_dataset(path=DATA_PATH, columns=None):
+    """
+    Read the standardized survey file (only columns, if given), validate and prepare
+    it; returns the valid households, the quarantined rows and the rule counts
+    """
+    df, quarantined, violations = validate_households(pd.read_csv(path, usecols=columns))
+    return add_derived_columns(normalise_columns(df)), quarantined, violations
+
+def raw_columns(columns):
+    """The raw survey columns of columns, the DERIVED_COLUMNS replaced by those they are made from"""
+    raw = []
+    for col in columns:
+        for source in DERIVED_COLUMNS.get(col, [col]):
+            if source not in raw:
+                raw.append(source)
+    return raw
+
+def matching_columns(header, columns):
+    """Columns of header in columns, whose entries ending in '*' match a prefix"""
+    names = set(columns)
+    prefixes = tuple(col[:-1] for col in columns if col.endswith('*'))
+    return [col for col in header if col in names or col.startswith(prefixes)]
+
+def projected_columns(path):
+    """Split the columns of a survey file into those in ENDPOINT_COLUMNS and the rest"""
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+    if not PROJECT_COLUMNS:
+        return header, []
+    used = matching_columns(header, [WEIGHT_COLUMN, *(col for columns in ENDPOINT_COLUMNS.values() for col in columns)])
+    return used, [col for col in header if col not in used]
+
+def skipped_bytes(path, skipped, n_rows):
+    """Estimate the memory the skipped columns would take, from a sample of rows"""
+    if not skipped or n_rows == 0:
+        return 0
+    sample = pd.read_csv(path, usecols=skipped, nrows=PROJECTION_SAMPLE_ROWS)
+    if sample.empty:
+        return 0
+    return int(sample.memory_usage(index=False, deep=True).sum() / len(sample) * n_rows)
+
+def load_columns(partition, columns):
+    """
+    Load columns skipped by the projection into a round partition on first access;
+    derived columns and columns not in the file are left out
+    """
+    df = partition['df']
+    missing = [col for col in columns if col not in df.columns]
+    if not missing or partition.get('path') is None:
+        return
+    if 'header' not in partition:
+        partition['header'] = pd.read_csv(partition['path'], nrows=0).columns.tolist()
+    # social_group is stored as 'caste' in the survey files
+    missing = ['caste' if col == 'social_group' else col for col in missing]
+    missing = [col for col in matching_columns(partition['header'], missing) if col not in df.columns]
+    if missing:
+        loaded = normalise_columns(pd.read_csv(partition['path'], usecols=missing))
+        # Keep the rows that passed validation at load
+        source_rows = partition.get('source_rows')
+        for col in loaded.columns:
+            values = loaded[col].to_numpy()
+            df[col] = values if source_rows is None else values[source_rows]
+
+def grouped_sums(df, by, columns, weighted=True):
+    """
+    Additive per-group sufficient statistics: household count, and per column the valid
+    count and sum, plus the households' weight total and per column the weighted sum
+    and weight total when weighted and the frame has household multipliers. by None
+    makes a single 'All' group. Means of any union of groups are ratios of these sums,
+    so partial sums from disjoint slices of the households merge by adding them up.
+    """
+    if by is None:
+        codes, groups = np.zeros(len(df), dtype=np.intp), pd.Index(['All'])
+    else:
+        codes, groups = group_codes(df, by)
+    in_group = codes >= 0
+    codes = codes[in_group]
+    w = df[WEIGHT_COLUMN].to_numpy(dtype=float)[in_group] if weighted and WEIGHT_COLUMN in df.columns else None
+    sums = {'households': np.bincount(codes, minlength=len(groups))}
+    if w is not None:
+        sums['weights'] = np.bincount(codes, weights=np.nan_to_num(w), minlength=len(groups))
+    for column in columns:
+        values = df[column].to_numpy(dtype=float)[in_group]
+        valid = ~np.isnan(values)
+        values = np.where(valid, values, 0.0)
+        sums[f'{column}__n'] = np.bincount(codes, weights=valid, minlength=len(groups))
+        sums[f'{column}__sum'] = np.bincount(codes, weights=values, minlength=len(groups))
+        if w is not None:
+            sums[f'{column}__wsum'] = np.bincount(codes, weights=values * w, minlength=len(groups))
+            sums[f'{column}__w'] = np.bincount(codes, weights=valid * w, minlength=len(groups))
+    return pd.DataFrame(sums, index=groups)
+
+def sums_frame(df, columns):
+    """Local frame of columns (name -> Series of df) and the household multipliers of df, for grouped_sums"""
+    frame = pd.DataFrame(columns)
+    if WEIGHT_COLUMN in df.columns:
+        frame[WEIGHT_COLUMN] = df[WEIGHT_COLUMN].to_numpy()
+    return frame
+
+def sums_columns(sums):
+    """The columns summed in grouped_sums, in order"""
+    return [col[:-3] for col in sums.columns if col.endswith('__n')]
+
+def sums_means(sums, columns, weighted):
+    """Per-group means of one column (Series) or several (DataFrame) from grouped_sums, like grouped_mean"""
+    means = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for col in (columns if isinstance(columns, list) else [columns]):
+            if weighted:
+                means[col] = sums[f'{col}__wsum'].to_numpy() / sums[f'{col}__w'].to_numpy()
+            else:
+                means[col] = sums[f'{col}__sum'].to_numpy() / sums[f'{col}__n'].to_numpy()
+    if not isinstance(columns, list):
+        return pd.Series(means[columns], index=sums.index, name=columns)
+    return pd.DataFrame(means, index=sums.index)
+
+def sums_shares(sums, totals, weighted):
+    """
+    Sample count and percentage share of each value within its group, like grouped_share,
+    from the grouped_sums by (group, value) and the grouped_sums by group
+    """
+    key = 'weights' if weighted else 'households'
+    return pd.DataFrame({'count': sums['households'], 'percentage': sums[key].div(totals[key], level=0) * 100})
+
+def value_histogram(df, by, column, weighted):
+    """
+    Exact quantile sketch of a column per group of by (None for none): the grouped_sums
+    of the column by the groups and the column itself, so every distinct value is kept
+    with its count and weight and the histograms of disjoint households add up
+    """
+    keys = column if by is None else [*(by if isinstance(by, list) else [by]), column]
+    return grouped_sums(df, keys, [column], weighted)
+
+def histogram_stats(hist, stats, weighted):
+    """
+    Per-group summary statistics like grouped_stats, e.g. ['mean', 'median', 'count'],
+    from a value_histogram with groups. Weighted 'std' is the population standard
+    deviation around the weighted mean; 'count' is always the unweighted sample size.
+    """
+    hist = hist.sort_index()
+    column = hist.index.names[-1]
+    codes, labels = hist.index.droplevel(-1).factorize(sort=True)
+    labels = labels.set_names(hist.index.names[:-1])
+    n_groups = len(labels)
+    values = hist.index.get_level_values(-1).to_numpy(dtype=float)
+    counts = hist[f'{column}__n'].to_numpy()
+    w = hist[f'{column}__w'].to_numpy() if weighted else counts
+    value_sums = hist[f'{column}__wsum' if weighted else f'{column}__sum'].to_numpy()
+    sizes = np.bincount(codes, weights=counts, minlength=n_groups)
+    weight_totals = np.bincount(codes, weights=w, minlength=n_groups)
+    ends = np.cumsum(np.bincount(codes, minlength=n_groups))
+    starts = ends - np.bincount(codes, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.bincount(codes, weights=value_sums, minlength=n_groups) / weight_totals
+        result = {}
+        for stat in stats:
+            if stat == 'mean':
+                result[stat] = means
+            elif stat == 'median':
+                if weighted:
+                    # The first value whose cumulative weight reaches half the group's
+                    cumulative = np.cumsum(w)
+                    offsets = np.where(starts > 0, cumulative[np.maximum(starts - 1, 0)], 0.0)
+                    at = np.searchsorted(cumulative, offsets + 0.5 * weight_totals, side='left')
+                    result[stat] = values[np.clip(at, starts, ends - 1)]
+                else:
+                    # The middle value, or the average of the middle two
+                    cumulative = np.cumsum(counts)
+                    offsets = np.where(starts > 0, cumulative[np.maximum(starts - 1, 0)], 0.0)
+                    lower = np.searchsorted(cumulative, offsets + (sizes - 1) // 2 + 1, side='left')
+                    upper = np.searchsorted(cumulative, offsets + sizes // 2 + 1, side='left')
+                    result[stat] = (values[np.clip(lower, starts, ends - 1)] + values[np.clip(upper, starts, ends - 1)]) / 2
+            elif stat == 'std':
+                squared_dev = np.bincount(codes, weights=w * (values - means[codes]) ** 2, minlength=n_groups)
+                result[stat] = np.sqrt(squared_dev / (weight_totals if weighted else sizes - 1))
+            elif stat == 'count':
+                result[stat] = sizes.astype(np.int64)
+            else:
+                raise ValueError(f"Unsupported statistic: {stat}")
+    return pd.DataFrame(result, index=labels)[stats]
+
+def histogram_bins(hist, q, weighted, duplicates='raise'):
+    """
+    Quantile bin (0..q-1) of every value of a value_histogram without groups, the bins
+    quantile_bins gives the households holding those values
+    """
+    values = hist.index.to_numpy(dtype=float)
+    if weighted:
+        cumulative = np.cumsum(hist['weights'].to_numpy())
+        at = np.searchsorted(cumulative, np.linspace(0, 1, q + 1) * cumulative[-1], side='left')
+        edges = values[np.clip(at, 0, len(values) - 1)]
+    else:
+        # The linear interpolation between order statistics of np.quantile, as in pd.qcut
+        cumulative = np.cumsum(hist['households'].to_numpy())
+        virtual = (cumulative[-1] - 1) * np.linspace(0, 1, q + 1)
+        below = np.floor(virtual)
+        gamma = virtual - below
+        a = values[np.searchsorted(cumulative, below + 1, side='left')]
+        b = values[np.searchsorted(cumulative, np.minimum(below + 1, cumulative[-1] - 1) + 1, side='left')]
+        edges = np.where(gamma >= 0.5, b - (b - a) * (1 - gamma), a + (b - a) * gamma)
+    return pd.cut(values, edges, labels=False, include_lowest=True, duplicates=duplicates)
+
+def first_rows(df, column):
+    """Row where each value of column (missing included) first appears, a partial merged by minimum"""
+    rows = pd.Series(df.index.to_numpy(), name='first')
+    return rows.groupby(df[column].astype(object).to_numpy(), dropna=False).min().rename_axis(column).to_frame()
+
+def merge_partials(parts):
+    """
+    Merge the partials of disjoint sets of households, e.g. the shards': the frames
+    under each key are concatenated and added up per group, except first_rows, which
+    take the minimum
+    """
+    if parts[0] is None:
+        return None
+    merged = {}
+    for key in parts[0]:
+        frame = pd.concat([part[key] for part in parts])
+        merged[key] = (
+            frame.groupby(level=list(range(frame.index.nlevels)), sort=True, dropna=False, observed=True)
+            .agg({col: 'min' if col == 'first' else 'sum' for col in frame.columns})
+        )
+    return merged
+
+# Per-query partials the shards compute: name -> compute(df, context)
+SHARD_PARTIALS = {}
+
+def shard_partial(*columns):
+    """
+    Register compute(df, context), returning a dict of partials, so shards can run it
+    by name; columns are those it reads (entries ending in '*' match a prefix), loaded
+    before it runs and declared in ENDPOINT_COLUMNS by the endpoints using it
+    """
+    def register(compute):
+        compute.columns = list(columns)
+        SHARD_PARTIALS[compute.__name__] = compute
+        return compute
+    return register
+
+def partials_columns(*computes):
+    """Columns the shard_partial computes read (None for none)"""
+    return list(dict.fromkeys(col for compute in computes if compute for col in compute.columns))
+
+def bitmap_index(df):
+    """
+    Packed bitsets (one bit per household) of every value of the GROUP_COLUMNS in df,
+    so combined filters are resolved with bitwise AND/OR instead of column scans
+    """
+    index = {}
+    for col in GROUP_COLUMNS:
+        if col not in df.columns:
+            continue
+        codes, labels = pd.factorize(df[col])
+        index[col] = {str(label): np.packbits(codes == i) for i, label in enumerate(labels)}
+    return index
+
+def round_aggregates(df):
+    """Per state x sector grouped_sums of TREND_METRICS for one round"""
+    return grouped_sums(df, ['state', 'sector'], [metric for metric in TREND_METRICS if metric in df.columns])
+
+def household_size_groups(hh_size):
+    """Household size group labels '1'..'5' and '6+', None where the size is missing"""
+    sizes = hh_size.to_numpy(dtype=float)
+    groups = np.where(sizes >= 6, '6+', np.nan_to_num(sizes).astype(int).astype(str)).astype(object)
+    groups[np.isnan(sizes)] = None
+    return groups
+
+def size_aggregates(df):
+    """
+    Per state x household size group grouped_sums of expenditure, household size and
+    the SIZE_CATEGORIES spending. The analysis for any set of states sums these rows.
+    """
+    frame = pd.DataFrame({
+        'state': df['state'].to_numpy(),
+        'size': household_size_groups(df['hh_size']),
+        'household_reported_monthly_exp': df['household_reported_monthly_exp'].to_numpy(),
+        'hh_size': df['hh_size'].to_numpy()
+    })
+    for name, columns in SIZE_CATEGORIES.items():
+        if all(col in df.columns for col in columns):
+            frame[name] = df[columns].sum(axis=1).to_numpy()
+    if WEIGHT_COLUMN in df.columns:
+        frame[WEIGHT_COLUMN] = df[WEIGHT_COLUMN].to_numpy()
+    return grouped_sums(frame, ['state', 'size'], [col for col in frame.columns if col not in ('state', 'size', WEIGHT_COLUMN)])
+
+@shard_partial(
+    'state', 'hh_size', 'household_reported_monthly_exp',
+    *(col for columns in SIZE_CATEGORIES.values() for col in columns)
+)
+def size_partials(df, context):
+    """size_aggregates of the households matching the filters of /api/household-size-analysis"""
+    return {'sizes': size_aggregates(df)}
+
+def state_means(df):
+    """Per-state means of RANKING_METRICS for one round, keyed by weighted (False/True)"""
+    metrics = [metric for metric in RANKING_METRICS if metric in df.columns]
+    return {
+        weighted: grouped_mean(df, 'state', metrics, survey_weights(df, weighted))
+        for weighted in (False, True)
+        if not weighted or WEIGHT_COLUMN in df.columns
+    }
+
+def ranking_index(means):
+    """
+    Per-state means of RANKING_METRICS for one round, unweighted and weighted, with
+    state orders presorted highest-first ('top') and lowest-first ('bottom'), with and
+    without Union Territories. States with no value sort last in both orders.
+    """
+    index = {}
+    for weighted, by_state in means.items():
+        states = np.asarray(by_state.index, dtype=object)
+        not_ut = ~np.isin(states, UNION_TERRITORIES)
+        for metric in by_state.columns:
+            values = by_state[metric].to_numpy(dtype=float)
+            orders = {'top': np.argsort(-values, kind='stable'), 'bottom': np.argsort(values, kind='stable')}
+            index[(metric, weighted)] = {
+                'states': states,
+                'values': values,
+                'orders': {
+                    (direction, exclude_uts): order[not_ut[order]] if exclude_uts else order
+                    for direction, order in orders.items()
+                    for exclude_uts in (False, True)
+                }
+            }
+    return index
+
+def ranked_states(partition, metric, weighted, n, exclude_uts=False, direction='top'):
+    """The first n states of a presorted ranking as a frame of state and value, in O(n)"""
+    entry = partition['rankings'].get((metric, weighted))
+    if entry is None:
+        if weighted and not any(key[1] for key in partition['rankings']):
+            raise HTTPException(status_code=400, detail=f"Weight column '{WEIGHT_COLUMN}' not found in dataset")
+        raise HTTPException(status_code=400, detail=f"No ranking for metric: {metric}")
+    order = entry['orders'][(direction, exclude_uts)][:n]
+    return pd.DataFrame({'state': entry['states'][order], 'value': entry['values'][order]})
+
+def distribution_values(df, metric):
+    """Household values of a DISTRIBUTION_METRICS metric"""
+    if metric == 'per_capita_monthly_exp':
+        return df['household_reported_monthly_exp'].to_numpy(dtype=float) / df['hh_size'].to_numpy(dtype=float)
+    return df[metric].to_numpy(dtype=float)
+
+@shard_partial('household_reported_monthly_exp', 'hh_size')
+def distribution_partials(df, context):
+    """Value histogram of a DISTRIBUTION_METRICS metric, the households without a finite value left out"""
+    values = distribution_values(df, context['metric'])
+    frame = sums_frame(df, {'value': np.where(np.isfinite(values), values, np.nan)})
+    return {'values': grouped_sums(frame, 'value', [], context['weighted'])}
+
+def prefix_sums(values):
+    """Cumulative sums with a leading 0, so sum(values[i:j]) is sums[j] - sums[i]"""
+    return np.concatenate([[0.0], np.cumsum(values)])
+
+def distribution_index(df):
+    """
+    Per DISTRIBUTION_METRICS metric and grouping (all, state, sector, state x sector):
+    the values sorted within each group, which occupies rows starts[g]:ends[g], with
+    prefix sums of the values and, when the round has household multipliers, of the
+    weights and weighted values; plus the Gini coefficient of every group.
+    Quantiles, histograms and Lorenz points of a group are then binary searches.
+    """
+    w = df[WEIGHT_COLUMN].to_numpy(dtype=float) if WEIGHT_COLUMN in df.columns else None
+    index = {}
+    for metric in DISTRIBUTION_METRICS:
+        needed = ['household_reported_monthly_exp', 'hh_size'] if metric == 'per_capita_monthly_exp' else [metric]
+        if not all(col in df.columns for col in needed):
+            continue
+        values = distribution_values(df, metric)
+        index[metric] = {}
+        for grouping, by in DISTRIBUTION_GROUPINGS.items():
+            if by:
+                codes, labels = group_codes(df, by if len(by) > 1 else by[0])
+            else:
+                codes, labels = np.zeros(len(df), dtype=np.intp), pd.Index(['All'])
             
-        # Rename 'caste' to 'social_group' as requested
-        if 'caste' in app.state.df.columns:
-            app.state.df = app.state.df.rename(columns={'caste': 'social_group'})
+            # Sort by value, then stably by group, leaving out missing values and groups
+            keep = np.flatnonzero((codes >= 0) & np.isfinite(values))
+            order = keep[np.argsort(values[keep], kind='stable')]
+            order = order[np.argsort(codes[order], kind='stable')]
+            counts = np.bincount(codes[order], minlength=len(labels))
+            sorted_values = values[order]
+            entry = {
+                'groups': {label: g for g, label in enumerate(labels)},
+                'starts': np.cumsum(counts) - counts,
+                'ends': np.cumsum(counts),
+                'values': sorted_values,
+                'cum_values': prefix_sums(sorted_values),
+                'gini': {}
+            }
+            if w is not None:
+                entry['cum_weights'] = prefix_sums(w[order])
+                entry['cum_weighted_values'] = prefix_sums(w[order] * sorted_values)
             
+            # Gini = 1 - sum(w_i * (2 * C_i + w_i * x_i)) / (W * X) within each group,
+            # where C_i is the weighted value total of the group below household i
+            group_of = np.repeat(np.arange(len(labels)), counts)
+            for weighted in ([False, True] if w is not None else [False]):
+                weights = w[order] if weighted else np.ones(len(order))
+                cum_weights, cum_weighted_values = group_totals(entry, weighted)
+                below = cum_weighted_values[:-1] - cum_weighted_values[entry['starts']][group_of]
+                terms = np.bincount(group_of, weights=weights * (2 * below + weights * sorted_values),
+                                    minlength=len(labels))
+                totals_w = cum_weights[entry['ends']] - cum_weights[entry['starts']]
+                totals_x = cum_weighted_values[entry['ends']] - cum_weighted_values[entry['starts']]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    entry['gini'][weighted] = np.where(counts > 0, 1 - terms / (totals_w * totals_x), np.nan)
+            index[metric][grouping] = entry
+    return index
+
+def histogram_entry(hist):
+    """
+    A distribution_index entry with the single group None from a value_histogram
+    without groups: each distinct value is one row standing for its households, with
+    prefix sums of their counts ('cum_counts'). Quantiles, histograms, Lorenz points
+    and the Gini coefficient come out as from the households' own sorted values.
+    """
+    values = hist.index.to_numpy(dtype=float)
+    counts = hist['households'].to_numpy()
+    entry = {
+        'groups': {None: 0},
+        'starts': np.array([0]),
+        'ends': np.array([len(values)]),
+        'values': values,
+        'cum_counts': np.concatenate([[0], np.cumsum(counts)]),
+        'cum_values': prefix_sums(counts * values),
+        'gini': {}
+    }
+    if 'weights' in hist.columns:
+        w = hist['weights'].to_numpy(dtype=float)
+        entry['cum_weights'] = prefix_sums(w)
+        entry['cum_weighted_values'] = prefix_sums(w * values)
+    for weighted in ([False, True] if 'weights' in hist.columns else [False]):
+        cum_weights, cum_weighted_values = group_totals(entry, weighted)
+        weights = np.diff(cum_weights)
+        terms = np.sum(weights * (2 * cum_weighted_values[:-1] + weights * values))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entry['gini'][weighted] = np.array([1 - terms / (cum_weights[-1] * cum_weighted_values[-1])])
+    return entry
+
+def group_totals(entry, weighted):
+    """Prefix sums of the weights and weighted values of a distribution entry (counts and values if unweighted)"""
+    if weighted:
+        return entry['cum_weights'], entry['cum_weighted_values']
+    if 'cum_counts' in entry:
+        return entry['cum_counts'], entry['cum_values']
+    return np.arange(len(entry['values']) + 1, dtype=float), entry['cum_values']
+
+def rank_positions(entry, weighted, start, end, targets):
+    """Rows of a group at which its cumulative weight (count if unweighted) first reaches each target"""
+    if not weighted and 'cum_counts' not in entry:
+        positions = start + np.ceil(targets).astype(np.intp) - 1
+    else:
+        cum_weights = entry['cum_weights' if weighted else 'cum_counts']
+        positions = np.searchsorted(cum_weights, cum_weights[start] + targets, side='left') - 1
+    return np.clip(positions, start, end - 1)
+
+def cell_moments(df):
+    """
+    Households, weight totals, means and co-moment matrices (centred cross products)
+    of the REGRESSION_VARIABLES per state x sector cell, unweighted (False) and
+    survey-weighted (True), over the households with all variables present. Any set
+    of cells combines into the correlations and regressions of its households.
+    """
+    variables = [col for col in REGRESSION_VARIABLES if col in df.columns]
+    codes, cells = group_codes(df, BOOTSTRAP_STRATA)
+    values = np.column_stack([df[col].to_numpy(dtype=float) for col in variables])
+    keep = (codes >= 0) & ~np.isnan(values).any(axis=1)
+    codes, values = codes[keep], values[keep]
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(cells) + 1))
+    moments = {'cells': cells, 'variables': variables, 'households': np.diff(bounds)}
+    for weighted in (False, True):
+        if weighted and WEIGHT_COLUMN not in df.columns:
+            continue
+        w = np.nan_to_num(df[WEIGHT_COLUMN].to_numpy(dtype=float)[keep]) if weighted else np.ones(len(codes))
+        totals = np.bincount(codes, weights=w, minlength=len(cells))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.column_stack([
+                np.bincount(codes, weights=w * values[:, j], minlength=len(cells)) for j in range(len(variables))
+            ]) / totals[:, None]
+        comoments = np.zeros((len(cells), len(variables), len(variables)))
+        for cell in range(len(cells)):
+            rows = order[bounds[cell]:bounds[cell + 1]]
+            centred = values[rows] - means[cell]
+            comoments[cell] = centred.T @ (centred * w[rows, None])
+        moments[weighted] = {'totals': totals, 'means': means, 'comoments': comoments}
+    return moments
+
+def concat_moments(parts):
+    """Cell moments of partitions holding disjoint cells, e.g. the shards' states"""
+    parts = [part for part in parts if part]
+    if not parts:
+        return {}
+    moments = {
+        'cells': parts[0]['cells'].append([part['cells'] for part in parts[1:]]),
+        'variables': parts[0]['variables'],
+        'households': np.concatenate([part['households'] for part in parts])
+    }
+    for weighted in (False, True):
+        if all(weighted in part for part in parts):
+            moments[weighted] = {
+                key: np.concatenate([part[weighted][key] for part in parts])
+                for key in ('totals', 'means', 'comoments')
+            }
+    return moments
+
+def combined_moments(moments, weighted, selected):
+    """Households, weight total, means and co-moments of the selected cells' households together"""
+    cell_totals = moments[weighted]['totals'][selected]
+    occupied = cell_totals > 0
+    cell_totals = cell_totals[occupied]
+    cell_means = moments[weighted]['means'][selected][occupied]
+    total = cell_totals.sum()
+    mean = cell_totals @ cell_means / total
+    # Within-cell co-moments plus the spread of the cell means around the overall mean
+    spread = cell_means - mean
+    comoment = moments[weighted]['comoments'][selected][occupied].sum(axis=0) + (spread.T * cell_totals) @ spread
+    return int(moments['households'][selected].sum()), total, mean, comoment
+
+def stratified_sample(df):
+    """
+    Nested stratified random samples of the households by state x sector, one per
+    APPROX_SAMPLE_FRACTIONS. Rows are ordered by sample level and stratum, so the
+    sample of level k is the first ends[k] rows; sizes[k] are its rows per stratum,
+    population the households per stratum (missing keys form their own stratum) and
+    keys the stratum labels as strings. Each stratum is shuffled with its own seed
+    from its label, so it is sampled alike on whichever shard holds its households.
+    """
+    codes, cells = group_codes(df, BOOTSTRAP_STRATA)
+    codes = np.where(codes < 0, len(cells), codes)
+    population = np.bincount(codes, minlength=len(cells) + 1)
+    fractions = np.array(APPROX_SAMPLE_FRACTIONS)[:, None]
+    sizes = np.minimum(population, np.maximum(APPROX_MIN_STRATUM_ROWS, np.ceil(fractions * population))).astype(np.int64)
+    keys = np.array([' / '.join(map(str, cell)) for cell in cells] + ['missing'], dtype=object)
+    
+    # Shuffle within strata; a household's level is the first sample its rank falls in
+    order = np.argsort(codes, kind='stable')
+    starts = np.cumsum(population) - population
+    for stratum, key in enumerate(keys):
+        rows = order[starts[stratum]:starts[stratum] + population[stratum]]
+        rng = np.random.default_rng([APPROX_SEED, zlib.crc32(key.encode())])
+        order[starts[stratum]:starts[stratum] + population[stratum]] = rng.permutation(rows)
+    strata = codes[order]
+    rank = np.arange(len(order)) - starts[strata]
+    level = (rank[:, None] >= sizes[:, strata].T).sum(axis=1)
+    kept = level < len(APPROX_SAMPLE_FRACTIONS)
+    by_level = np.lexsort((strata[kept], level[kept]))
+    return {
+        'rows': order[kept][by_level],
+        'strata': strata[kept][by_level],
+        'ends': np.searchsorted(level[kept][by_level], np.arange(1, len(APPROX_SAMPLE_FRACTIONS) + 1)),
+        'sizes': sizes,
+        'population': population,
+        'keys': keys
+    }
+
+def estimate_partials(partition, metrics, by, domain, weighted, level=None):
+    """
+    Additive sums of /api/estimate over the households of a partition matching domain
+    (level None) or over its stratified sample of a level, per stratum and group of
+    by: 'cells' holds the households in the domain and per metric, over those with a
+    value, the count n, A1 = sum(w*y) and A0 = sum(w), plus for samples B2 =
+    sum(w^2*y^2), B1 = sum(w^2*y) and B0 = sum(w^2) for the variances; 'strata' the
+    population and sample size of every stratum (samples only). Also returns the
+    groups with a household in the domain, whether any household matched, the rows
+    scanned and those the next level would scan.
+    """
+    df, sample = partition['df'], partition['sample']
+    if level is not None and sample is None:
+        # No households, so no sample
+        return {'labels': [], 'matched': False, 'partials': None, 'scanned': 0, 'next_rows': 0}
+    load_columns(partition, metrics + ([by] if by else []))
+    selected = filter_bitmap(partition, domain)
+    if by is None:
+        labels = ['All']
+    else:
+        labels = [label for label, bits in column_bitmaps(partition, by).items()
+                  if selected is None or (bits & selected).any()]
+    matched = len(df) > 0 and (selected is None or bool(selected.any()))
+    
+    if level is None:
+        rows = filter_rows(partition, domain)
+        strata = np.zeros(len(rows), dtype=np.intp)
+        keys = np.array(['All'], dtype=object)
+        next_rows = len(df)
+    else:
+        rows = sample['rows'][:sample['ends'][level]]
+        strata = sample['strata'][:len(rows)]
+        keys = sample['keys']
+        next_rows = sample['ends'][level + 1] if level + 1 < len(sample['ends']) else len(df)
+    
+    scanned = len(rows)
+    
+    # Sampled households outside the filters add nothing but count in the stratum sizes
+    in_domain = np.ones(len(rows), dtype=bool)
+    if level is not None:
+        for col, allowed in domain:
+            in_domain &= df[col].take(rows).astype(str).isin(allowed).to_numpy()
+    if by is not None:
+        in_domain &= df[by].take(rows).notna().to_numpy()
+    rows, strata = rows[in_domain], strata[in_domain]
+    w = df[WEIGHT_COLUMN].to_numpy()[rows].astype(float) if weighted else np.ones(len(rows))
+    sums = {
+        'stratum': keys[strata],
+        'group': df[by].take(rows).astype(str).to_numpy() if by else np.full(len(rows), 'All', dtype=object),
+        'households': np.ones(len(rows))
+    }
+    for metric in metrics:
+        y = df[metric].to_numpy()[rows].astype(float)
+        valid = ~np.isnan(y)
+        wv, y = np.where(valid, w, 0.0), np.nan_to_num(y)
+        sums[f'{metric}__n'] = valid.astype(float)
+        sums[f'{metric}__A1'] = wv * y
+        sums[f'{metric}__A0'] = wv
+        if level is not None:
+            sums[f'{metric}__B2'] = (wv * y) ** 2
+            sums[f'{metric}__B1'] = wv * wv * y
+            sums[f'{metric}__B0'] = wv * wv
+    partials = {'cells': pd.DataFrame(sums).groupby(['stratum', 'group']).sum()}
+    if level is not None:
+        partials['strata'] = pd.DataFrame({'population': sample['population'], 'size': sample['sizes'][level]},
+                                          index=pd.Index(keys, name='stratum'))
+    return {'labels': labels, 'matched': matched, 'partials': partials, 'scanned': scanned, 'next_rows': next_rows}
+
+def ratio_estimates(partials, labels, metrics):
+    """
+    Means of metrics per group of labels as ratio estimates sum(d*w*y) / sum(d*w) from
+    the estimate_partials of disjoint households, with households weighted by the
+    survey weights w and their design weights d (population / sample size of their
+    stratum). For a stratified sample the variances come from the linearised ratio
+    z = w (y - R) / X with the finite population correction; for all households
+    (no 'strata') they are zero.
+    """
+    cells, strata = partials['cells'], partials.get('strata')
+    group = labels.get_indexer(cells.index.get_level_values('group'))
+    cells, group = cells[group >= 0], group[group >= 0]
+    if strata is None:
+        design = np.ones(len(cells))
+    else:
+        strata = strata.reindex(cells.index.get_level_values('stratum'))
+        population, sizes = strata['population'].to_numpy(dtype=float), strata['size'].to_numpy(dtype=float)
+        design = population / sizes
+    households = np.bincount(group, weights=design * cells['households'].to_numpy(), minlength=len(labels))
+    estimates = np.empty((len(labels), len(metrics)))
+    variances = np.zeros((len(labels), len(metrics)))
+    for j, metric in enumerate(metrics):
+        a1, a0 = cells[f'{metric}__A1'].to_numpy(), cells[f'{metric}__A0'].to_numpy()
+        numerator = np.bincount(group, weights=design * a1, minlength=len(labels))
+        denominator = np.bincount(group, weights=design * a0, minlength=len(labels))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            estimates[:, j] = numerator / denominator
+            if strata is None:
+                continue
+            # Per stratum and group, sum(z) and sum(z^2) expanded in the sums of the cell
+            r, x = estimates[group, j], denominator[group]
+            valid = cells[f'{metric}__n'].to_numpy() > 0
+            z_sums = np.where(valid, (a1 - r * a0) / x, 0.0)
+            z_squares = np.where(valid, (cells[f'{metric}__B2'].to_numpy() - 2 * r * cells[f'{metric}__B1'].to_numpy()
+                                         + r * r * cells[f'{metric}__B0'].to_numpy()) / (x * x), 0.0)
+        n = np.maximum(sizes, 2)
+        cell_variance = np.maximum(z_squares - z_sums ** 2 / n, 0) / (n - 1)
+        correction = population ** 2 * (1 - sizes / np.maximum(population, 1)) / np.maximum(sizes, 1)
+        variances[:, j] = np.bincount(group, weights=correction * cell_variance, minlength=len(labels))
+    return households, estimates, variances
+
+def store_round(round_name, partition):
+    """Store a round partition; other partitions and their caches are untouched"""
+    if not hasattr(app.state, 'rounds'):
+        app.state.rounds = {}
+    app.state.rounds[round_name] = partition
+    if round_name == DEFAULT_ROUND:
+        app.state.df = partition['df']
+        app.state.dataset_version = partition['version']
+
+def register_round(round_name, df, version, path=None, projection=None, quarantine=None, source_rows=None):
+    """
+    Store a round partition with its trend aggregates and ranking index; source_rows
+    are the rows of the file kept by validation (None if all were)
+    """
+    store_round(round_name, {
+        'df': df,
+        'version': f"{round_name}:{version}",
+        'households': len(df),
+        'aggregates': round_aggregates(df) if not df.empty else pd.DataFrame(),
+        'rankings': ranking_index(state_means(df)) if not df.empty else {},
+        'bitmaps': bitmap_index(df),
+        'distributions': distribution_index(df) if not df.empty else {},
+        'sizes': size_aggregates(df) if not df.empty else pd.DataFrame(),
+        'sample': stratified_sample(df) if not df.empty else None,
+        'moments': cell_moments(df) if not df.empty else {},
+        'path': path,
+        'projection': projection or {'columnsSkipped': [], 'bytesSaved': 0},
+        'quarantine': quarantine or {'households': 0, 'violations': {}, 'path': None},
+        'source_rows': source_rows
+    })
+
+def file_hash(path):
+    """Content hash of a data file, recomputed only when its size or modification time changed"""
+    sources_path = os.path.join(CHECKPOINT_DIR, 'sources.json')
+    try:
+        with open(sources_path) as f:
+            sources = json.load(f)
+    except (OSError, ValueError):
+        sources = {}
+    key, version = os.path.abspath(path), dataset_version(path)
+    if sources.get(key, {}).get('version') != version:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                digest.update(block)
+        sources[key] = {'version': version, 'hash': digest.hexdigest()}
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        temporary = f"{sources_path}.{os.getpid()}"
+        with open(temporary, 'w') as f:
+            json.dump(sources, f)
+        os.replace(temporary, sources_path)
+    return sources[key]['hash']
+
+def checkpoint_path(round_name, path):
+    """Checkpoint directory of a round, keyed by the file content and the code and settings preparing it"""
+    key = json.dumps([CODE_VERSION, file_hash(path), WEIGHT_COLUMN, PROJECT_COLUMNS, BOOTSTRAP_REPLICATES])
+    return os.path.join(CHECKPOINT_DIR, f"{round_name}-{hashlib.sha256(key.encode()).hexdigest()[:16]}")
+
+class CheckpointPickler(pickle.Pickler):
+    """Pickle a round partition, writing large numeric arrays raw to a separate arrays file"""
+    def __init__(self, file, arrays):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays = arrays
+
+    def persistent_id(self, obj):
+        if type(obj) is not np.ndarray or obj.dtype.kind not in 'biufcmM' or obj.nbytes < CHECKPOINT_MMAP_BYTES:
+            return None
+        # Align every array to 64 bytes
+        self.arrays.write(b'\0' * (-self.arrays.tell() % 64))
+        offset = self.arrays.tell()
+        self.arrays.write(np.ascontiguousarray(obj).data)
+        return (offset, obj.dtype.str, obj.shape)
+
+class CheckpointUnpickler(pickle.Unpickler):
+    """Unpickle a round partition, with its large arrays as views of the memory-mapped arrays file"""
+    def __init__(self, file, arrays):
+        super().__init__(file)
+        self.arrays = arrays
+
+    def persistent_load(self, pid):
+        offset, dtype, shape = pid
+        return np.frombuffer(self.arrays, np.dtype(dtype), count=math.prod(shape), offset=offset).reshape(shape)
+
+def save_checkpoint(round_name, partition):
+    """Save a prepared round partition and its warm caches, replacing checkpoints of older data"""
+    target = checkpoint_path(round_name, partition['path'])
+    if os.path.exists(target):
+        return
+    caches = {key[1:]: value for key, value in list(app.state.cache.items())
+              if key[0] == partition['version'] and key[1] in CHECKPOINT_CACHE_KEYS}
+    temporary = f"{target}.{os.getpid()}.tmp"
+    os.makedirs(temporary, exist_ok=True)
+    try:
+        with open(os.path.join(temporary, 'arrays.bin'), 'wb') as arrays, \
+                open(os.path.join(temporary, 'state.pkl'), 'wb') as f:
+            CheckpointPickler(f, arrays).dump({'partition': partition, 'caches': caches})
+        os.replace(temporary, target)
+    except OSError:
+        # Another worker saved it first
+        if not os.path.exists(target):
+            raise
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+    print(f"Saved checkpoint of round {round_name} to {target}")
+    
+    # Remove the checkpoints of earlier versions of the round
+    stale = re.compile(re.escape(round_name) + r'-[0-9a-f]{16}$')
+    for name in os.listdir(CHECKPOINT_DIR):
+        if stale.match(name) and os.path.join(CHECKPOINT_DIR, name) != target:
+            shutil.rmtree(os.path.join(CHECKPOINT_DIR, name), ignore_errors=True)
+
+def restore_checkpoint(round_name, path):
+    """Store a round from the checkpoint of its file's content; False if there is none"""
+    try:
+        target = checkpoint_path(round_name, path)
+        with open(os.path.join(target, 'arrays.bin'), 'rb') as arrays, \
+                open(os.path.join(target, 'state.pkl'), 'rb') as f:
+            # Copy-on-write, so the restored columns stay writable
+            mapped = mmap.mmap(arrays.fileno(), 0, access=mmap.ACCESS_COPY) if os.fstat(arrays.fileno()).st_size else b''
+            state = CheckpointUnpickler(f, mapped).load()
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"Error restoring checkpoint of round {round_name}, preparing it again: {e}")
+        return False
+    partition = state['partition']
+    partition['version'] = f"{round_name}:{dataset_version(path)}"
+    partition['path'] = path
+    store_round(round_name, partition)
+    for key, value in state['caches'].items():
+        app.state.cache[(partition['version'],) + key] = value
+    print(f"Restored round {round_name} from {target}: {partition['households']:,} rows")
+    return True
+
+def append_round(round_name, path):
+    """
+    Load one survey round file as a new partition, aggregating only that partition,
+    or restore it from its checkpoint when the file is unchanged
+    """
+    if SHARDS:
+        return append_sharded_round(round_name, path)
+    if CHECKPOINT_DIR and restore_checkpoint(round_name, path):
+        return
+    columns, skipped = projected_columns(path)
+    df, quarantined, violations = load_dataset(path, columns)
+    quarantine = quarantine_rows(round_name, quarantined, violations, len(df) + len(quarantined))
+    projection = {'columnsSkipped': skipped, 'bytesSaved': skipped_bytes(path, skipped, len(df))}
+    register_round(round_name, df, dataset_version(path), path, projection, quarantine,
+                   np.setdiff1d(np.arange(len(df) + len(quarantined)), quarantined['source_row'])
+                   if len(quarantined) else None)
+    
+    # Report what the column projection saved
+    print(f"Loaded round {round_name}: {len(df):,} rows, {len(columns)} of {len(columns) + len(skipped)} columns, "
+          f"skipped {len(skipped)} (~{projection['bytesSaved'] / 2**20:.1f} MiB saved)"
+          + (f": {', '.join(skipped)}" if skipped else ""))
+
+def load_new_rounds():
+    """Append every ROUNDS_DIR/<round>.csv not loaded yet and return the new round names"""
+    if not os.path.isdir(ROUNDS_DIR):
+        return []
+    loaded = getattr(app.state, 'rounds', {})
+    new_rounds = []
+    for filename in sorted(os.listdir(ROUNDS_DIR)):
+        round_name, ext = os.path.splitext(filename)
+        if ext == '.csv' and round_name not in loaded:
+            append_round(round_name, os.path.join(ROUNDS_DIR, filename))
+            new_rounds.append(round_name)
+    return new_rounds
+
+def survey_round(round_name=None):
+    """The partition ({'df', 'version', 'aggregates'}) of a survey round, the default round if None"""
+    rounds = getattr(app.state, 'rounds', {})
+    name = round_name or DEFAULT_ROUND
+    if name not in rounds:
+        if round_name is not None and rounds:
+            raise HTTPException(status_code=404, detail=f"No data found for round: {round_name}")
+        raise HTTPException(status_code=500, detail="Data not loaded")
+    if rounds[name]['households'] == 0:
+        raise HTTPException(status_code=500, detail="Data not loaded")
+    return rounds[name]
+
+def split_values(value):
+    """The values of a comma-separated filter"""
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+def row_filters(sector: Optional[str] = None, hh_type: Optional[str] = None,
+                social_group: Optional[str] = None, type_rationcard: Optional[str] = None,
+                source_cooking: Optional[str] = None):
+    """
+    Household filters of the dashboard endpoints as (column, values) pairs. Each
+    filter is a comma-separated list of values, any of which matches; filters on
+    different columns must all match.
+    """
+    filters = {'sector': sector, 'hh_type': hh_type, 'social_group': social_group,
+               'type_rationcard': type_rationcard, 'source_cooking': source_cooking}
+    return tuple((col, split_values(value)) for col, value in filters.items() if value is not None)
+
+def state_filter(state, round_name=None):
+    """
+    The state parameter of a dashboard endpoint (comma-separated, 'All India' for
+    none) as a (column, values) filter, resolved through the bitmap indexes like the
+    household filters
+    """
+    states = split_values(state) if state and state != 'All India' else ()
+    if not states:
+        return ()
+    partition = survey_round(round_name)
+    known = column_bitmaps(partition, 'state') if partition['df'] is not None else partition['owners']
+    missing = [value for value in states if value not in known]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"No data found for state: {', '.join(missing)}")
+    return (('state', states),)
+
+def column_bitmaps(partition, col):
+    """Bitmap index of one grouping column, built when a skipped column is first loaded"""
+    bitmaps = partition['bitmaps']
+    if col not in bitmaps:
+        load_columns(partition, [col])
+        if col not in partition['df'].columns:
+            raise HTTPException(status_code=400, detail=f"Cannot filter on {col}: column not in dataset")
+        bitmaps.update(bitmap_index(partition['df'][[col]]))
+    return bitmaps[col]
+
+def filter_bitmap(partition, filters):
+    """Packed bitset of the households matching filters (None without filters), by AND/OR of the bitmap indexes"""
+    none = np.zeros((len(partition['df']) + 7) // 8, dtype=np.uint8)
+    selected = None
+    for col, values in filters:
+        bitmaps = column_bitmaps(partition, col)
+        matches = functools.reduce(np.bitwise_or, [bitmaps.get(value, none) for value in values], none)
+        selected = matches if selected is None else selected & matches
+    return selected
+
+def filter_rows(partition, filters):
+    """Row positions of the households matching filters"""
+    n_rows = len(partition['df'])
+    selected = filter_bitmap(partition, filters)
+    if selected is None:
+        return np.arange(n_rows)
+    return np.flatnonzero(np.unpackbits(selected, count=n_rows))
+
+def round_frame(round_name=None, columns=None, filters=()):
+    """
+    Household table of a survey round (the default round if None), loading any skipped
+    columns; with filters, a copy holding only the matching households
+    """
+    partition = survey_round(round_name)
+    if partition['df'] is None:
+        raise HTTPException(status_code=501, detail="Not available when the data is sharded (HCES_SHARDS); "
+                                                    "the shards only answer aggregate queries")
+    if columns:
+        load_columns(partition, columns)
+    if not filters:
+        return partition['df']
+    rows = filter_rows(partition, filters)
+    if len(rows) == 0:
+        raise HTTPException(status_code=404, detail="No households match the filters")
+    return partition['df'].take(rows)
+
+def shard_of(state, shard_count):
+    """Shard owning a state; crc32 rather than hash() so every process agrees"""
+    return zlib.crc32(str(state).encode()) % shard_count
+
+def shard_load(rounds, index, shard_count, round_name, path):
+    """
+    Load the households of the states this shard owns, reading the file in chunks so
+    no shard ever holds the whole round, and return the partials the coordinator
+    keeps: trend aggregates, per-state means, the household size table, the cell
+    moments and the states owned. The chunks only quarantine rows; the coordinator
+    checks the values of the whole file from the numeric counts returned.
+    """
+    columns, skipped = projected_columns(path)
+    parts, source_rows, quarantined, violations, numeric_counts = [], [], [], {}, {}
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=SHARD_LOAD_CHUNK_ROWS):
+        owners = {state: shard_of(state, shard_count) for state in chunk['state'].dropna().unique()}
+        # Shard 0 also takes the rows without a state, which validation quarantines
+        owned = (chunk['state'].map(owners) == index) | (chunk['state'].isna() & (index == 0))
+        rows = chunk.index.to_numpy()[owned.to_numpy()]
+        valid, bad, counts = validate_households(chunk.loc[rows], numeric_counts)
+        parts.append(valid)
+        source_rows.append(np.setdiff1d(rows, bad['source_row']))
+        quarantined.append(bad)
+        for name, count in counts.items():
+            violations[name] = violations.get(name, 0) + count
+    df = add_derived_columns(normalise_columns(pd.concat(parts, ignore_index=True)))
+    # Rows are labelled with their row in the file, which orders the households of
+    # all shards and keys the export cursors
+    df.index = np.concatenate(source_rows)
+    rounds[round_name] = {
+        'df': df,
+        'path': path,
+        'source_rows': df.index.to_numpy(),
+        'bitmaps': bitmap_index(df),
+        'sample': stratified_sample(df) if not df.empty else None
+    }
+    return {
+        'households': len(df),
+        'states': df['state'].dropna().unique().tolist(),
+        'columns': df.columns.tolist(),
+        'aggregates': round_aggregates(df) if not df.empty else pd.DataFrame(),
+        'means': state_means(df) if not df.empty else {},
+        'sizes': size_aggregates(df) if not df.empty else pd.DataFrame(),
+        'moments': cell_moments(df) if not df.empty else {},
+        'columnsSkipped': skipped,
+        'bytesSaved': skipped_bytes(path, skipped, len(df)),
+        'quarantined': pd.concat(quarantined, ignore_index=True),
+        'violations': violations,
+        'numericCounts': numeric_counts
+    }
+
+def shard_partials(rounds, index, shard_count, round_name, filters, context, computes):
+    """
+    Partials of this shard's households matching filters, one per SHARD_PARTIALS name
+    in computes (None for none); None when no household matches
+    """
+    partition = rounds[round_name]
+    rows = filter_rows(partition, filters)
+    if len(rows) == 0:
+        return None
+    computes = [SHARD_PARTIALS[name] if name else None for name in computes]
+    load_columns(partition, partials_columns(*computes))
+    df = partition['df'].take(rows) if filters else partition['df']
+    return [compute(df, context) if compute else None for compute in computes]
+
+def shard_estimate(rounds, index, shard_count, round_name, **args):
+    """estimate_partials of this shard's households"""
+    return estimate_partials(rounds[round_name], **args)
+
+def shard_rows(rounds, index, shard_count, round_name, filters):
+    """Rows in the file of this shard's households matching filters"""
+    partition = rounds[round_name]
+    return partition['df'].index.to_numpy()[filter_rows(partition, filters)]
+
+def shard_export(rounds, index, shard_count, round_name, columns, rows):
+    """The columns of this shard's households at the given rows in the file, which label them"""
+    partition = rounds[round_name]
+    load_columns(partition, columns)
+    return partition['df'].loc[rows, columns]
+
+# Requests a shard answers: op -> handler(rounds, index, shard_count, **args)
+SHARD_OPS = {
+    'load': shard_load,
+    'partials': shard_partials,
+    'estimate': shard_estimate,
+    'rows': shard_rows,
+    'export': shard_export
+}
+
+def shard_main(conn, index, shard_count):
+    """Request loop of a shard worker process: answers (op, args) messages until None"""
+    rounds = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        op, args = message
+        try:
+            conn.send((True, SHARD_OPS[op](rounds, index, shard_count, **args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+class LocalShard:
+    """
+    A shard in a local worker process, reached over a pipe. The coordinator only uses
+    request() and close(), so a shard on another node can stand in for it with a
+    client that sends the same (op, args) messages over the network.
+    """
+    def __init__(self, index, shard_count):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=shard_main, args=(child_conn, index, shard_count),
+                                       name=f"hces-shard-{index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.lock = threading.Lock()
+
+    def request(self, op, **args):
+        """Send one request and wait for its result"""
+        with self.lock:
+            self.conn.send((op, args))
+            ok, result = self.conn.recv()
+        if not ok:
+            raise RuntimeError(f"Shard {self.process.name} failed on {op}: {result}")
+        return result
+
+    def close(self):
+        try:
+            with self.lock:
+                self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+
+_shard_pool = None
+
+def shard_pool():
+    """Threads the coordinator waits on the shards with, one per shard"""
+    global _shard_pool
+    if _shard_pool is None:
+        _shard_pool = ThreadPoolExecutor(max_workers=SHARDS, thread_name_prefix="hces-scatter")
+    return _shard_pool
+
+def start_shards():
+    """Start the SHARDS local shard processes"""
+    app.state.shards = [LocalShard(index, SHARDS) for index in range(SHARDS)]
+
+def scatter_gather(op, shards=None, **args):
+    """Send a request to the shards (all by default) in parallel and return their results in order"""
+    return list(shard_pool().map(lambda shard: shard.request(op, **args), shards or app.state.shards))
+
+def shard_columns(partition):
+    """Columns the shards of a sharded round hold or can load from the file"""
+    skipped = partition['projection']['columnsSkipped']
+    return set(partition['columns']) | {'social_group' if col == 'caste' else col for col in skipped}
+
+def round_partials(round_name, filters, context, *computes):
+    """
+    Partials of the households of a round matching filters, one per compute(df,
+    context) (None for none): computed from the round frame, or by every shard from
+    its households and merged when the round is sharded, with the columns the
+    computes declare loaded
+    """
+    partition = survey_round(round_name)
+    if partition['df'] is not None:
+        df = round_frame(round_name, partials_columns(*computes), filters)
+        survey_weights(df, context['weighted'])
+        return [compute(df, context) if compute else None for compute in computes]
+    
+    # Check here what the shards could only fail on
+    columns = shard_columns(partition)
+    unknown = [col for col, _ in filters if col not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot filter on {unknown[0]}: column not in dataset")
+    if context['weighted'] and WEIGHT_COLUMN not in columns:
+        raise HTTPException(status_code=400, detail=f"Weight column '{WEIGHT_COLUMN}' not found in dataset")
+    results = scatter_gather('partials', round_name=round_name or DEFAULT_ROUND, filters=filters, context=context,
+                             computes=[compute.__name__ if compute else None for compute in computes])
+    results = [result for result in results if result is not None]
+    if not results:
+        raise HTTPException(status_code=404, detail="No households match the filters")
+    return [merge_partials(list(parts)) for parts in zip(*results)]
+
+def append_sharded_round(round_name, path):
+    """
+    Load a survey round across the shards. The coordinator keeps only the merged
+    partials: trend aggregates, per-state means for the ranking index, the state x
+    household size table and the cell moments of /api/regression, which concatenate
+    across shards since every state lives on exactly one of them.
+    """
+    # Structural problems of the header fail here rather than in every shard
+    validate_households(pd.read_csv(path, nrows=0))
+    results = scatter_gather('load', round_name=round_name, path=path)
+    # and those of the values over the whole file, from the counts of every shard's chunks
+    numeric_counts = {}
+    for result in results:
+        add_numeric_counts(numeric_counts, result['numericCounts'])
+    check_numeric_counts(numeric_counts)
+    quarantined = pd.concat([result['quarantined'] for result in results]).sort_values('source_row', ignore_index=True)
+    violations = {}
+    for result in results:
+        for name, count in result['violations'].items():
+            violations[name] = violations.get(name, 0) + count
+    loaded = [result for result in results if result['households']]
+    means = {
+        weighted: pd.concat([result['means'][weighted] for result in loaded]).sort_index()
+        for weighted in (False, True)
+        if loaded and all(weighted in result['means'] for result in loaded)
+    }
+    households = sum(result['households'] for result in results)
+    quarantine = quarantine_rows(round_name, quarantined, violations, households + len(quarantined))
+    projection = {'columnsSkipped': results[0]['columnsSkipped'],
+                  'bytesSaved': sum(result['bytesSaved'] for result in results)}
+    store_round(round_name, {
+        'df': None,
+        'version': f"{round_name}:{dataset_version(path)}",
+        'households': households,
+        'aggregates': pd.concat([result['aggregates'] for result in loaded]).sort_index() if loaded else pd.DataFrame(),
+        'rankings': ranking_index(means),
+        'sizes': pd.concat([result['sizes'] for result in loaded]).sort_index() if loaded else pd.DataFrame(),
+        'moments': concat_moments([result['moments'] for result in loaded]),
+        'path': path,
+        'projection': projection,
+        'quarantine': quarantine,
+        'owners': {state: index for index, result in enumerate(results) for state in result['states']},
+        'columns': results[0]['columns']
+    })
+    sizes = ', '.join(f"{result['households']:,}" for result in results)
+    print(f"Loaded round {round_name}: {households:,} rows across {len(results)} shards ({sizes})")
+
+def encode_cursor(version, row):
+    """Opaque export cursor: the round version and the next row position"""
+    return base64.urlsafe_b64encode(json.dumps([version, int(row)]).encode()).decode()
+
+def decode_cursor(cursor, version):
+    """Row position of an export cursor, rejecting cursors from another dataset version"""
+    try:
+        cursor_version, row = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_version != version:
+        raise HTTPException(status_code=400, detail="Cursor is from another dataset version, restart the export")
+    return row
+
+def export_frames(columns, rows):
+    """Frames of the selected rows, EXPORT_CHUNK_ROWS at a time"""
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        chunk = rows[start:start + EXPORT_CHUNK_ROWS]
+        yield pd.DataFrame({name: series.iloc[chunk] for name, series in columns.items()})
+
+def flush_buffer(buffer):
+    """Return and clear the bytes written to an in-memory buffer"""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+def shard_export_frames(round_name, columns, rows, owners):
+    """
+    Frames of the selected file rows (owners: the shard holding each), EXPORT_CHUNK_ROWS
+    at a time, each gathered from the shards holding its rows
+    """
+    shards = app.state.shards
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        chunk, held = rows[start:start + EXPORT_CHUNK_ROWS], owners[start:start + EXPORT_CHUNK_ROWS]
+        parts = shard_pool().map(
+            lambda index: shards[index].request('export', round_name=round_name, columns=columns,
+                                                rows=chunk[held == index]),
+            np.unique(held).tolist())
+        frame = pd.concat(list(parts)).loc[chunk].reset_index(drop=True)
+        # Shards hold their own categories, which concatenate to plain objects
+        yield frame.astype({col: 'category' for col in GROUP_COLUMNS if col in frame.columns})
+
+def export_stream(frames, empty, export_format):
+    """
+    Serialise the frames of the selected rows (empty: a frame of none of them, for the
+    header and schema) chunk by chunk. Starlette iterates this generator in its
+    threadpool, so only one chunk is in memory and the event loop stays free.
+    """
+    if export_format == 'arrow':
+        buffer = io.BytesIO()
+        writer = schema = None
+        for frame in frames:
+            # Later chunks reuse the first chunk's schema, e.g. for all-null string columns
+            batch = pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False)
+            if writer is None:
+                schema = batch.schema
+                writer = pa.ipc.new_stream(buffer, schema)
+            writer.write_batch(batch)
+            yield flush_buffer(buffer)
+        if writer is None:
+            writer = pa.ipc.new_stream(buffer, pa.Schema.from_pandas(empty, preserve_index=False))
+        writer.close()
+        yield flush_buffer(buffer)
+        return
+    
+    written = False
+    for frame in frames:
+        if export_format == 'csv':
+            yield frame.to_csv(index=False, header=not written)
+        else:
+            yield frame.to_json(orient='records', lines=True)
+        written = True
+    if export_format == 'csv' and not written:
+        yield ','.join(empty.columns) + '\n'
+
+# Load the data
+def run_phase(name, step):
+    """Run one phase of the data load, recording its status and timing for /readyz"""
+    phase = {'name': name, 'status': 'running', 'startedAt': time.time(), 'seconds': None}
+    app.state.readiness['phases'].append(phase)
+    start = time.perf_counter()
+    try:
+        result = step()
+        phase['status'] = 'done'
+        return result
+    except Exception as e:
+        phase['status'] = 'failed'
+        phase['error'] = str(e)
+        raise
+    finally:
+        phase['seconds'] = round(time.perf_counter() - start, 3)
+
+def warm_caches():
+    """Build the cached bootstrap state of every round so the first ci=true request is fast"""
+    for round_name, partition in app.state.rounds.items():
+        df, version = partition['df'], partition['version']
+        if df is None or df.empty:
+            continue
+        order, _, _ = cached_result(('bootstrap_strata',), lambda: bootstrap_strata(df), version)
+        cached_result(('bootstrap_resamples',), lambda: poisson_resamples(len(order)), version)
+
+def save_checkpoints():
+    """Checkpoint every prepared round not checkpointed yet; runs on the compute thread"""
+    if not CHECKPOINT_DIR or SHARDS:
+        return
+    for round_name, partition in list(app.state.rounds.items()):
+        try:
+            save_checkpoint(round_name, partition)
+        except Exception as e:
+            print(f"Error saving checkpoint of round {round_name}: {e}")
+
+def prepare_new_rounds():
+    """Load the rounds added since startup, warm their caches and checkpoint them; runs on the compute thread"""
+    added = load_new_rounds()
+    warm_caches()
+    save_checkpoints()
+    return added
+
+def prepare_data():
+    """Load and prepare the survey rounds; runs in a background thread at startup"""
+    readiness = app.state.readiness
+    readiness['status'] = 'loading'
+    if SHARDS:
+        try:
+            run_phase('shards', start_shards)
+        except Exception as e:
+            readiness['error'] = f"Failed to start the shard processes: {e}"
+            readiness['status'] = 'failed'
+            return
+    try:
+        run_phase('load', lambda: append_round(DEFAULT_ROUND, DATA_PATH))
+    except DataValidationError as e:
+        # A malformed file is not papered over with the sample data
+        readiness['error'] = f"Invalid data in {DATA_PATH}: {e}"
+        readiness['status'] = 'failed'
+        print(f"Invalid data in {DATA_PATH}: {e}")
+        return
     except Exception as e:
         print(f"Error loading data: {e}")
-        # Load a backup or sample if main data fails
+        # Load a backup or sample if main data fails, and say so in /readyz
         try:
-            app.state.df = pd.read_csv("data/sample_hces_data.csv")
-            # Similar conversions for sample data
-        except:
-            # Create empty DataFrame with expected columns if all else fails
-            app.state.df = pd.DataFrame()
+            run_phase('load_sample', lambda: append_round(DEFAULT_ROUND, SAMPLE_DATA_PATH))
+            readiness['fallback'] = f"{SAMPLE_DATA_PATH} (main data failed: {e})"
+        except Exception as sample_error:
+            readiness['error'] = f"Failed to load any data: {e}; sample: {sample_error}"
+            readiness['status'] = 'failed'
             print("Failed to load any data")
+            return
+    try:
+        run_phase('rounds', load_new_rounds)
+    except Exception as e:
+        print(f"Error loading survey rounds: {e}")
+    try:
+        run_phase('caches', warm_caches)
+    except Exception as e:
+        print(f"Error building caches: {e}")
+    readiness['status'] = 'ready'
+    
+    # Checkpoint the prepared rounds for the next boot once requests are being served,
+    # on the compute thread so no handler changes a frame while it is pickled
+    compute_pool().submit(save_checkpoints)
+
+@app.on_event("startup")
+async def startup_db_client():
+    """Start the data load in the background so the server accepts connections immediately"""
+    app.state.cache = {}
+    app.state.rounds = {}
+    app.state.readiness = {'status': 'starting', 'phases': []}
+    threading.Thread(target=prepare_data, name="hces-data-load", daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_shards():
+    """Stop the shard processes"""
+    for shard in getattr(app.state, 'shards', []):
+        shard.close()
 
 @app.get("/")
-async def root():
+async def root(request: Request):
+    if 'index.html' in SPA_FILES:
+        return await serve_react_app('', request)
     return {"message": "HCES Data Visualization API is running"}
 
 @app.get("/api/states")
-async def get_states():
+async def get_states(round: Optional[str] = None):
     """Get list of all states in the dataset"""
-    if not hasattr(app.state, 'df') or app.state.df.empty:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    states = app.state.df['state'].unique().tolist()
+    partition = survey_round(round)
+    if partition['df'] is None:
+        states = list(partition['owners'])
+    else:
+        states = partition['df']['state'].unique().tolist()
     return {"states": sorted(states)}
 
-@app.get("/api/expenditure-overview")
-async def get_expenditure_overview(state: Optional[str] = None):
+def parse_fields(fields, sections):
+    """Names of the sections selected by a comma-separated fields= parameter (all if None)"""
+    if fields is None:
+        return list(sections)
+    names = split_values(fields)
+    unknown = [name for name in names if name not in sections]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"fields must be a comma-separated list of: {', '.join(sections)}")
+    return [name for name in sections if name in names]
+
+def dashboard_sections(route, sections, fields, round_name, filters, context, cache_key):
     """
-    Get overview of expenditure data.
-    Can be filtered by state if state parameter is provided.
+    Compute the sections of a dashboard response selected by fields. A section is a
+    (partials, finish) pair: partials(df, context) of the households matching filters,
+    merged across the shards when the round is sharded (None if the section needs
+    none), and finish(partials, context) making the section from them. Each section
+    is cached on its own under cache_key, so responses asking for other fields reuse
+    it; cache_key is None when the rows were selected by filters, whose combinations
+    are unbounded.
     """
-    if not hasattr(app.state, 'df') or app.state.df.empty:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    df = app.state.df
-    
-    # Filter by state if provided
-    if state and state != 'All India':
-        df = df[df['state'] == state]
-        if df.empty:
-            raise HTTPException(status_code=404, detail=f"No data found for state: {state}")
-    
-    # Calculate overall expenditure statistics
-    overall_monthly_exp = df['household_reported_monthly_exp'].mean()
-    rural_monthly_exp = df[df['sector'] == 'Rural']['household_reported_monthly_exp'].mean()
-    urban_monthly_exp = df[df['sector'] == 'Urban']['household_reported_monthly_exp'].mean()
-    
-    # Get state-wise data for all states
+    version = survey_round(round_name)['version']
+    keys = {name: None if cache_key is None else (route, name) + cache_key for name in parse_fields(fields, sections)}
+    missing = [name for name, key in keys.items() if key is None or not is_cached(key, version)]
+    partials = {}
+    if missing:
+        partials = dict(zip(missing, round_partials(round_name, filters, context,
+                                                    *(sections[name][0] for name in missing))))
+    response = {}
+    for name, key in keys.items():
+        compute = functools.partial(sections[name][1], partials.get(name), context)
+        response[name] = compute() if key is None else cached_result(key, compute, version)
+    return response
+
+# Sections of /api/expenditure-overview. The partials take the households in scope
+# and the request context (weighted, ci, ci_level, round, scope); each section is
+# then made from the merged partials and the context
+@shard_partial('sector', 'household_reported_monthly_exp')
+def overview_summary_partials(df, context):
+    """Expenditure sums overall and by sector"""
+    return {
+        'all': grouped_sums(df, None, ['household_reported_monthly_exp'], context['weighted']),
+        'sector': grouped_sums(df, 'sector', ['household_reported_monthly_exp'], context['weighted'])
+    }
+
+def overview_summary(partials, context):
+    """Overall, rural and urban average expenditure"""
+    weighted = context['weighted']
+    sector_monthly_exp = sums_means(partials['sector'], 'household_reported_monthly_exp', weighted)
+    overview = {
+        "overall_monthly_exp": sums_means(partials['all'], 'household_reported_monthly_exp', weighted)['All'],
+        "rural_monthly_exp": sector_monthly_exp.get('Rural', np.nan),
+        "urban_monthly_exp": sector_monthly_exp.get('Urban', np.nan),
+        "sample_size": int(partials['all'].at['All', 'households'])
+    }
+    # A sector left out by the filters has no average
+    for name in ['overall_monthly_exp', 'rural_monthly_exp', 'urban_monthly_exp']:
+        if not np.isfinite(overview[name]):
+            overview[name] = None
+    if context['ci']:
+        weighted, ci_level, scope, round = context['weighted'], context['ci_level'], context['scope'], context['round']
+        overall_interval = confidence_intervals(None, ['household_reported_monthly_exp'], weighted, ci_level, scope, round)
+        sector_intervals = confidence_intervals('sector', ['household_reported_monthly_exp'], weighted, ci_level, scope, round)
+        for name, intervals, key in [
+            ('overall_monthly_exp', overall_interval, 'All'),
+            ('rural_monthly_exp', sector_intervals, 'Rural'),
+            ('urban_monthly_exp', sector_intervals, 'Urban')
+        ]:
+            bounds = intervals.reindex([key]).iloc[0]
+            for bound in ['ci_lower', 'ci_upper']:
+                value = bounds[f'household_reported_monthly_exp_{bound}']
+                overview[f'{name}_{bound}'] = value if np.isfinite(value) else None
+    return overview
+
+@shard_partial('state', 'household_reported_monthly_exp')
+def overview_state_data_partials(df, context):
+    """Expenditure histogram by state"""
+    return {'state': value_histogram(df, 'state', 'household_reported_monthly_exp', context['weighted'])}
+
+def overview_state_data(partials, context):
+    """State-wise expenditure for all states in scope"""
     state_data = (
-        df.groupby('state')['household_reported_monthly_exp']
-        .agg(['mean', 'median', 'count'])
+        histogram_stats(partials['state'], ['mean', 'median', 'count'], context['weighted'])
         .reset_index()
         .rename(columns={
             'mean': 'avg_monthly_exp',
@@ -109,110 +2495,86 @@ async def get_expenditure_overview(state: Optional[str] = None):
         })
         .sort_values('avg_monthly_exp', ascending=False)
     )
-    state_data = clean_json_values(state_data)
-    
-    # Define Union Territories to exclude them from the top/bottom states
-    union_territories = [
-        'Chandigarh', 'Puducherry', 'Andaman and Nicobar Islands', 'Lakshadweep',
-        'Dadra and Nagar Haveli', 'Daman and Diu', 'Delhi', 'Ladakh', 
-        'Jammu & Kashmir', 'Andaman and Nicobar'
-    ]
-    
-    # Always use the global state data for rankings
-    all_state_data = (
-        app.state.df.groupby('state')['household_reported_monthly_exp']
-        .agg(['mean'])
-        .reset_index()
-        .rename(columns={'mean': 'avg_monthly_exp'})
-    )
-    
-    # Filter out UTs for ranking
-    states_only = all_state_data[~all_state_data['state'].isin(union_territories)]
-    
-    # Sort for top and bottom states
-    top_states_data = states_only.sort_values('avg_monthly_exp', ascending=False)
-    bottom_states_data = states_only.sort_values('avg_monthly_exp', ascending=True)
-    
-    # Get top 5 and bottom 5 states
-    top_states = top_states_data.head(5)[['state', 'avg_monthly_exp']].to_dict('records')
-    bottom_states = bottom_states_data.head(5)[['state', 'avg_monthly_exp']].to_dict('records')
-    
-    # Clean the values
-    top_states = [{k: (None if pd.isna(v) or (isinstance(v, float) and np.isinf(v)) else v) 
-                  for k, v in state.items()} for state in top_states]
-    bottom_states = [{k: (None if pd.isna(v) or (isinstance(v, float) and np.isinf(v)) else v) 
-                     for k, v in state.items()} for state in bottom_states]
-    
-    # Create state rankings
-    state_rankings = {
-        'top': top_states,
-        'bottom': bottom_states
-    }
-    
-    # Calculate major expenditure categories
-    expenditure_columns = [
-        'food_monthly_value',  # We'll calculate this
-        'fuel_light_monthly_value',
-        'clothing_monthly_value',
-        'footwear_monthly_value',
-        'medical_hospitalisation_monthly_value',
-        'medical_non_hospitalisation_monthly_value',
-        'rent_monthly_value',
-        'imputed_rent_monthly_value',
-        'conveyance_monthly_value',
-        'consumer_services_monthly_value',
-        'entertainment_monthly_value',
-    ]
-    
-    # Calculate food expenditure (sum of all food categories)
-    food_columns = [
-        'cereals_monthly_total_value',
-        'pulses_monthly_total_value',
-        'milk_products_monthly_total_value',
-        'edible_oils_monthly_total_value',
-        'egg_fish_meat_monthly_total_value',
-        'vegetables_monthly_total_value',
-        'fruits_fresh_monthly_total_value',
-        'fruits_dry_monthly_total_value',
-        'spices_monthly_total_value',
-        'salt_sugar_monthly_total_value',
-        'beverages_monthly_total_value'
-    ]
-    
-    df['food_monthly_value'] = df[food_columns].sum(axis=1)
-    
-    # Prepare expenditure breakdown data
-    expenditure_breakdown = [
-        {'category': 'Food', 'value': df['food_monthly_value'].mean()},
-        {'category': 'Fuel & Light', 'value': df['fuel_light_monthly_value'].mean()},
-        {'category': 'Housing', 'value': df[['rent_monthly_value', 'imputed_rent_monthly_value']].sum(axis=1).mean()},
-        {'category': 'Clothing & Footwear', 'value': df[['clothing_monthly_value', 'footwear_monthly_value']].sum(axis=1).mean()},
-        {'category': 'Healthcare', 'value': df[['medical_hospitalisation_monthly_value', 'medical_non_hospitalisation_monthly_value']].sum(axis=1).mean()},
-        {'category': 'Transport', 'value': df['conveyance_monthly_value'].mean()},
-        {'category': 'Entertainment', 'value': df['entertainment_monthly_value'].mean()}
-    ]
-    
-    # Food expenditure details
-    food_expenditure_value = [
-        {'category': 'Cereals', 'value': df['cereals_monthly_total_value'].mean()},
-        {'category': 'Pulses', 'value': df['pulses_monthly_total_value'].mean()},
-        {'category': 'Milk Products', 'value': df['milk_products_monthly_total_value'].mean()},
-        {'category': 'Edible Oils', 'value': df['edible_oils_monthly_total_value'].mean()},
-        {'category': 'Vegetables', 'value': df['vegetables_monthly_total_value'].mean()},
-        {'category': 'Fresh Fruits', 'value': df['fruits_fresh_monthly_total_value'].mean()},
-        {'category': 'Dry Fruits', 'value': df['fruits_dry_monthly_total_value'].mean()},
-        {'category': 'Meat/Fish/Eggs', 'value': df['egg_fish_meat_monthly_total_value'].mean()},
-        {'category': 'Spices', 'value': df['spices_monthly_total_value'].mean()},
-        {'category': 'Sugar & Salt', 'value': df['salt_sugar_monthly_total_value'].mean()},
-        {'category': 'Beverages', 'value': df['beverages_monthly_total_value'].mean()}
+    if context['ci']:
+        state_intervals = confidence_intervals('state', ['household_reported_monthly_exp'], context['weighted'],
+                                               context['ci_level'], context['scope'], context['round'])
+        state_data = attach_intervals(state_data, 'state', state_intervals, 'household_reported_monthly_exp', 'avg_monthly_exp')
+    return clean_json_values(state_data)
+
+def overview_state_rankings(partials, context):
+    """Top 5 and bottom 5 states excluding UTs, always over the whole round, from the ranking index"""
+    partition = survey_round(context['round'])
+    top_states_data, bottom_states_data = [
+        ranked_states(partition, 'household_reported_monthly_exp', context['weighted'], 5, exclude_uts=True, direction=direction)
+        .rename(columns={'value': 'avg_monthly_exp'})
+        for direction in ('top', 'bottom')
     ]
-    
-    # Clean expenditure breakdown and food values
-    expenditure_breakdown = clean_json_values(pd.DataFrame(expenditure_breakdown)).to_dict('records')
+    if context['ci']:
+        all_state_intervals = confidence_intervals('state', ['household_reported_monthly_exp'], context['weighted'],
+                                                   context['ci_level'], round=context['round'])
+        top_states_data, bottom_states_data = [
+            attach_intervals(data, 'state', all_state_intervals, 'household_reported_monthly_exp', 'avg_monthly_exp')
+            for data in (top_states_data, bottom_states_data)
+        ]
+    return {
+        'top': clean_json_values(top_states_data),
+        'bottom': clean_json_values(bottom_states_data)
+    }
+
+@shard_partial(
+    'food_monthly_value', 'fuel_light_monthly_value', 'rent_monthly_value', 'imputed_rent_monthly_value',
+    'clothing_monthly_value', 'footwear_monthly_value', 'medical_hospitalisation_monthly_value',
+    'medical_non_hospitalisation_monthly_value', 'conveyance_monthly_value', 'entertainment_monthly_value'
+)
+def overview_expenditure_breakdown_partials(df, context):
+    """Expenditure sums of the major categories; food_monthly_value is derived at load time"""
+    categories = sums_frame(df, {
+        'Food': df['food_monthly_value'],
+        'Fuel & Light': df['fuel_light_monthly_value'],
+        'Housing': df[['rent_monthly_value', 'imputed_rent_monthly_value']].sum(axis=1),
+        'Clothing & Footwear': df[['clothing_monthly_value', 'footwear_monthly_value']].sum(axis=1),
+        'Healthcare': df[['medical_hospitalisation_monthly_value', 'medical_non_hospitalisation_monthly_value']].sum(axis=1),
+        'Transport': df['conveyance_monthly_value'],
+        'Entertainment': df['entertainment_monthly_value']
+    })
+    return {'all': grouped_sums(categories, None, [col for col in categories.columns if col != WEIGHT_COLUMN],
+                                context['weighted'])}
+
+def overview_expenditure_breakdown(partials, context):
+    """Average expenditure on the major categories"""
+    means = sums_means(partials['all'], sums_columns(partials['all']), context['weighted']).loc['All']
+    expenditure_breakdown = [{'category': category, 'value': value} for category, value in means.items()]
+    return clean_json_values(pd.DataFrame(expenditure_breakdown)).to_dict('records')
+
+@shard_partial(*FOOD_COLUMNS, 'food_monthly_value')
+def overview_food_details_partials(df, context):
+    """Expenditure sums of each food category and of all food"""
+    items = sums_frame(df, {
+        'Cereals': df['cereals_monthly_total_value'],
+        'Pulses': df['pulses_monthly_total_value'],
+        'Milk Products': df['milk_products_monthly_total_value'],
+        'Edible Oils': df['edible_oils_monthly_total_value'],
+        'Vegetables': df['vegetables_monthly_total_value'],
+        'Fresh Fruits': df['fruits_fresh_monthly_total_value'],
+        'Dry Fruits': df['fruits_dry_monthly_total_value'],
+        'Meat/Fish/Eggs': df['egg_fish_meat_monthly_total_value'],
+        'Spices': df['spices_monthly_total_value'],
+        'Sugar & Salt': df['salt_sugar_monthly_total_value'],
+        'Beverages': df['beverages_monthly_total_value']
+    })
+    return {
+        'items': grouped_sums(items, None, [col for col in items.columns if col != WEIGHT_COLUMN], context['weighted']),
+        'total': grouped_sums(df, None, ['food_monthly_value'], context['weighted'])
+    }
+
+def overview_food_details(partials, context):
+    """Average expenditure on each food category, in rupees and as a share of food expenditure"""
+    means = sums_means(partials['items'], sums_columns(partials['items']), context['weighted']).loc['All']
+    food_expenditure_value = [{'category': category, 'value': value} for category, value in means.items()]
     food_expenditure_value = clean_json_values(pd.DataFrame(food_expenditure_value)).to_dict('records')
     
     # Calculate percentages for food items
-    total_food_exp = df['food_monthly_value'].mean()
+    total_food_exp = sums_means(partials['total'], 'food_monthly_value', context['weighted'])['All']
     if total_food_exp > 0:
         food_expenditure_percent = [
             {'category': item['category'], 'value': (item['value'] / total_food_exp) * 100 if total_food_exp > 0 else 0} 
@@ -221,75 +2583,103 @@ async def get_expenditure_overview(state: Optional[str] = None):
         food_expenditure_percent = clean_json_values(pd.DataFrame(food_expenditure_percent)).to_dict('records')
     else:
         food_expenditure_percent = food_expenditure_value
-    
-    # Non-essential expenditure details
-    non_essential_details = [
-        {'category': 'Pan', 'value': df['pan_monthly_value'].mean()},
-        {'category': 'Tobacco', 'value': df['tobacco_monthly_value'].mean()},
-        {'category': 'Intoxicants', 'value': df['intoxicants_monthly_value'].mean()},
-        {'category': 'Entertainment', 'value': df['entertainment_monthly_value'].mean()}
-    ]
-    
-    # Clean non-essential values
-    non_essential_details = clean_json_values(pd.DataFrame(non_essential_details)).to_dict('records')
-    
-    # Prepare response
-    response = {
-        "overview": {
-            "overall_monthly_exp": overall_monthly_exp,
-            "rural_monthly_exp": rural_monthly_exp,
-            "urban_monthly_exp": urban_monthly_exp,
-            "sample_size": len(df)
-        },
-        "stateData": state_data.to_dict('records'),
-        "stateRankings": state_rankings,
-        "expenditureBreakdown": expenditure_breakdown,
-        "foodExpenditureDetails": {
-            "valueData": food_expenditure_value,
-            "percentageData": food_expenditure_percent
-        },
-        "nonEssentialDetails": non_essential_details
+    return {
+        "valueData": food_expenditure_value,
+        "percentageData": food_expenditure_percent
     }
+
+@shard_partial('pan_monthly_value', 'tobacco_monthly_value', 'intoxicants_monthly_value', 'entertainment_monthly_value')
+def overview_non_essential_partials(df, context):
+    """Expenditure sums of the non-essential items"""
+    items = sums_frame(df, {
+        'Pan': df['pan_monthly_value'],
+        'Tobacco': df['tobacco_monthly_value'],
+        'Intoxicants': df['intoxicants_monthly_value'],
+        'Entertainment': df['entertainment_monthly_value']
+    })
+    return {'all': grouped_sums(items, None, [col for col in items.columns if col != WEIGHT_COLUMN], context['weighted'])}
+
+def overview_non_essential(partials, context):
+    """Average expenditure on non-essential items"""
+    means = sums_means(partials['all'], sums_columns(partials['all']), context['weighted']).loc['All']
+    non_essential_details = [{'category': category, 'value': value} for category, value in means.items()]
+    return clean_json_values(pd.DataFrame(non_essential_details)).to_dict('records')
+
+OVERVIEW_SECTIONS = {
+    "overview": (overview_summary_partials, overview_summary),
+    "stateData": (overview_state_data_partials, overview_state_data),
+    "stateRankings": (None, overview_state_rankings),
+    "expenditureBreakdown": (overview_expenditure_breakdown_partials, overview_expenditure_breakdown),
+    "foodExpenditureDetails": (overview_food_details_partials, overview_food_details),
+    "nonEssentialDetails": (overview_non_essential_partials, overview_non_essential)
+}
+
+@app.get("/api/expenditure-overview")
+@single_flight
+async def get_expenditure_overview(state: Optional[str] = None, weighted: bool = False,
+                                   ci: bool = False, ci_level: float = 0.95,
+                                   fields: Optional[str] = None, round: Optional[str] = None,
+                                   filters: tuple = Depends(row_filters)):
+    """
+    Get overview of expenditure data.
+    Can be filtered by state if state parameter is provided.
+    Set weighted=true for estimates weighted by the household multipliers, and
+    ci=true to add bootstrap confidence intervals (at ci_level) to the averages.
+    fields is a comma-separated list of the response sections to compute (default: all).
+    """
+    if ci and filters:
+        raise HTTPException(status_code=400, detail="ci=true is not available with household filters")
+    # Select the state(s) together with the household filters, from the bitmap indexes
+    states = state_filter(state, round)
+    scope = states[0][1] if states else None
     
-    return response
-@app.get("/api/rural-urban-comparison")
-async def get_rural_urban_comparison():
-    """Get comparison data between rural and urban sectors"""
-    if not hasattr(app.state, 'df') or app.state.df.empty:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    df = app.state.df
-    
-    # Expenditure comparison
+    context = {'weighted': weighted, 'ci': ci, 'ci_level': ci_level, 'round': round, 'scope': scope}
+    cache_key = None if filters else (scope, weighted, ci, ci_level)
+    return respond(dashboard_sections('expenditure_overview', OVERVIEW_SECTIONS, fields, round, filters + states,
+                                      context, cache_key))
+
+# Sections of /api/rural-urban-comparison. The partials take the households and the
+# request context (weighted, round); each section is then made from the merged
+# partials and the context
+@shard_partial('sector', 'household_reported_monthly_exp')
+def rural_urban_expenditure_partials(df, context):
+    """Expenditure histogram by sector"""
+    return {'sector': value_histogram(df, 'sector', 'household_reported_monthly_exp', context['weighted'])}
+
+def rural_urban_expenditure(partials, context):
+    """Expenditure statistics by sector"""
     expenditure_by_sector = (
-        df.groupby('sector')['household_reported_monthly_exp']
-        .agg(['mean', 'median', 'std'])
+        histogram_stats(partials['sector'], ['mean', 'median', 'std'], context['weighted'])
         .reset_index()
     )
-    expenditure_by_sector = clean_json_values(expenditure_by_sector)
-    
-    # Calculate food expenditure percentage
-    food_columns = [
-        'cereals_monthly_total_value', 'pulses_monthly_total_value',
-        'milk_products_monthly_total_value', 'edible_oils_monthly_total_value',
-        'egg_fish_meat_monthly_total_value', 'vegetables_monthly_total_value',
-        'fruits_fresh_monthly_total_value', 'fruits_dry_monthly_total_value',
-        'spices_monthly_total_value', 'salt_sugar_monthly_total_value',
-        'beverages_monthly_total_value'
-    ]
-    
-    df['food_monthly_value'] = df[food_columns].sum(axis=1)
-    df['food_expenditure_pct'] = (df['food_monthly_value'] / df['household_reported_monthly_exp']) * 100
-    
+    return clean_json_values(expenditure_by_sector)
+
+@shard_partial('sector', 'food_monthly_value', 'household_reported_monthly_exp')
+def rural_urban_food_percentage_partials(df, context):
+    """Sums of the share of food in household expenditure by sector"""
+    food_pct = sums_frame(df, {
+        'sector': df['sector'],
+        'food_expenditure_pct': (df['food_monthly_value'] / df['household_reported_monthly_exp']) * 100
+    })
+    return {'sector': grouped_sums(food_pct, 'sector', ['food_expenditure_pct'], context['weighted'])}
+
+def rural_urban_food_percentage(partials, context):
+    """Average share of food in household expenditure by sector"""
     food_pct_by_sector = (
-        df.groupby('sector')['food_expenditure_pct']
-        .mean()
+        sums_means(partials['sector'], 'food_expenditure_pct', context['weighted'])
         .reset_index()
         .rename(columns={'food_expenditure_pct': 'avg_food_expenditure_pct'})
     )
-    food_pct_by_sector = clean_json_values(food_pct_by_sector)
-    
-        # Calculate expenditure for major categories
+    return clean_json_values(food_pct_by_sector)
+
+@shard_partial(
+    'sector', 'food_monthly_value', 'rent_monthly_value', 'imputed_rent_monthly_value',
+    'medical_hospitalisation_monthly_value', 'medical_non_hospitalisation_monthly_value', 'education_monthly_value',
+    'conveyance_monthly_value', 'fuel_light_monthly_value', 'clothing_monthly_value', 'footwear_monthly_value',
+    'personal_goods_monthly_value', 'entertainment_monthly_value', 'consumer_services_monthly_value'
+)
+def rural_urban_category_expenditure_partials(df, context):
+    """Expenditure sums of the major categories by sector"""
     expense_categories = [
         ('Food', 'food_monthly_value'),
         ('Housing', ['rent_monthly_value', 'imputed_rent_monthly_value']),
@@ -302,33 +2692,27 @@ async def get_rural_urban_comparison():
         ('Entertainment', 'entertainment_monthly_value'),
         ('Consumer Services', 'consumer_services_monthly_value')
     ]
+    category_values = sums_frame(df, {
+        category_name: df[column_names].sum(axis=1) if isinstance(column_names, list) else df[column_names]
+        for category_name, column_names in expense_categories
+    })
+    category_values['sector'] = df['sector']
+    return {'sector': grouped_sums(category_values, 'sector', [name for name, _ in expense_categories], context['weighted'])}
 
+def rural_urban_category_expenditure(partials, context):
+    """Average expenditure on the major categories by sector, with each sector's shares adding up to 100%"""
     # Create category expenditure data - one approach that ensures 100% total
     rural_totals = {}
     urban_totals = {}
 
     # First calculate average values for each category by sector
-    for category_name, column_names in expense_categories:
-        if isinstance(column_names, list):
-            # Sum multiple columns
-            for sector in ['Rural', 'Urban']:
-                sector_df = df[df['sector'] == sector]
-                if not sector_df.empty:
-                    avg_value = sector_df[column_names].sum(axis=1).mean()
-                    if sector == 'Rural':
-                        rural_totals[category_name] = avg_value
-                    else:
-                        urban_totals[category_name] = avg_value
-        else:
-            # Use the single column directly
-            for sector in ['Rural', 'Urban']:
-                sector_df = df[df['sector'] == sector]
-                if not sector_df.empty:
-                    avg_value = sector_df[column_names].mean()
-                    if sector == 'Rural':
-                        rural_totals[category_name] = avg_value
-                    else:
-                        urban_totals[category_name] = avg_value
+    categories = sums_columns(partials['sector'])
+    category_means = sums_means(partials['sector'], categories, context['weighted'])
+    for category_name in categories:
+        if 'Rural' in category_means.index:
+            rural_totals[category_name] = category_means.at['Rural', category_name]
+        if 'Urban' in category_means.index:
+            urban_totals[category_name] = category_means.at['Urban', category_name]
 
     # Calculate total for normalization
     rural_total_expenditure = sum(rural_totals.values())
@@ -358,93 +2742,146 @@ async def get_rural_urban_comparison():
             'value': urban_totals[category_name],
             'percentage': urban_percentage
         })
-    # Processed and packaged food
+    return category_expenditure
+
+@shard_partial('sector', 'served_processed_food_monthly_total_value', 'packaged_processed_food_monthly_total_value')
+def rural_urban_processed_food_partials(df, context):
+    """Processed and packaged food expenditure sums by sector"""
+    return {'sector': grouped_sums(df, 'sector', ['served_processed_food_monthly_total_value',
+                                                  'packaged_processed_food_monthly_total_value'], context['weighted'])}
+
+def rural_urban_processed_food(partials, context):
+    """Processed and packaged food expenditure by sector"""
     processed_food_by_sector = (
-        df.groupby('sector')[['served_processed_food_monthly_total_value', 'packaged_processed_food_monthly_total_value']]
-        .mean()
+        sums_means(partials['sector'], sums_columns(partials['sector']), context['weighted'])
         .reset_index()
     )
-    processed_food_by_sector = clean_json_values(processed_food_by_sector)
-    
-    # Meals data
+    return clean_json_values(processed_food_by_sector)
+
+@shard_partial(
+    'sector', 'total_meals_daily', 'total_meals_school', 'total_meals_employer', 'total_meals_home',
+    'avg_meals_per_person', 'meal_diversity'
+)
+def rural_urban_meals_partials(df, context):
+    """Meal sums by sector"""
+    return {'sector': grouped_sums(df, 'sector', ['total_meals_daily', 'total_meals_school', 'total_meals_employer',
+                                                  'total_meals_home', 'avg_meals_per_person',
+                                                  'meal_diversity'], context['weighted'])}
+
+def rural_urban_meals(partials, context):
+    """Meals by sector"""
     meals_by_sector = (
-        df.groupby('sector')[['total_meals_daily', 'total_meals_school', 'total_meals_employer', 
-                               'total_meals_home', 'avg_meals_per_person',
-                              'meal_diversity']]
-        .mean()
+        sums_means(partials['sector'], sums_columns(partials['sector']), context['weighted'])
         .reset_index()
     )
-    meals_by_sector = clean_json_values(meals_by_sector)
-    
-    # Ration card types
-    if 'type_rationcard' in df.columns:
-        # Use the specific values you provided
-        ration_types = ["AAY", "BPL", "APL", "PHH", "SFSS", "Others", "No ration card"]
-        ration_data = []
-        
-        for ration_type in ration_types:
-            for sector in ['Rural', 'Urban']:
-                sector_data = df[df['sector'] == sector]
-                if not sector_data.empty:
-                    # Count households with this ration card type
-                    count = len(sector_data[sector_data['type_rationcard'] == ration_type])
-                    # Calculate percentage
-                    percentage = (count / len(sector_data)) * 100
-                    ration_data.append({
-                        'ration_type': ration_type,
-                        'sector': sector,
-                        'count': count,
-                        'percentage': percentage
-                    })
-    else:
-        ration_data = []
+    return clean_json_values(meals_by_sector)
+
+@shard_partial('sector', 'type_rationcard')
+def rural_urban_ration_partials(df, context):
+    """Households and weights by sector and ration card type, and by sector"""
+    if 'type_rationcard' not in df.columns:
+        return None
+    return {
+        'shares': grouped_sums(df, ['sector', 'type_rationcard'], [], context['weighted']),
+        'sector': grouped_sums(df, 'sector', [], context['weighted'])
+    }
+
+def rural_urban_ration(partials, context):
+    """Ration card types by sector"""
+    if partials is None:
+        return []
+    # Use the specific values you provided
+    ration_types = ["AAY", "BPL", "APL", "PHH", "SFSS", "Others", "No ration card"]
+    ration_data = []
+    ration_shares = sums_shares(partials['shares'], partials['sector'], context['weighted'])
+    sectors_present = partials['sector'].index
     
-    # Cooking source data
-    if 'source_cooking' in df.columns:
-        cooking_sources = df['source_cooking'].unique().tolist()
-        cooking_data = []
-        
-        for source in cooking_sources:
-            for sector in ['Rural', 'Urban']:
-                sector_data = df[df['sector'] == sector]
-                if not sector_data.empty:
-                    count = len(sector_data[sector_data['source_cooking'] == source])
-                    percentage = (count / len(sector_data)) * 100
-                    cooking_data.append({
-                        'source': source,
-                        'sector': sector,
-                        'count': count,
-                        'percentage': percentage
-                    })
-    else:
-        cooking_data = []
+    for ration_type in ration_types:
+        for sector in ['Rural', 'Urban']:
+            if sector in sectors_present:
+                # Count and share of households with this ration card type
+                if (sector, ration_type) in ration_shares.index:
+                    count, percentage = ration_shares.loc[(sector, ration_type), ['count', 'percentage']]
+                else:
+                    count, percentage = 0, 0.0
+                ration_data.append({
+                    'ration_type': ration_type,
+                    'sector': sector,
+                    'count': int(count),
+                    'percentage': percentage
+                })
+    return ration_data
+
+@shard_partial('sector', 'source_cooking')
+def rural_urban_cooking_partials(df, context):
+    """Households and weights by sector and cooking source, and by sector, and the order the sources appear in"""
+    if 'source_cooking' not in df.columns:
+        return None
+    return {
+        'shares': grouped_sums(df, ['sector', 'source_cooking'], [], context['weighted']),
+        'sector': grouped_sums(df, 'sector', [], context['weighted']),
+        'order': first_rows(df, 'source_cooking')
+    }
+
+def rural_urban_cooking(partials, context):
+    """Cooking sources by sector"""
+    if partials is None:
+        return []
+    cooking_sources = partials['order'].sort_values('first').index.tolist()
+    cooking_data = []
+    cooking_shares = sums_shares(partials['shares'], partials['sector'], context['weighted'])
+    sectors_present = partials['sector'].index
     
-    # Transport mode data (based on vehicle ownership)
+    for source in cooking_sources:
+        for sector in ['Rural', 'Urban']:
+            if sector in sectors_present:
+                if (sector, source) in cooking_shares.index:
+                    count, percentage = cooking_shares.loc[(sector, source), ['count', 'percentage']]
+                else:
+                    count, percentage = 0, 0.0
+                cooking_data.append({
+                    'source': source,
+                    'sector': sector,
+                    'count': int(count),
+                    'percentage': percentage
+                })
+    return cooking_data
+
+@shard_partial('sector', 'has_bicycle', 'has_bike', 'has_car', 'has_truck', 'has_animalcart')
+def rural_urban_transport_partials(df, context):
+    """Vehicle ownership sums by sector"""
     transport_columns = ['has_bicycle', 'has_bike', 'has_car', 'has_truck', 'has_animalcart']
+    return {'sector': grouped_sums(df, 'sector', [col for col in transport_columns if col in df.columns],
+                                   context['weighted'])}
+
+def rural_urban_transport(partials, context):
+    """Transport modes by sector, from vehicle ownership"""
     transport_data = []
+    transport_columns = sums_columns(partials['sector'])
+    ownership_by_sector = sums_means(partials['sector'], transport_columns, context['weighted'])
     
     for column in transport_columns:
-        if column in df.columns:
-            for sector in ['Rural', 'Urban']:
-                sector_data = df[df['sector'] == sector]
-                if not sector_data.empty:
-                    ownership_rate = sector_data[column].mean() * 100
-                    transport_name = column.replace('has_', '')
-                    transport_data.append({
-                        'transport_mode': transport_name,
-                        'sector': sector,
-                        'ownership_rate': ownership_rate
-                    })
-    
-    # Digital access comparison
+        for sector in ['Rural', 'Urban']:
+            if sector in ownership_by_sector.index:
+                ownership_rate = ownership_by_sector.at[sector, column] * 100
+                transport_name = column.replace('has_', '')
+                transport_data.append({
+                    'transport_mode': transport_name,
+                    'sector': sector,
+                    'ownership_rate': ownership_rate
+                })
+    return transport_data
+
+@shard_partial('sector', 'has_internet', 'has_mobile', 'has_laptop', 'total_online_expenditure')
+def rural_urban_digital_access_partials(df, context):
+    """Digital access sums by sector"""
+    return {'sector': grouped_sums(df, 'sector', ['has_internet', 'has_mobile', 'has_laptop', 'total_online_expenditure'],
+                                   context['weighted'])}
+
+def rural_urban_digital_access(partials, context):
+    """Digital access by sector"""
     digital_access = (
-        df.groupby('sector')[['has_internet', 'has_mobile', 'has_laptop', 'total_online_expenditure']]
-        .agg({
-            'has_internet': 'mean',
-            'has_mobile': 'mean',
-            'has_laptop': 'mean',
-            'total_online_expenditure': 'mean'
-        })
+        sums_means(partials['sector'], sums_columns(partials['sector']), context['weighted'])
         .reset_index()
         .rename(columns={
             'has_internet': 'internet_access_rate',
@@ -453,20 +2890,17 @@ async def get_rural_urban_comparison():
             'total_online_expenditure': 'avg_online_expenditure'
         })
     )
-    digital_access = clean_json_values(digital_access)
-    
-    # Essential services comparison
-    df['has_electricity'] = (df['source_lighting'] == 'Electricity').astype(int)
-    df['has_piped_water'] = df['source_water'].str.contains('Piped water').astype(int)
-    df['has_toilet'] = (df['level_access_latrine'] != 'No access').astype(int)
-    
+    return clean_json_values(digital_access)
+
+@shard_partial('sector', 'has_electricity', 'has_piped_water', 'has_toilet')
+def rural_urban_essential_services_partials(df, context):
+    """Essential services access sums by sector; the access columns are derived at load time"""
+    return {'sector': grouped_sums(df, 'sector', ['has_electricity', 'has_piped_water', 'has_toilet'], context['weighted'])}
+
+def rural_urban_essential_services(partials, context):
+    """Essential services access by sector"""
     essential_services = (
-        df.groupby('sector')[['has_electricity', 'has_piped_water', 'has_toilet']]
-        .agg({
-            'has_electricity': 'mean',
-            'has_piped_water': 'mean',
-            'has_toilet': 'mean'
-        })
+        sums_means(partials['sector'], sums_columns(partials['sector']), context['weighted'])
         .reset_index()
         .rename(columns={
             'has_electricity': 'electricity_access_rate',
@@ -474,17 +2908,18 @@ async def get_rural_urban_comparison():
             'has_toilet': 'toilet_access_rate'
         })
     )
-    essential_services = clean_json_values(essential_services)
-    
-    # Government program participation
+    return clean_json_values(essential_services)
+
+@shard_partial('sector', 'has_pmgky', 'is_hhmem_pmjay', 'receieved_subsidy_lpg', 'received_free_electricity')
+def rural_urban_govt_programs_partials(df, context):
+    """Government program participation sums by sector"""
+    return {'sector': grouped_sums(df, 'sector', ['has_pmgky', 'is_hhmem_pmjay', 'receieved_subsidy_lpg',
+                                                  'received_free_electricity'], context['weighted'])}
+
+def rural_urban_govt_programs(partials, context):
+    """Government program participation by sector"""
     govt_programs = (
-        df.groupby('sector')[['has_pmgky', 'is_hhmem_pmjay', 'receieved_subsidy_lpg', 'received_free_electricity']]
-        .agg({
-            'has_pmgky': 'mean',
-            'is_hhmem_pmjay': 'mean',
-            'receieved_subsidy_lpg': 'mean',
-            'received_free_electricity': 'mean'
-        })
+        sums_means(partials['sector'], sums_columns(partials['sector']), context['weighted'])
         .reset_index()
         .rename(columns={
             'has_pmgky': 'pmgky_participation_rate',
@@ -493,37 +2928,84 @@ async def get_rural_urban_comparison():
             'received_free_electricity': 'free_electricity_rate'
         })
     )
-    govt_programs = clean_json_values(govt_programs)
+    return clean_json_values(govt_programs)
+
+RURAL_URBAN_SECTIONS = {
+    "expenditure": (rural_urban_expenditure_partials, rural_urban_expenditure),
+    "foodPercentage": (rural_urban_food_percentage_partials, rural_urban_food_percentage),
+    "categoryExpenditure": (rural_urban_category_expenditure_partials, rural_urban_category_expenditure),
+    "processedFood": (rural_urban_processed_food_partials, rural_urban_processed_food),
+    "meals": (rural_urban_meals_partials, rural_urban_meals),
+    "rationData": (rural_urban_ration_partials, rural_urban_ration),
+    "cookingData": (rural_urban_cooking_partials, rural_urban_cooking),
+    "transportData": (rural_urban_transport_partials, rural_urban_transport),
+    "digitalAccess": (rural_urban_digital_access_partials, rural_urban_digital_access),
+    "essentialServices": (rural_urban_essential_services_partials, rural_urban_essential_services),
+    "govtPrograms": (rural_urban_govt_programs_partials, rural_urban_govt_programs)
+}
+
+@app.get("/api/rural-urban-comparison")
+@single_flight
+async def get_rural_urban_comparison(weighted: bool = False, fields: Optional[str] = None,
+                                     round: Optional[str] = None,
+                                     filters: tuple = Depends(row_filters)):
+    """
+    Get comparison data between rural and urban sectors.
+    fields is a comma-separated list of the response sections to compute (default: all).
+    """
+    context = {'weighted': weighted, 'round': round}
+    cache_key = None if filters else (weighted,)
+    return respond(dashboard_sections('rural_urban_comparison', RURAL_URBAN_SECTIONS, fields, round, filters,
+                                      context, cache_key))
+
+@shard_partial(
+    'hh_type', 'household_reported_monthly_exp', 'food_monthly_value', 'avg_edu_years',
+    'pan_monthly_value', 'tobacco_monthly_value', 'intoxicants_monthly_value',
+    'has_tv', 'has_fridge', 'has_washingmachine', 'has_ac', 'has_computer', 'has_laptop',
+    'has_internet', 'has_mobile', 'has_bike', 'has_car'
+)
+def household_type_partials(df, context):
+    """Partials of /api/household-type-comparison"""
+    weighted = context['weighted']
     
-    # Prepare response
-    response = {
-        "expenditure": expenditure_by_sector.to_dict('records'),
-        "foodPercentage": food_pct_by_sector.to_dict('records'),
-        "categoryExpenditure": category_expenditure,
-        "processedFood": processed_food_by_sector.to_dict('records'),
-        "meals": meals_by_sector.to_dict('records'),
-        "rationData": ration_data,
-        "cookingData": cooking_data,
-        "transportData": transport_data,
-        "digitalAccess": digital_access.to_dict('records'),
-        "essentialServices": essential_services.to_dict('records'),
-        "govtPrograms": govt_programs.to_dict('records')
-    }
+    # Assets on a local frame, so the round frame is left as loaded; 'has_computer'
+    # might be 'has_laptop' in the data
+    asset_columns = [
+        'has_tv', 'has_fridge', 'has_washingmachine', 'has_ac',
+        'has_computer', 'has_internet', 'has_mobile',
+        'has_bike', 'has_car'
+    ]
+    assets = sums_frame(df, {col: df[col] for col in ['hh_type', *asset_columns] if col in df.columns})
+    if 'has_laptop' in df.columns and 'has_computer' not in assets.columns:
+        assets['has_computer'] = df['has_laptop']
     
-    return response
+    # Non-essentials, from the food total derived at load time (add_derived_columns)
+    non_essential_columns = ['pan_monthly_value', 'tobacco_monthly_value', 'intoxicants_monthly_value']
+    non_essential = sums_frame(df, {
+        'hh_type': df['hh_type'],
+        'non_essential_monthly_value': df[non_essential_columns].sum(axis=1),
+        'household_reported_monthly_exp': df['household_reported_monthly_exp']
+    })
+    return {
+        'expenditure': value_histogram(df, 'hh_type', 'household_reported_monthly_exp', weighted),
+        'food': grouped_sums(df, 'hh_type', ['food_monthly_value', 'household_reported_monthly_exp'], weighted),
+        'assets': grouped_sums(assets, 'hh_type', [col for col in asset_columns if col in assets.columns], weighted),
+        'order': first_rows(df, 'hh_type'),
+        'education': grouped_sums(df, 'hh_type', ['avg_edu_years'], weighted),
+        'non_essential': grouped_sums(non_essential, 'hh_type',
+                                      ['non_essential_monthly_value', 'household_reported_monthly_exp'], weighted)
+    }
 
 @app.get("/api/household-type-comparison")
-async def get_household_type_comparison():
+@single_flight
+async def get_household_type_comparison(weighted: bool = False, round: Optional[str] = None,
+                                        filters: tuple = Depends(row_filters)):
     """Get comparison data between different household types"""
-    if not hasattr(app.state, 'df') or app.state.df.empty:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    df = app.state.df
+    partials, = round_partials(round, filters, {'weighted': weighted}, household_type_partials)
     
     # Expenditure by household type
     expenditure_by_type = (
-        df.groupby('hh_type')['household_reported_monthly_exp']
-        .agg(['mean', 'median', 'count'])
+        histogram_stats(partials['expenditure'], ['mean', 'median', 'count'], weighted)
         .reset_index()
         .rename(columns={
             'mean': 'avg_monthly_exp',
@@ -534,63 +3016,37 @@ async def get_household_type_comparison():
     )
     expenditure_by_type = clean_json_values(expenditure_by_type)
     
-    # Calculate food expenditure
-    food_columns = [
-        'cereals_monthly_total_value', 'pulses_monthly_total_value',
-        'milk_products_monthly_total_value', 'edible_oils_monthly_total_value',
-        'egg_fish_meat_monthly_total_value', 'vegetables_monthly_total_value',
-        'fruits_fresh_monthly_total_value', 'fruits_dry_monthly_total_value',
-        'spices_monthly_total_value', 'salt_sugar_monthly_total_value',
-        'beverages_monthly_total_value'
-    ]
-    
-    df['food_monthly_value'] = df[food_columns].sum(axis=1)
-    
     # Food expenditure by household type
     food_exp_by_type = (
-        df.groupby('hh_type')[['food_monthly_value', 'household_reported_monthly_exp']]
-        .agg({
-            'food_monthly_value': 'mean',
-            'household_reported_monthly_exp': 'mean'
-        })
+        sums_means(partials['food'], ['food_monthly_value', 'household_reported_monthly_exp'], weighted)
         .reset_index()
     )
     
     food_exp_by_type['food_pct'] = (food_exp_by_type['food_monthly_value'] / food_exp_by_type['household_reported_monthly_exp']) * 100
     food_exp_by_type = clean_json_values(food_exp_by_type)
     
-        # Asset ownership by household type
-    asset_columns = [
-        'has_tv', 'has_fridge', 'has_washingmachine', 'has_ac',
-        'has_computer', 'has_internet', 'has_mobile',
-        'has_bike', 'has_car'
-    ]
-
-    # Ensure 'has_computer' exists (might be 'has_laptop' in the data)
-    if 'has_laptop' in df.columns and 'has_computer' not in df.columns:
-        df['has_computer'] = df['has_laptop']
-
+    # Asset ownership by household type, in the order the types appear in
+    asset_columns = sums_columns(partials['assets'])
+    hh_types = partials['order'].sort_values('first').index
     asset_ownership = []
+    ownership_by_type = sums_means(partials['assets'], asset_columns, weighted)
     for asset in asset_columns:
-        if asset in df.columns:
-            for hh_type in df['hh_type'].unique():
-                hh_type_data = df[df['hh_type'] == hh_type]
-                if not hh_type_data.empty:
-                    ownership_rate = hh_type_data[asset].mean()
-                    asset_name = asset.replace('has_', '')
-                    asset_ownership.append({
-                        'hh_type': hh_type,
-                        'asset': asset_name,
-                        'ownership_rate': ownership_rate
-                    })
+        for hh_type in hh_types:
+            if hh_type in ownership_by_type.index:
+                ownership_rate = ownership_by_type.at[hh_type, asset]
+                asset_name = asset.replace('has_', '')
+                asset_ownership.append({
+                    'hh_type': hh_type,
+                    'asset': asset_name,
+                    'ownership_rate': ownership_rate
+                })
 
     asset_ownership_df = pd.DataFrame(asset_ownership)
     asset_ownership_df = clean_json_values(asset_ownership_df)
     
     # Education by household type
     education_by_type = (
-        df.groupby('hh_type')['avg_edu_years']
-        .mean()
+        sums_means(partials['education'], 'avg_edu_years', weighted)
         .reset_index()
         .rename(columns={'avg_edu_years': 'avg_education_years'})
         .sort_values('avg_education_years', ascending=False)
@@ -598,16 +3054,8 @@ async def get_household_type_comparison():
     education_by_type = clean_json_values(education_by_type)
     
     # Expenditure on non-essentials by household type
-    non_essential_columns = ['pan_monthly_value', 'tobacco_monthly_value', 'intoxicants_monthly_value']
-    
-    df['non_essential_monthly_value'] = df[non_essential_columns].sum(axis=1)
-    
     non_essential_by_type = (
-        df.groupby('hh_type')[['non_essential_monthly_value', 'household_reported_monthly_exp']]
-        .agg({
-            'non_essential_monthly_value': 'mean',
-            'household_reported_monthly_exp': 'mean'
-        })
+        sums_means(partials['non_essential'], ['non_essential_monthly_value', 'household_reported_monthly_exp'], weighted)
         .reset_index()
     )
     
@@ -616,31 +3064,63 @@ async def get_household_type_comparison():
     
     # Prepare response
     response = {
-        "expenditureByType": expenditure_by_type.to_dict('records'),
-        "foodExpenditureByType": food_exp_by_type[['hh_type', 'food_monthly_value', 'food_pct']].to_dict('records'),
-        "assetOwnershipByType": asset_ownership_df.to_dict('records'),
-        "educationByType": education_by_type.to_dict('records'),
-        "nonEssentialByType": non_essential_by_type[['hh_type', 'non_essential_monthly_value', 'non_essential_pct']].to_dict('records')
+        "expenditureByType": expenditure_by_type,
+        "foodExpenditureByType": food_exp_by_type[['hh_type', 'food_monthly_value', 'food_pct']],
+        "assetOwnershipByType": asset_ownership_df,
+        "educationByType": education_by_type,
+        "nonEssentialByType": non_essential_by_type[['hh_type', 'non_essential_monthly_value', 'non_essential_pct']]
     }
     
-    return response
+    return respond(response)
+
+@shard_partial(
+    'state', 'sector', 'social_group', 'household_reported_monthly_exp',
+    'has_internet', 'has_mobile', 'has_tv', 'has_laptop', 'online_*'
+)
+def digital_inclusion_partials(df, context):
+    """Partials of /api/digital-inclusion"""
+    weighted = context['weighted']
+    online_shopping_cols = [col for col in df.columns if col.startswith('online_') and col not in ['online_expenditure', 'total_online_expenditure']]
+    device_cols = [col for col in ['has_mobile', 'has_tv', 'has_laptop'] if col in df.columns]
+    
+    # Internet access vs expenditure, on a local frame so the round frame is left as loaded
+    internet = sums_frame(df, {
+        'has_internet_bin': df['has_internet'].astype(int),
+        'household_reported_monthly_exp': df['household_reported_monthly_exp']
+    })
+    partials = {
+        'internet': grouped_sums(df, ['sector', 'state'], ['has_internet'], weighted),
+        'social': grouped_sums(df, 'social_group', ['has_internet'], weighted),
+        'usage': grouped_sums(df, None, online_shopping_cols + device_cols, weighted),
+        'internet_expenditure': value_histogram(internet, 'has_internet_bin', 'household_reported_monthly_exp', weighted)
+    }
+    if online_shopping_cols:
+        # Local frame indicating if household does any online shopping; the sums by
+        # expenditure make the expenditure quintiles
+        shopping = sums_frame(df, {
+            'state': df['state'],
+            'does_online_shopping': df[online_shopping_cols].max(axis=1),
+            'household_reported_monthly_exp': df['household_reported_monthly_exp']
+        })
+        partials['shopping_state'] = grouped_sums(shopping, 'state', ['does_online_shopping'], weighted)
+        partials['shopping_expenditure'] = grouped_sums(shopping, 'household_reported_monthly_exp',
+                                                        ['does_online_shopping'], weighted)
+    return partials
 
 @app.get("/api/digital-inclusion")
-async def get_digital_inclusion():
+@single_flight
+async def get_digital_inclusion(weighted: bool = False, round: Optional[str] = None,
+                                filters: tuple = Depends(row_filters)):
     """Get data related to digital inclusion metrics"""
-    if not hasattr(app.state, 'df') or app.state.df.empty:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    df = app.state.df
+    partials, = round_partials(round, filters, {'weighted': weighted}, digital_inclusion_partials)
     
     # Internet access by state
     internet_by_state = []
+    internet_by_sector_state = sums_means(partials['internet'], 'has_internet', weighted)
     for sector in ['Rural', 'Urban']:
-        sector_data = df[df['sector'] == sector]
-        if not sector_data.empty:
+        if sector in internet_by_sector_state.index.get_level_values('sector'):
             state_internet = (
-                sector_data.groupby('state')['has_internet']
-                .mean()
+                internet_by_sector_state.xs(sector, level='sector')
                 .reset_index()
                 .rename(columns={'has_internet': 'internet_access_rate'})
             )
@@ -652,24 +3132,25 @@ async def get_digital_inclusion():
     
     # Internet access by social group
     internet_by_social = (
-        df.groupby('social_group')['has_internet']
-        .agg(['mean', 'count'])
+        pd.DataFrame({
+            'internet_access_rate': sums_means(partials['social'], 'has_internet', weighted),
+            'sample_size': partials['social']['has_internet__n'].astype(np.int64)
+        })
         .reset_index()
-        .rename(columns={'mean': 'internet_access_rate', 'count': 'sample_size'})
         .sort_values('internet_access_rate', ascending=False)
     )
     internet_by_social = clean_json_values(internet_by_social)
     
     # Online shopping categories
-    online_shopping_cols = [col for col in df.columns if col.startswith('online_') and col not in ['online_expenditure', 'total_online_expenditure']]
+    usage = sums_means(partials['usage'], sums_columns(partials['usage']), weighted).loc['All']
+    online_shopping_cols = [col for col in usage.index if col.startswith('online_')]
     
     online_shopping_rates = []
     for col in online_shopping_cols:
         category = col.replace('online_', '').replace('_', ' ').title()
-        rate = df[col].mean() if col in df.columns else 0
         online_shopping_rates.append({
             'category': category,
-            'usage_rate': rate
+            'usage_rate': usage[col]
         })
     
     # Sort by usage rate descending
@@ -677,16 +3158,14 @@ async def get_digital_inclusion():
     
     # Digital device ownership
     digital_devices = [
-        {'device': 'Mobile Phone', 'ownership_rate': df['has_mobile'].mean() if 'has_mobile' in df.columns else 0},
-        {'device': 'Television', 'ownership_rate': df['has_tv'].mean() if 'has_tv' in df.columns else 0},
-        {'device': 'Computer/Laptop', 'ownership_rate': df['has_laptop'].mean() if 'has_laptop' in df.columns else 0}
+        {'device': 'Mobile Phone', 'ownership_rate': usage.get('has_mobile', 0)},
+        {'device': 'Television', 'ownership_rate': usage.get('has_tv', 0)},
+        {'device': 'Computer/Laptop', 'ownership_rate': usage.get('has_laptop', 0)}
     ]
     
     # Internet access vs expenditure
-    df['has_internet_bin'] = df['has_internet'].astype(int)
     internet_vs_expenditure = (
-        df.groupby('has_internet_bin')['household_reported_monthly_exp']
-        .agg(['mean', 'median', 'count'])
+        histogram_stats(partials['internet_expenditure'], ['mean', 'median', 'count'], weighted)
         .reset_index()
         .rename(columns={
             'has_internet_bin': 'has_internet',
@@ -699,12 +3178,8 @@ async def get_digital_inclusion():
     
     # Online shopping by state
     if online_shopping_cols:
-        # Create a column to indicate if household does any online shopping
-        df['does_online_shopping'] = df[online_shopping_cols].max(axis=1)
-        
         online_shopping_by_state = (
-            df.groupby('state')['does_online_shopping']
-            .mean()
+            sums_means(partials['shopping_state'], 'does_online_shopping', weighted)
             .reset_index()
             .rename(columns={'does_online_shopping': 'online_shopping_rate'})
             .sort_values('online_shopping_rate', ascending=False)
@@ -717,20 +3192,21 @@ async def get_digital_inclusion():
     if online_shopping_cols:
         # Create expenditure quintiles (5 groups) for better visualization
         try:
-            df['expenditure_quintile'] = pd.qcut(df['household_reported_monthly_exp'], 5, labels=False)
+            by_expenditure = partials['shopping_expenditure']
+            expenditure_quintile = histogram_bins(by_expenditure, 5, weighted)
             
             # For each quintile, calculate online shopping rate
             online_shopping_vs_expenditure = (
-                df.groupby('expenditure_quintile')['does_online_shopping']
-                .mean()
+                sums_means(by_expenditure.groupby(expenditure_quintile).sum(), 'does_online_shopping', weighted)
+                .rename_axis('expenditure_quintile')
                 .reset_index()
             )
             
             # Add readable labels for expenditure groups
+            quintile_bounds = pd.Series(by_expenditure.index.to_numpy(dtype=float)).groupby(expenditure_quintile).agg(['min', 'max'])
             expenditure_ranges = []
             for i in range(5):
-                lower = df[df['expenditure_quintile'] == i]['household_reported_monthly_exp'].min()
-                upper = df[df['expenditure_quintile'] == i]['household_reported_monthly_exp'].max()
+                lower, upper = quintile_bounds.loc[i, 'min'], quintile_bounds.loc[i, 'max']
                 expenditure_ranges.append((i, f'₹{int(lower)}-₹{int(upper)}'))
             
             for i, label in expenditure_ranges:
@@ -751,78 +3227,98 @@ async def get_digital_inclusion():
     
     # Prepare response
     response = {
-        "internetByState": internet_by_state_df.to_dict('records'),
-        "internetBySocialGroup": internet_by_social.to_dict('records'),
+        "internetByState": internet_by_state_df,
+        "internetBySocialGroup": internet_by_social,
         "onlineShoppingCategories": online_shopping_rates,
         "digitalDeviceOwnership": digital_devices,
-        "internetVsExpenditure": internet_vs_expenditure.to_dict('records'),
-        "onlineShoppingByState": online_shopping_by_state.to_dict('records') if not online_shopping_by_state.empty else [],
-        "onlineShoppingVsExpenditure": online_shopping_vs_expenditure.to_dict('records') if not online_shopping_vs_expenditure.empty else []
+        "internetVsExpenditure": internet_vs_expenditure,
+        "onlineShoppingByState": online_shopping_by_state,
+        "onlineShoppingVsExpenditure": online_shopping_vs_expenditure
     }
     
-    return response
+    return respond(response)
 
-@app.get("/api/essential-services")
-async def get_essential_services(state: Optional[str] = None):
-    """Get data related to essential services access"""
-    if not hasattr(app.state, 'df') or app.state.df.empty:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    df = app.state.df
+@shard_partial(
+    'state', 'sector', 'social_group', 'household_reported_monthly_exp',
+    'has_electricity', 'has_piped_water', 'has_toilet'
+)
+def essential_services_partials(df, context):
+    """Partials of /api/essential-services; the service access columns are derived at load time"""
+    weighted = context['weighted']
+    service_columns = ['has_electricity', 'has_piped_water', 'has_toilet']
     
-    # Create derived columns for essential services using the full dataset
-    full_df = app.state.df  # Keep a reference to the full dataset
-    full_df['has_electricity'] = (full_df['source_lighting'] == 'Electricity').astype(int)
-    full_df['has_piped_water'] = full_df['source_water'].str.contains('Piped water').astype(int)
-    full_df['has_toilet'] = (full_df['level_access_latrine'] != 'No access').astype(int)
+    # Create a service access score (0-3) based on number of services, on a local frame
+    services = sums_frame(df, {
+        'service_access_score': df['has_electricity'] + df['has_piped_water'] + df['has_toilet'],
+        'household_reported_monthly_exp': df['household_reported_monthly_exp']
+    })
+    return {
+        'state': grouped_sums(df, 'state', service_columns, weighted),
+        'sector': grouped_sums(df, 'sector', service_columns, weighted),
+        'social': grouped_sums(df, 'social_group', service_columns, weighted),
+        'expenditure': value_histogram(services, 'service_access_score', 'household_reported_monthly_exp', weighted)
+    }
+
+@app.get("/api/essential-services")
+@single_flight
+async def get_essential_services(state: Optional[str] = None, weighted: bool = False,
+                                 ci: bool = False, ci_level: float = 0.95,
+                                 round: Optional[str] = None,
+                                 filters: tuple = Depends(row_filters)):
+    """
+    Get data related to essential services access.
+    Set ci=true to add bootstrap confidence intervals (at ci_level) to the access rates.
+    """
+    if ci and filters:
+        raise HTTPException(status_code=400, detail="ci=true is not available with household filters")
+    # Select the state(s) together with the household filters, from the bitmap indexes;
+    # the top and bottom states below are ranked over the whole round
+    states = state_filter(state, round)
+    partials, = round_partials(round, filters + states, {'weighted': weighted}, essential_services_partials)
+    partition = survey_round(round)
     
-    # Calculate top and bottom states for each service using the full dataset
+    # Top and bottom states for each service over the whole round, from the ranking index
     top_bottom_states = {}
+    service_columns = ['has_electricity', 'has_piped_water', 'has_toilet']
+    if ci:
+        full_state_intervals = confidence_intervals('state', service_columns, weighted, ci_level, round=round)
     for service_name, service_col in [
         ('electricity', 'has_electricity'),
         ('piped_water', 'has_piped_water'),
         ('toilet', 'has_toilet')
     ]:
-        # Calculate rates by state
-        service_by_state = (
-            full_df.groupby('state')[service_col]
-            .mean()
-            .reset_index()
-            .rename(columns={service_col: 'access_rate'})
-        )
-        service_by_state = clean_json_values(service_by_state)
-        
-        # Get top 5 states
-        top_states = service_by_state.sort_values('access_rate', ascending=False).head(5)
-        
-        # Get bottom 5 states
-        bottom_states = service_by_state.sort_values('access_rate').head(5)
+        top_states, bottom_states = [
+            ranked_states(partition, service_col, weighted, 5, direction=direction)
+            .rename(columns={'value': 'access_rate'})
+            for direction in ('top', 'bottom')
+        ]
+        if ci:
+            top_states, bottom_states = [
+                attach_intervals(data, 'state', full_state_intervals, service_col, 'access_rate')
+                for data in (top_states, bottom_states)
+            ]
+        top_states, bottom_states = clean_json_values(top_states), clean_json_values(bottom_states)
         
         top_bottom_states[service_name] = {
-            'top': top_states.to_dict('records'),
-            'bottom': bottom_states.to_dict('records')
+            'top': top_states,
+            'bottom': bottom_states
         }
     
-    # Now filter the dataset for state-specific analysis if requested
-    if state and state != 'All India':
-        df = df[df['state'] == state]
-        if df.empty:
-            raise HTTPException(status_code=404, detail=f"No data found for state: {state}")
-    
-    # Create derived columns for essential services on the filtered dataset
-    df['has_electricity'] = (df['source_lighting'] == 'Electricity').astype(int)
-    df['has_piped_water'] = df['source_water'].str.contains('Piped water').astype(int)
-    df['has_toilet'] = (df['level_access_latrine'] != 'No access').astype(int)
+    scope = states[0][1] if states else None
     
     # Essential services by state (for filtered state or all states)
     services_by_state = []
-    for service in ['has_electricity', 'has_piped_water', 'has_toilet']:
+    state_service_rates = sums_means(partials['state'], service_columns, weighted)
+    if ci:
+        state_intervals = confidence_intervals('state', service_columns, weighted, ci_level, scope, round)
+    for service in service_columns:
         temp = (
-            df.groupby('state')[service]
-            .mean()
+            state_service_rates[service]
             .reset_index()
             .rename(columns={service: 'access_rate'})
         )
+        if ci:
+            temp = attach_intervals(temp, 'state', state_intervals, service, 'access_rate')
         temp['service'] = service.replace('has_', '')
         services_by_state.append(temp)
     
@@ -831,8 +3327,7 @@ async def get_essential_services(state: Optional[str] = None):
     
     # Essential services by rural/urban
     services_by_sector = (
-        df.groupby('sector')[['has_electricity', 'has_piped_water', 'has_toilet']]
-        .mean()
+        sums_means(partials['sector'], service_columns, weighted)
         .reset_index()
         .rename(columns={
             'has_electricity': 'electricity_access_rate',
@@ -840,12 +3335,16 @@ async def get_essential_services(state: Optional[str] = None):
             'has_toilet': 'toilet_access_rate'
         })
     )
+    if ci:
+        sector_intervals = confidence_intervals('sector', service_columns, weighted, ci_level, scope, round)
+        for service in service_columns:
+            services_by_sector = attach_intervals(services_by_sector, 'sector', sector_intervals, service,
+                                                  f"{service.replace('has_', '')}_access_rate")
     services_by_sector = clean_json_values(services_by_sector)
     
     # Essential services by social group
     services_by_social = (
-        df.groupby('social_group')[['has_electricity', 'has_piped_water', 'has_toilet']]
-        .mean()
+        sums_means(partials['social'], service_columns, weighted)
         .reset_index()
         .rename(columns={
             'has_electricity': 'electricity_access_rate',
@@ -856,15 +3355,8 @@ async def get_essential_services(state: Optional[str] = None):
     services_by_social = clean_json_values(services_by_social)
     
     # Impact of services on expenditure
-    # Create a service access score (0-3) based on number of services
-    df['service_access_score'] = (
-        df['has_electricity'] + df['has_piped_water'] + 
-        df['has_toilet']
-    )
-    
     services_vs_expenditure = (
-        df.groupby('service_access_score')['household_reported_monthly_exp']
-        .agg(['mean', 'median', 'count'])
+        histogram_stats(partials['expenditure'], ['mean', 'median', 'count'], weighted)
         .reset_index()
         .rename(columns={
             'mean': 'avg_monthly_exp',
@@ -876,59 +3368,86 @@ async def get_essential_services(state: Optional[str] = None):
     
     # Prepare response
     response = {
-        "servicesByState": services_by_state_df.to_dict('records'),
-        "servicesBySector": services_by_sector.to_dict('records'),
-        "servicesBySocialGroup": services_by_social.to_dict('records'),
-        "servicesVsExpenditure": services_vs_expenditure.to_dict('records'),
+        "servicesByState": services_by_state_df,
+        "servicesBySector": services_by_sector,
+        "servicesBySocialGroup": services_by_social,
+        "servicesVsExpenditure": services_vs_expenditure,
         "topBottomStates": top_bottom_states
     }
     
-    return response
+    return respond(response)
 
-@app.get("/api/govt-programs")
-async def get_govt_programs(state: Optional[str] = None):
-    """Get data related to government program participation"""
-    if not hasattr(app.state, 'df') or app.state.df.empty:
-        raise HTTPException(status_code=500, detail="Data not loaded")
-    
-    df = app.state.df
-    
-    # Always calculate top and bottom states using all data, regardless of filter
-    all_states_program_data = []
-    for program, col in [
-        ('PMGKY', 'has_pmgky'),
-        ('PMJAY', 'is_hhmem_pmjay'),
-        ('LPG Subsidy', 'receieved_subsidy_lpg'),
-        ('Free Electricity', 'received_free_electricity')
-    ]:
-        if col in df.columns:
-            temp = (
-                df.groupby('state')[col]
-                .mean()
-                .reset_index()
-                .rename(columns={col: 'participation_rate'})
-            )
-            temp['program'] = program
-            all_states_program_data.append(temp)
-    
-    all_states_program_df = pd.concat(all_states_program_data) if all_states_program_data else pd.DataFrame()
-    if not all_states_program_df.empty:
-        all_states_program_df = clean_json_values(all_states_program_df)
+@shard_partial(
+    'state', 'sector', 'social_group', 'household_reported_monthly_exp', 'used_ration',
+    'has_pmgky', 'is_hhmem_pmjay', 'receieved_subsidy_lpg', 'received_free_electricity'
+)
+def govt_programs_partials(df, context):
+    """Partials of /api/govt-programs"""
+    weighted = context['weighted']
+    program_columns = [col for col in ['has_pmgky', 'is_hhmem_pmjay', 'receieved_subsidy_lpg', 'received_free_electricity']
+                       if col in df.columns]
+    partials = {
+        'all': grouped_sums(df, None, program_columns, weighted),
+        'state': grouped_sums(df, 'state', program_columns, weighted),
+        'social': grouped_sums(df, 'social_group', program_columns, weighted),
+        'sector': grouped_sums(df, 'sector', program_columns, weighted)
+    }
+    if program_columns:
+        # Create a program participation score (0-4) based on number of programs
+        participation = sums_frame(df, {
+            'program_participation_score': df[program_columns].sum(axis=1),
+            'household_reported_monthly_exp': df['household_reported_monthly_exp']
+        })
+        partials['expenditure'] = value_histogram(participation, 'program_participation_score',
+                                                  'household_reported_monthly_exp', weighted)
+    if 'used_ration' in df.columns:
+        partials['ration'] = grouped_sums(df, ['social_group', 'sector'], ['used_ration'], weighted)
     
-    # Now filter data for the rest of the analysis if state is provided
-    filtered_df = df
-    if state and state != 'All India':
-        filtered_df = df[df['state'] == state]
-        if filtered_df.empty:
-            raise HTTPException(status_code=404, detail=f"No data found for state: {state}")
+    # Participation sums by expenditure, which make the income quintiles
+    partials['income'] = grouped_sums(df, 'household_reported_monthly_exp', program_columns, weighted)
+    return partials
+
+@app.get("/api/govt-programs")
+@single_flight
+async def get_govt_programs(state: Optional[str] = None, weighted: bool = False,
+                            ci: bool = False, ci_level: float = 0.95,
+                            round: Optional[str] = None,
+                            filters: tuple = Depends(row_filters)):
+    """
+    Get data related to government program participation.
+    Set ci=true to add bootstrap confidence intervals (at ci_level) to the participation rates.
+    """
+    if ci and filters:
+        raise HTTPException(status_code=400, detail="ci=true is not available with household filters")
+    # Select the state(s) together with the household filters, from the bitmap indexes
+    states = state_filter(state, round)
+    partials, = round_partials(round, filters + states, {'weighted': weighted}, govt_programs_partials)
+    program_columns = sums_columns(partials['all'])
+    if ci:
+        all_state_intervals = confidence_intervals('state', program_columns, weighted, ci_level, round=round)
+    scope = states[0][1] if states else None
+    if ci:
+        overall_intervals = confidence_intervals(None, program_columns, weighted, ci_level, scope, round)
+        state_intervals = confidence_intervals('state', program_columns, weighted, ci_level, scope, round)
+        sector_intervals = confidence_intervals('sector', program_columns, weighted, ci_level, scope, round)
     
     # Program participation overall
+    overall = sums_means(partials['all'], program_columns, weighted).loc['All']
     program_participation = [
-        {'program': 'PMGKY', 'participation_rate': filtered_df['has_pmgky'].mean() if 'has_pmgky' in filtered_df.columns else 0},
-        {'program': 'PMJAY', 'participation_rate': filtered_df['is_hhmem_pmjay'].mean() if 'is_hhmem_pmjay' in filtered_df.columns else 0},
-        {'program': 'LPG Subsidy', 'participation_rate': filtered_df['receieved_subsidy_lpg'].mean() if 'receieved_subsidy_lpg' in filtered_df.columns else 0},
-        {'program': 'Free Electricity', 'participation_rate': filtered_df['received_free_electricity'].mean() if 'received_free_electricity' in filtered_df.columns else 0}
+        {'program': 'PMGKY', 'participation_rate': overall.get('has_pmgky', 0)},
+        {'program': 'PMJAY', 'participation_rate': overall.get('is_hhmem_pmjay', 0)},
+        {'program': 'LPG Subsidy', 'participation_rate': overall.get('receieved_subsidy_lpg', 0)},
+        {'program': 'Free Electricity', 'participation_rate': overall.get('received_free_electricity', 0)}
     ]
+    if ci:
+        program_names = {'PMGKY': 'has_pmgky', 'PMJAY': 'is_hhmem_pmjay',
+                         'LPG Subsidy': 'receieved_subsidy_lpg', 'Free Electricity': 'received_free_electricity'}
+        for item in program_participation:
+            col = program_names[item['program']]
+            if col in program_columns:
+                for bound in ['ci_lower', 'ci_upper']:
+                    value = overall_intervals.at['All', f'{col}_{bound}']
+                    item[f'participation_rate_{bound}'] = value if np.isfinite(value) else None
     
     # Program participation by state (for filtered data)
     programs_by_state = []
@@ -938,13 +3457,14 @@ async def get_govt_programs(state: Optional[str] = None):
         ('LPG Subsidy', 'receieved_subsidy_lpg'),
         ('Free Electricity', 'received_free_electricity')
     ]:
-        if col in filtered_df.columns:
+        if col in program_columns:
             temp = (
-                filtered_df.groupby('state')[col]
-                .mean()
+                sums_means(partials['state'], col, weighted)
                 .reset_index()
                 .rename(columns={col: 'participation_rate'})
             )
+            if ci:
+                temp = attach_intervals(temp, 'state', state_intervals, col, 'participation_rate')
             temp['program'] = program
             programs_by_state.append(temp)
     
@@ -960,10 +3480,9 @@ async def get_govt_programs(state: Optional[str] = None):
         ('LPG Subsidy', 'receieved_subsidy_lpg'),
         ('Free Electricity', 'received_free_electricity')
     ]:
-        if col in filtered_df.columns:
+        if col in program_columns:
             temp = (
-                filtered_df.groupby('social_group')[col]
-                .mean()
+                sums_means(partials['social'], col, weighted)
                 .reset_index()
                 .rename(columns={col: 'participation_rate'})
             )
@@ -975,16 +3494,9 @@ async def get_govt_programs(state: Optional[str] = None):
         programs_by_social_df = clean_json_values(programs_by_social_df)
     
     # Impact of programs on expenditure
-    # Create a program participation score (0-4) based on number of programs
-    program_cols = ['has_pmgky', 'is_hhmem_pmjay', 'receieved_subsidy_lpg', 'received_free_electricity']
-    valid_program_cols = [col for col in program_cols if col in filtered_df.columns]
-    
-    if valid_program_cols:
-        filtered_df['program_participation_score'] = filtered_df[valid_program_cols].sum(axis=1)
-        
+    if 'expenditure' in partials:
         programs_vs_expenditure = (
-            filtered_df.groupby('program_participation_score')['household_reported_monthly_exp']
-            .agg(['mean', 'median', 'count'])
+            histogram_stats(partials['expenditure'], ['mean', 'median', 'count'], weighted)
             .reset_index()
             .rename(columns={
                 'mean': 'avg_monthly_exp',
@@ -997,10 +3509,9 @@ async def get_govt_programs(state: Optional[str] = None):
         programs_vs_expenditure = pd.DataFrame()
     
     # Usage of ration system
-    if 'used_ration' in filtered_df.columns:
+    if 'ration' in partials:
         ration_usage = (
-            filtered_df.groupby(['social_group', 'sector'])['used_ration']
-            .mean()
+            sums_means(partials['ration'], 'used_ration', weighted)
             .reset_index()
             .rename(columns={'used_ration': 'ration_usage_rate'})
         )
@@ -1008,20 +3519,34 @@ async def get_govt_programs(state: Optional[str] = None):
     else:
         ration_usage = pd.DataFrame()
     
-    # For top/bottom states, use the all_states_program_df
+    # Top and bottom states always use all data of the round, regardless of filter,
+    # and come from the ranking index
+    partition = survey_round(round)
     top_bottom_states = {}
-    if not all_states_program_df.empty:
-        for program in ['PMGKY', 'PMJAY', 'LPG Subsidy', 'Free Electricity']:
-            program_data = all_states_program_df[all_states_program_df['program'] == program]
-            if not program_data.empty:
-                # Sort for top states
-                top_states = program_data.sort_values('participation_rate', ascending=False).head(5)
-                # Sort for bottom states
-                bottom_states = program_data.sort_values('participation_rate').head(5)
-                
+    for program, col in [
+        ('PMGKY', 'has_pmgky'),
+        ('PMJAY', 'is_hhmem_pmjay'),
+        ('LPG Subsidy', 'receieved_subsidy_lpg'),
+        ('Free Electricity', 'received_free_electricity')
+    ]:
+        if col in program_columns:
+            top_states, bottom_states = [
+                ranked_states(partition, col, weighted, 5, direction=direction)
+                .rename(columns={'value': 'participation_rate'})
+                for direction in ('top', 'bottom')
+            ]
+            if ci:
+                top_states, bottom_states = [
+                    attach_intervals(data, 'state', all_state_intervals, col, 'participation_rate')
+                    for data in (top_states, bottom_states)
+                ]
+            top_states['program'] = program
+            bottom_states['program'] = program
+            top_states, bottom_states = clean_json_values(top_states), clean_json_values(bottom_states)
+            if not top_states.empty:
                 top_bottom_states[program] = {
-                    'top': top_states.to_dict('records'),
-                    'bottom': bottom_states.to_dict('records')
+                    'top': top_states,
+                    'bottom': bottom_states
                 }
     
     # Program participation by sector (rural vs urban)
@@ -1032,13 +3557,14 @@ async def get_govt_programs(state: Optional[str] = None):
         ('LPG Subsidy', 'receieved_subsidy_lpg'),
         ('Free Electricity', 'received_free_electricity')
     ]:
-        if col in filtered_df.columns:
+        if col in program_columns:
             temp = (
-                filtered_df.groupby('sector')[col]
-                .mean()
+                sums_means(partials['sector'], col, weighted)
                 .reset_index()
                 .rename(columns={col: 'participation_rate'})
             )
+            if ci:
+                temp = attach_intervals(temp, 'sector', sector_intervals, col, 'participation_rate')
             temp['program'] = program
             programs_by_sector.append(temp)
     
@@ -1047,12 +3573,11 @@ async def get_govt_programs(state: Optional[str] = None):
         programs_by_sector_df = clean_json_values(programs_by_sector_df)
     
     # Income quintile analysis - FIX THE DUPLICATE EDGES ERROR
+    # The quintiles are those of the expenditure values, summed by quintile
+    by_income = partials['income']
     try:
-        # Use pd.qcut with duplicates='drop' to avoid the duplicate edges error
-        filtered_df['income_quintile'] = pd.qcut(filtered_df['household_reported_monthly_exp'], 
-                                               5, 
-                                               labels=False, 
-                                               duplicates='drop')
+        # Use duplicates='drop' to avoid the duplicate edges error
+        income_quintile = histogram_bins(by_income, 5, weighted, duplicates='drop')
         
         programs_by_income = []
         for program, col in [
@@ -1061,10 +3586,10 @@ async def get_govt_programs(state: Optional[str] = None):
             ('LPG Subsidy', 'receieved_subsidy_lpg'),
             ('Free Electricity', 'received_free_electricity')
         ]:
-            if col in filtered_df.columns:
+            if col in program_columns:
                 temp = (
-                    filtered_df.groupby('income_quintile')[col]
-                    .mean()
+                    sums_means(by_income.groupby(income_quintile).sum(), col, weighted)
+                    .rename_axis('income_quintile')
                     .reset_index()
                     .rename(columns={col: 'participation_rate'})
                 )
@@ -1082,9 +3607,9 @@ async def get_govt_programs(state: Optional[str] = None):
         print(f"Error in income quintile analysis: {e}")
         # If the quintile division fails, use a simpler approach with equal bins
         try:
-            filtered_df['income_quintile'] = pd.cut(filtered_df['household_reported_monthly_exp'], 
-                                                  5, 
-                                                  labels=False)
+            income_quintile = pd.cut(by_income.index.to_numpy(dtype=float), 
+                                     5, 
+                                     labels=False)
             
             programs_by_income = []
             for program, col in [
@@ -1093,10 +3618,10 @@ async def get_govt_programs(state: Optional[str] = None):
                 ('LPG Subsidy', 'receieved_subsidy_lpg'),
                 ('Free Electricity', 'received_free_electricity')
             ]:
-                if col in filtered_df.columns:
+                if col in program_columns:
                     temp = (
-                        filtered_df.groupby('income_quintile')[col]
-                        .mean()
+                        sums_means(by_income.groupby(income_quintile).sum(), col, weighted)
+                        .rename_axis('income_quintile')
                         .reset_index()
                         .rename(columns={col: 'participation_rate'})
                     )
@@ -1117,59 +3642,633 @@ async def get_govt_programs(state: Optional[str] = None):
     # Prepare response
     response = {
         "programParticipation": program_participation,
-        "programsByState": programs_by_state_df.to_dict('records') if not programs_by_state_df.empty else [],
-        "programsBySocialGroup": programs_by_social_df.to_dict('records') if not programs_by_social_df.empty else [],
-        "programsVsExpenditure": programs_vs_expenditure.to_dict('records') if not programs_vs_expenditure.empty else [],
-        "rationUsage": ration_usage.to_dict('records') if not ration_usage.empty else [],
+        "programsByState": programs_by_state_df,
+        "programsBySocialGroup": programs_by_social_df,
+        "programsVsExpenditure": programs_vs_expenditure,
+        "rationUsage": ration_usage,
         "topBottomStates": top_bottom_states,
-        "programsBySector": programs_by_sector_df.to_dict('records') if not programs_by_sector_df.empty else [],
-        "programsByIncome": programs_by_income_df.to_dict('records') if not programs_by_income_df.empty else []
+        "programsBySector": programs_by_sector_df,
+        "programsByIncome": programs_by_income_df
     }
     
-    return response
+    return respond(response)
+
 @app.get("/api/household-size-analysis")
-async def get_household_size_analysis(state: Optional[str] = None):
-    """Get analysis of how household size impacts expenditure"""
-    if not hasattr(app.state, 'df') or app.state.df.empty:
-        raise HTTPException(status_code=500, detail="Data not loaded")
+@single_flight
+async def get_household_size_analysis(state: Optional[str] = None, by_state: bool = False,
+                                      weighted: bool = False, round: Optional[str] = None,
+                                      filters: tuple = Depends(row_filters)):
+    """
+    Get analysis of how household size impacts expenditure: average and per capita
+    expenditure, and the share (%) of spending categories, by household size group.
+    state may list several states (comma-separated); set by_state=true for a table
+    per state, of all states if none is given. Served from the state x size table
+    built at load time.
+    """
+    if filters:
+        partials, = round_partials(round, filters, {'weighted': False}, size_partials)
+        sizes = partials['sizes']
+    else:
+        sizes = survey_round(round)['sizes']
     
-    df = app.state.df
+    # Select the requested states
+    states = split_values(state) if state and state != 'All India' else []
+    if states:
+        in_states = sizes.index.get_level_values('state').isin(states)
+        missing = sorted(set(states) - set(sizes.index.get_level_values('state')[in_states]))
+        if missing:
+            raise HTTPException(status_code=404, detail=f"No data found for state: {', '.join(missing)}")
+        sizes = sizes[in_states]
+    numerator, denominator = ('__wsum', '__w') if weighted else ('__sum', '__n')
+    if weighted and f'household_reported_monthly_exp{numerator}' not in sizes.columns:
+        raise HTTPException(status_code=400, detail=f"Weight column '{WEIGHT_COLUMN}' not found in dataset")
     
-    # Filter by state if provided
-    if state and state != 'All India':
-        df = df[df['state'] == state]
-        if df.empty:
-            raise HTTPException(status_code=404, detail=f"No data found for state: {state}")
+    # Sum the state x size rows of every group and take ratios of the sums
+    keys = ['state', 'size'] if by_state else ['size']
+    totals = sizes.groupby(level=keys).sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = {
+            col: totals[f'{col}{numerator}'] / totals[f'{col}{denominator}']
+            for col in ['household_reported_monthly_exp', 'hh_size', *SIZE_CATEGORIES]
+            if f'{col}{numerator}' in totals.columns
+        }
+    expenditure_by_size = totals.index.to_frame(index=False)
+    expenditure_by_size['expenditure'] = means['household_reported_monthly_exp'].to_numpy()
     
-    # Group households with 6 or more members
-    df['hh_size_group'] = df['hh_size'].apply(lambda x: '6+' if x >= 6 else str(int(x)))
+    # Per capita expenditure; the 6+ group uses its average household size
+    size = expenditure_by_size['size']
+    members = np.where(size == '6+', means['hh_size'].to_numpy(), pd.to_numeric(size, errors='coerce'))
+    expenditure_by_size['perCapitaExpenditure'] = expenditure_by_size['expenditure'] / members
+    for name in SIZE_CATEGORIES:
+        if name in means:
+            expenditure_by_size[name] = (means[name] / means['household_reported_monthly_exp']).to_numpy() * 100
     
-    # Calculate average expenditure by household size
-    expenditure_by_size = (
-        df.groupby('hh_size_group')['household_reported_monthly_exp']
-        .mean()
-        .reset_index()
-        .rename(columns={
-            'hh_size_group': 'size',
-            'household_reported_monthly_exp': 'expenditure'
-        })
-    )
+    # Sort by state and household size
+    expenditure_by_size['order'] = np.where(size == '6+', 6, pd.to_numeric(size, errors='coerce'))
+    expenditure_by_size = expenditure_by_size.sort_values([*keys[:-1], 'order']).drop('order', axis=1)
+    
+    return respond(clean_json_values(expenditure_by_size.reset_index(drop=True)))
+
+@app.get("/api/rounds")
+async def get_rounds():
+    """Get list of the loaded survey rounds"""
+    rounds = getattr(app.state, 'rounds', {})
+    return {
+        "defaultRound": DEFAULT_ROUND,
+        "rounds": [
+            {
+                "round": name,
+                "households": partition['households'],
+                "columnsSkipped": partition['projection']['columnsSkipped'],
+                "bytesSaved": partition['projection']['bytesSaved'],
+                "householdsQuarantined": partition['quarantine']['households'],
+                "violations": partition['quarantine']['violations']
+            }
+            for name, partition in sorted(rounds.items())
+        ]
+    }
+
+@app.post("/api/rounds/refresh")
+async def refresh_rounds():
+    """
+    Load survey rounds added to the rounds directory since startup.
+    Only the new partitions are read and aggregated; loaded rounds keep their
+    aggregates and cached results. The new rounds are prepared on the compute
+    thread, off the event loop, as at startup.
+    """
+    try:
+        added = await asyncio.get_running_loop().run_in_executor(compute_pool(), prepare_new_rounds)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading survey rounds: {e}")
+    return {"added": added, "rounds": sorted(app.state.rounds)}
+
+@app.get("/api/trends")
+@single_flight
+async def get_trends(metric: str = 'household_reported_monthly_exp', by: Optional[str] = None,
+                     state: Optional[str] = None, sector: Optional[str] = None,
+                     weighted: bool = False):
+    """
+    Get a metric across survey rounds, overall or by 'state' or 'sector'.
+    Served from the per-round aggregates, so no household rows are rescanned.
+    """
+    if metric not in TREND_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of: {', '.join(TREND_METRICS)}")
+    if by not in (None, 'state', 'sector'):
+        raise HTTPException(status_code=400, detail="by must be 'state' or 'sector'")
+    
+    numerator, denominator = (f'{metric}__wsum', f'{metric}__w') if weighted else (f'{metric}__sum', f'{metric}__n')
+    trend = []
+    for name, partition in sorted(getattr(app.state, 'rounds', {}).items()):
+        aggregates = partition['aggregates']
+        if aggregates.empty or f'{metric}__n' not in aggregates.columns:
+            continue
+        if weighted and numerator not in aggregates.columns:
+            raise HTTPException(status_code=400, detail=f"Weight column '{WEIGHT_COLUMN}' not available for round: {name}")
+        
+        # Select the state x sector cells of the requested slice
+        selected = np.ones(len(aggregates), dtype=bool)
+        if state and state != 'All India':
+            selected &= np.asarray(aggregates.index.get_level_values('state') == state)
+        if sector:
+            selected &= np.asarray(aggregates.index.get_level_values('sector') == sector)
+        cells = aggregates[selected]
+        if cells.empty:
+            continue
+        
+        # Sum the cells of every group and take the ratio of sums
+        if by is None:
+            keys = np.full(len(cells), 'All', dtype=object)
+        else:
+            keys = np.asarray(cells.index.get_level_values(by), dtype=object)
+        totals = cells.groupby(keys).sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = totals[numerator] / totals[denominator]
+        trend.append(pd.DataFrame({
+            'round': name,
+            by or 'group': totals.index,
+            'value': values.to_numpy(),
+            'households': totals['households'].astype(int).to_numpy()
+        }))
+    
+    if not trend:
+        return {"metric": metric, "rounds": [], "trend": []}
+    trend = clean_json_values(pd.concat(trend, ignore_index=True))
+    return respond({
+        "metric": metric,
+        "rounds": trend['round'].unique().tolist(),
+        "trend": trend
+    })
+
+@app.get("/api/rankings")
+@single_flight
+async def get_rankings(metric: str = 'household_reported_monthly_exp', n: int = Query(5, ge=1),
+                       exclude_uts: bool = False, weighted: bool = False,
+                       round: Optional[str] = None):
+    """
+    Get the top and bottom n states on a metric.
+    Answered by slicing the ranking index built at load time; set exclude_uts=true
+    to leave out Union Territories.
+    """
+    if metric not in RANKING_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of: {', '.join(RANKING_METRICS)}")
+    partition = survey_round(round)
+    rankings = {}
+    for direction in ('top', 'bottom'):
+        ranked = ranked_states(partition, metric, weighted, n, exclude_uts, direction)
+        ranked['rank'] = np.arange(1, len(ranked) + 1)
+        rankings[direction] = clean_json_values(ranked)
+    return respond({"metric": metric, **rankings})
+
+@app.get("/api/distribution")
+@single_flight
+async def get_distribution(metric: str = 'household_reported_monthly_exp', state: Optional[str] = None,
+                           sector: Optional[str] = None, weighted: bool = False,
+                           quantiles: Optional[str] = None, bins: int = Query(20, ge=1, le=1000),
+                           upper_quantile: float = 0.99, lorenz_points: int = Query(20, ge=1, le=1000),
+                           round: Optional[str] = None):
+    """
+    Get the distribution of household or per capita expenditure for all of India, a
+    state, a sector or both: quantiles (comma-separated, default deciles), a histogram
+    of bins up to upper_quantile, the Lorenz curve and the Gini coefficient.
+    Served from the presorted arrays built at load time, so nothing is sorted per request.
+    """
+    if metric not in DISTRIBUTION_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of: {', '.join(DISTRIBUTION_METRICS)}")
+    if not 0 < upper_quantile <= 1:
+        raise HTTPException(status_code=400, detail="upper_quantile must be between 0 and 1")
+    try:
+        q = np.array([float(value) for value in split_values(quantiles)] if quantiles else np.arange(1, 10) / 10)
+    except ValueError:
+        q = np.array([np.nan])
+    if not ((q >= 0) & (q <= 1)).all():
+        raise HTTPException(status_code=400, detail="quantiles must be comma-separated numbers between 0 and 1")
+    state = state if state and state != 'All India' else None
+    not_found = f"No data found for {' / '.join(filter(None, [state, sector]))}"
+    partition = survey_round(round)
+    if partition['df'] is None:
+        # Sharded: the shards' value histograms of the group merge into one entry
+        needed = ['household_reported_monthly_exp', 'hh_size'] if metric == 'per_capita_monthly_exp' else [metric]
+        if not set(needed) <= shard_columns(partition):
+            raise HTTPException(status_code=400, detail=f"Metric not in dataset: {metric}")
+        filters = tuple((col, (value,)) for col, value in [('state', state), ('sector', sector)] if value is not None)
+        try:
+            hist, = round_partials(round, filters, {'weighted': weighted, 'metric': metric}, distribution_partials)
+        except HTTPException as e:
+            if e.status_code == 404:
+                raise HTTPException(status_code=404, detail=not_found)
+            raise
+        if hist['values'].empty:
+            raise HTTPException(status_code=404, detail=not_found)
+        entry, group = histogram_entry(hist['values']), 0
+    else:
+        distributions = partition['distributions']
+        if metric not in distributions:
+            raise HTTPException(status_code=400, detail=f"Metric not in dataset: {metric}")
+        if weighted and 'cum_weights' not in distributions[metric]['all']:
+            raise HTTPException(status_code=400, detail=f"Weight column '{WEIGHT_COLUMN}' not found in dataset")
+        
+        # Find the presorted rows of the requested group
+        grouping, label = {
+            (False, False): ('all', 'All'),
+            (True, False): ('state', state),
+            (False, True): ('sector', sector),
+            (True, True): ('state_sector', (state, sector))
+        }[(state is not None, sector is not None)]
+        entry = distributions[metric][grouping]
+        group = entry['groups'].get(label)
+        if group is None or entry['ends'][group] == entry['starts'][group]:
+            raise HTTPException(status_code=404, detail=not_found)
+    start, end = entry['starts'][group], entry['ends'][group]
+    counts = entry.get('cum_counts')
+    values = entry['values']
+    cum_weights, cum_weighted_values = group_totals(entry, weighted)
+    total_weight = cum_weights[end] - cum_weights[start]
+    total_value = cum_weighted_values[end] - cum_weighted_values[start]
+    
+    # Quantiles from the cumulative weights
+    quantile_values = values[rank_positions(entry, weighted, start, end, q * total_weight)]
+    
+    # Histogram between the smallest value and upper_quantile
+    upper = values[rank_positions(entry, weighted, start, end, np.array([upper_quantile * total_weight]))[0]]
+    edges = np.linspace(values[start], upper, bins + 1)
+    cuts = start + np.searchsorted(values[start:end], edges, side='left')
+    cuts[-1] = start + np.searchsorted(values[start:end], upper, side='right')
+    bin_weights = np.diff(cum_weights[cuts]) if weighted else np.diff(cuts if counts is None else counts[cuts])
+    
+    # Lorenz curve: share of expenditure held by the poorest share of households,
+    # interpolated within the household where each population share falls
+    population = np.arange(lorenz_points + 1) / lorenz_points
+    targets = population * total_weight
+    at = rank_positions(entry, weighted, start, end, targets)
+    below = cum_weights[at] - cum_weights[start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lorenz = (cum_weighted_values[at] - cum_weighted_values[start] + (targets - below) * values[at]) / total_value
+    
+    return respond({
+        "metric": metric,
+        "state": state or 'All India',
+        "sector": sector,
+        "households": int(end - start if counts is None else counts[end] - counts[start]),
+        "mean": finite_or_none(total_value / total_weight),
+        "gini": finite_or_none(entry['gini'][weighted][group]),
+        "quantiles": clean_json_values(pd.DataFrame({'q': q, 'value': quantile_values})),
+        "histogram": clean_json_values(pd.DataFrame({
+            'lower': edges[:-1],
+            'upper': edges[1:],
+            'households': bin_weights,
+            'share': bin_weights / total_weight
+        })),
+        "aboveHistogram": (cum_weights[end] - cum_weights[cuts[-1]]) / total_weight,
+        "lorenz": clean_json_values(pd.DataFrame({'population': population, 'expenditure': lorenz}))
+    })
+
+def fit_regression(n, total, mean, comoment, variables):
+    """
+    Correlations of y (first variable) and the predictors, and the least squares fit
+    of y on them, from the combined moments of a group's households. Survey weights
+    are scaled to sum to the households for the model-based standard errors.
+    """
+    scale = np.sqrt(np.diag(comoment))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlations = comoment / np.outer(scale, scale)
+    result = {
+        'households': n,
+        'correlations': {
+            row: {col: finite_or_none(correlations[i, j]) for j, col in enumerate(variables)}
+            for i, row in enumerate(variables)
+        }
+    }
+    
+    # Slopes from the predictors' co-moments; no fit when they are singular
+    k = len(variables) - 1
+    sxx, sxy, syy = comoment[1:, 1:], comoment[1:, 0], comoment[0, 0]
+    if n <= k + 1 or np.linalg.matrix_rank(sxx) < k:
+        return {**result, 'r2': None, 'residualStdError': None, 'coefficients': None}
+    slopes = np.linalg.solve(sxx, sxy)
+    intercept = mean[0] - slopes @ mean[1:]
+    residual = max(syy - slopes @ sxy, 0.0)
+    sigma2 = residual * n / total / (n - k - 1)
+    inverse = np.linalg.inv(sxx * n / total)
+    errors = np.sqrt(sigma2 * np.concatenate([[1 / n + mean[1:] @ inverse @ mean[1:]], np.diag(inverse)]))
+    return {
+        **result,
+        'r2': finite_or_none(1 - residual / syy),
+        'residualStdError': finite_or_none(np.sqrt(sigma2)),
+        'coefficients': [
+            {'variable': name, 'estimate': finite_or_none(estimate), 'stdError': finite_or_none(error)}
+            for name, estimate, error in zip(['intercept'] + variables[1:], np.concatenate([[intercept], slopes]), errors)
+        ]
+    }
+
+@app.get("/api/regression")
+@single_flight
+async def get_regression(y: str = 'household_reported_monthly_exp', x: str = 'avg_edu_years,hh_size',
+                         by: Optional[str] = None, state: Optional[str] = None, sector: Optional[str] = None,
+                         weighted: bool = False, round: Optional[str] = None):
+    """
+    Get the correlations of y and the predictors x (comma-separated) and the linear
+    regression of y on x, for all of India or the selected states (comma-separated)
+    and sector, or per 'state', 'sector' or 'state_sector' group. Solved by summing
+    the per-cell moment matrices built at load time, so no household rows are scanned;
+    households missing any REGRESSION_VARIABLES are left out.
+    """
+    moments = survey_round(round)['moments']
+    predictors = list(split_values(x))
+    variables = [y] + predictors
+    unknown = [name for name in variables if name not in REGRESSION_VARIABLES]
+    if unknown or not predictors or len(set(variables)) < len(variables):
+        raise HTTPException(status_code=400, detail="y and x must be distinct variables among: "
+                                                    f"{', '.join(REGRESSION_VARIABLES)}")
+    if by not in (None, 'state', 'sector', 'state_sector'):
+        raise HTTPException(status_code=400, detail="by must be 'state', 'sector' or 'state_sector'")
+    missing = [name for name in variables if name not in moments.get('variables', [])]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Variables not in dataset: {', '.join(missing)}")
+    if weighted not in moments:
+        raise HTTPException(status_code=400, detail=f"Weight column '{WEIGHT_COLUMN}' not found in dataset")
     
-    # Calculate per capita expenditure
-    for i, row in expenditure_by_size.iterrows():
-        if row['size'] == '6+':
-            # Estimate average size for 6+ group
-            avg_size = df[df['hh_size'] >= 6]['hh_size'].mean()
-            expenditure_by_size.at[i, 'perCapitaExpenditure'] = row['expenditure'] / avg_size
+    # Select the state x sector cells, and the moments of the requested variables
+    cells = moments['cells']
+    selected = np.ones(len(cells), dtype=bool)
+    states = split_values(state) if state and state != 'All India' else ()
+    if states:
+        selected &= np.asarray(cells.get_level_values('state').isin(states))
+    if sector:
+        selected &= np.asarray(cells.get_level_values('sector') == sector)
+    selected &= moments['households'] > 0
+    if not selected.any():
+        raise HTTPException(status_code=404, detail=f"No data found for {' / '.join(filter(None, [state, sector]))}")
+    positions = [moments['variables'].index(name) for name in variables]
+    subset = {
+        'households': moments['households'],
+        weighted: {
+            'totals': moments[weighted]['totals'],
+            'means': moments[weighted]['means'][:, positions],
+            'comoments': moments[weighted]['comoments'][:, positions][:, :, positions]
+        }
+    }
+    
+    # Combine the cells of every group and fit it
+    keys = {None: [], 'state': ['state'], 'sector': ['sector'], 'state_sector': ['state', 'sector']}[by]
+    chosen = np.flatnonzero(selected)
+    if keys:
+        members = cells[chosen].to_frame(index=False).groupby(keys, observed=True, sort=True).indices
+    else:
+        members = {(): np.arange(len(chosen))}
+    groups = []
+    for label, rows in members.items():
+        in_group = np.zeros(len(cells), dtype=bool)
+        in_group[chosen[rows]] = True
+        label = label if isinstance(label, tuple) else (label,)
+        groups.append({**dict(zip(keys, label)), **fit_regression(*combined_moments(subset, weighted, in_group), variables)})
+    
+    return respond({
+        "y": y,
+        "x": predictors,
+        "state": ', '.join(states) or 'All India',
+        "sector": sector,
+        "groups": groups
+    })
+
+@app.get("/api/estimate")
+@single_flight
+async def get_estimate(metrics: str = 'household_reported_monthly_exp', by: Optional[str] = None,
+                       state: Optional[str] = None, weighted: bool = False, approx: bool = False,
+                       max_error: float = Query(0.01, gt=0), max_ms: Optional[float] = Query(None, gt=0),
+                       ci_level: float = 0.95, round: Optional[str] = None,
+                       filters: tuple = Depends(row_filters)):
+    """
+    Get the means of metrics (comma-separated) for the households matching the state
+    and household filters, overall or by a grouping column, with ci_level intervals.
+    With approx=true they are estimated from the stratified samples, smallest first,
+    until every interval is within max_error of its estimate (relative) or the next
+    sample would take longer than max_ms; once no sample is left, all households are
+    scanned. Exact answers have intervals of zero width.
+    """
+    metrics = list(split_values(metrics))
+    unknown = [metric for metric in metrics if metric not in TREND_METRICS]
+    if not metrics or unknown:
+        raise HTTPException(status_code=400, detail=f"metrics must be among: {', '.join(TREND_METRICS)}")
+    if by is not None and by not in GROUP_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"by must be one of: {', '.join(GROUP_COLUMNS)}")
+    if not 0 < ci_level < 1:
+        raise HTTPException(status_code=400, detail="ci_level must be between 0 and 1")
+    domain = filters + state_filter(state, round)
+    partition = survey_round(round)
+    if partition['df'] is not None:
+        load_columns(partition, metrics + ([by] if by else []) + [col for col, _ in domain])
+        columns = set(partition['df'].columns)
+    else:
+        columns = shard_columns(partition)
+    missing = [metric for metric in metrics if metric not in columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Metrics not in dataset: {', '.join(missing)}")
+    unknown = [col for col in [by] + [col for col, _ in domain] if col is not None and col not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot filter on {unknown[0]}: column not in dataset")
+    if weighted and WEIGHT_COLUMN not in columns:
+        raise HTTPException(status_code=400, detail=f"Weight column '{WEIGHT_COLUMN}' not found in dataset")
+    
+    def estimate(level):
+        """estimate_partials at a sample level (None: all households), one per shard when sharded"""
+        args = {'metrics': metrics, 'by': by, 'domain': domain, 'weighted': weighted, 'level': level}
+        if partition['df'] is not None:
+            return [estimate_partials(partition, **args)]
+        return scatter_gather('estimate', round_name=round or DEFAULT_ROUND, **args)
+    
+    # Try the samples smallest first, then all households
+    z = statistics.NormalDist().inv_cdf((1 + ci_level) / 2)
+    sampled = partition['sample'] is not None if partition['df'] is not None else partition['households'] > 0
+    levels = list(range(len(APPROX_SAMPLE_FRACTIONS))) if approx and sampled else []
+    started = time.perf_counter()
+    target_met = False
+    labels = None
+    for level in levels + [None]:
+        level_started = time.perf_counter()
+        results = estimate(level)
+        if labels is None:
+            # Groups with at least one matching household, found from the bitmap indexes
+            if not any(result['matched'] for result in results):
+                raise HTTPException(status_code=404, detail="No households match the filters")
+            labels = pd.Index(sorted(set().union(*(result['labels'] for result in results))))
+        partials = merge_partials([result['partials'] for result in results if result['partials'] is not None])
+        households, estimates, variances = ratio_estimates(partials, labels, metrics)
+        scanned = sum(result['scanned'] for result in results)
+        if level is None:
+            fraction = 1.0
+            target_met = True
         else:
-            expenditure_by_size.at[i, 'perCapitaExpenditure'] = row['expenditure'] / int(row['size'])
+            fraction = APPROX_SAMPLE_FRACTIONS[level]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                target_met = bool((z * np.sqrt(variances) <= max_error * np.abs(estimates)).all())
+        if target_met:
+            break
+        
+        # Stop when the next sample (or the full scan) is not expected to fit max_ms
+        next_rows = sum(result['next_rows'] for result in results)
+        expected = (time.perf_counter() - level_started) * next_rows / max(scanned, 1)
+        if max_ms is not None and (time.perf_counter() - started + expected) * 1000 > max_ms:
+            break
+    
+    half_width = z * np.sqrt(variances)
+    result = pd.DataFrame({by or 'group': labels, 'households': households})
+    for j, metric in enumerate(metrics):
+        result[metric] = estimates[:, j]
+        result[f'{metric}_ci_lower'] = estimates[:, j] - half_width[:, j]
+        result[f'{metric}_ci_upper'] = estimates[:, j] + half_width[:, j]
+    
+    return respond({
+        "metrics": metrics,
+        "by": by,
+        "approximate": level is not None,
+        "sampleFraction": fraction,
+        "householdsScanned": int(scanned),
+        "ciLevel": ci_level,
+        "maxError": max_error,
+        "targetMet": target_met,
+        "estimates": clean_json_values(result)
+    })
+
+def export_selection(format, columns, state, limit, cursor, round, filters):
+    """
+    Resolve the columns and rows of an export, loading any columns skipped by the
+    column projection; returns the frames to serialise, a frame of none of the rows
+    and the response headers. Runs on the compute thread, which serialises the
+    column loads into the shared round frames.
+    """
+    partition = survey_round(round)
+    sharded = partition['df'] is None
+    
+    # Resolve the columns, loading any skipped by the column projection
+    if sharded:
+        available = shard_columns(partition)
+    else:
+        df = round_frame(round)
+        available = set(df.columns) | set(partition['projection']['columnsSkipped'])
+    if columns:
+        selected = [col.strip() for col in columns.split(',') if col.strip()]
+        unknown = [col for col in selected if col not in available]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    else:
+        selected = partition['columns'] if sharded else df.columns.tolist()
     
-    # Sort by household size
-    size_order = {'1': 0, '2': 1, '3': 2, '4': 3, '5': 4, '6+': 5}
-    expenditure_by_size['order'] = expenditure_by_size['size'].map(size_order)
-    expenditure_by_size = expenditure_by_size.sort_values('order').drop('order', axis=1)
+    # Select rows with the bitmap indexes of the grouping columns, loading any skipped
+    # by the column projection; when sharded, rows are the households' rows in the file
+    domain = filters + state_filter(state, round)
+    if sharded:
+        unknown = [col for col, _ in domain if col not in available]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Cannot filter on {unknown[0]}: column not in dataset")
+        matches = scatter_gather('rows', round_name=round or DEFAULT_ROUND, filters=domain)
+        rows = np.concatenate(matches)
+        owners = np.repeat(np.arange(len(matches)), [len(match) for match in matches])
+        order = np.argsort(rows, kind='stable')
+        rows, owners = rows[order], owners[order]
+    else:
+        df = round_frame(round, selected)
+        rows = filter_rows(partition, domain)
+    
+    # Cursor pagination over the rows
+    headers = {"X-Total-Rows": str(len(rows))}
+    if cursor:
+        after = rows >= decode_cursor(cursor, partition['version'])
+        rows = rows[after]
+        if sharded:
+            owners = owners[after]
+    if limit is not None and len(rows) > limit:
+        headers["X-Next-Cursor"] = encode_cursor(partition['version'], rows[limit])
+        rows = rows[:limit]
+        if sharded:
+            owners = owners[:limit]
+    headers["Content-Disposition"] = f'attachment; filename="hces_export.{format}"'
     
-    return expenditure_by_size.to_dict('records')
+    if sharded:
+        round_name = round or DEFAULT_ROUND
+        empty = app.state.shards[0].request('export', round_name=round_name, columns=selected, rows=rows[:0])
+        return shard_export_frames(round_name, selected, rows, owners), empty, headers
+    # Capture the columns now so the stream is unaffected by later changes to the frame
+    export_columns = {col: df[col] for col in selected}
+    empty = pd.DataFrame({name: series.iloc[:0] for name, series in export_columns.items()})
+    return export_frames(export_columns, rows), empty, headers
+
+@app.get("/api/export")
+async def export_microdata(format: str = 'ndjson', columns: Optional[str] = None,
+                           state: Optional[str] = None, limit: Optional[int] = Query(None, ge=1),
+                           cursor: Optional[str] = None, round: Optional[str] = None,
+                           filters: tuple = Depends(row_filters)):
+    """
+    Stream filtered household rows as NDJSON, CSV or an Arrow IPC stream.
+    columns is a comma-separated list (default: all loaded columns), and so is each
+    filter, matching any of its values. With limit, rows come in pages; the X-Next-Cursor header holds the cursor for the next page.
+    Columns and rows are resolved on the compute thread; only the serialisation is streamed.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if format == 'arrow' and pa is None:
+        raise HTTPException(status_code=406, detail="Arrow export needs pyarrow installed on the server")
+    frames, empty, headers = await asyncio.get_running_loop().run_in_executor(
+        compute_pool(), export_selection, format, columns, state, limit, cursor, round, filters)
+    return StreamingResponse(export_stream(frames, empty, format),
+                             media_type=EXPORT_FORMATS[format], headers=headers)
+
+# Raw survey columns read by each endpoint: those the partials of its sections declare
+# (shard_partial), and those of the indexes it answers from, which are built at load time
+ENDPOINT_COLUMNS = {
+    route: raw_columns(columns)
+    for route, columns in {
+        '/api/states': ['state'],
+        '/api/expenditure-overview': partials_columns(*(partials for partials, _ in OVERVIEW_SECTIONS.values())),
+        '/api/rural-urban-comparison': partials_columns(*(partials for partials, _ in RURAL_URBAN_SECTIONS.values())),
+        '/api/household-type-comparison': household_type_partials.columns,
+        '/api/digital-inclusion': digital_inclusion_partials.columns,
+        '/api/essential-services': essential_services_partials.columns,
+        '/api/govt-programs': govt_programs_partials.columns,
+        '/api/household-size-analysis': size_partials.columns,
+        '/api/distribution': [
+            *(col for columns in DISTRIBUTION_GROUPINGS.values() for col in columns), *distribution_partials.columns
+        ],
+        '/api/regression': [*BOOTSTRAP_STRATA, *REGRESSION_VARIABLES],
+        '/api/trends': ['state', 'sector', *TREND_METRICS],
+        '/api/rankings': ['state', *RANKING_METRICS]
+    }.items()
+}
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Get request coalescing and admission counters per endpoint"""
+    metrics = getattr(app.state, 'single_flight_metrics', {})
+    in_flight = [key[0] for key in getattr(app.state, 'in_flight', {})]
+    admission = admission_state()
+    waiting = [entry[2] for entry in admission['queue'] if not entry[3].done()]
+    return {
+        "singleFlight": {
+            route: {**counts, "inFlight": in_flight.count(route)}
+            for route, counts in metrics.items()
+        },
+        "admission": {
+            route: {
+                **counts,
+                "estimatedMs": round(admission['costs'].get(route, ADMISSION_DEFAULT_COST) * 1000, 1),
+                "running": admission['route_running'].get(route, 0),
+                "waiting": waiting.count(route)
+            }
+            for route, counts in admission['routes'].items()
+        }
+    }
+
+# Registered last so it never shadows the API routes: serves build files and, for
+# client-side routes, the React app
+@app.get("/{full_path:path}")
+async def serve_react_app(full_path: str, request: Request):
+    if full_path == 'api' or full_path.startswith('api/'):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if 'index.html' not in SPA_FILES:
+        return {"message": "React app not built yet"}
+    asset = SPA_FILES.get(full_path) or SPA_FILES['index.html']
+    if request.headers.get('if-none-match') == asset['headers']['ETag']:
+        return Response(status_code=304, headers=asset['headers'])
+    return Response(asset['body'], media_type=asset['media_type'], headers=asset['headers'])
 
 # Run the application
 if __name__ == "__main__":
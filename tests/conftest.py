@@ -0,0 +1,110 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+STATES = ['Kerala', 'Bihar', 'Delhi', 'Punjab', 'Goa', 'Assam', 'Tamil Nadu', 'Gujarat']
+
+def write_survey(path, n=3000, seed=0):
+    """Write a synthetic standardized survey file with the columns the endpoints read"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'state': rng.choice(STATES, n, p=[.15, .2, .08, .12, .05, .12, .14, .14]),
+        'sector': rng.choice(['Rural', 'Urban'], n, p=[.65, .35]),
+        'hh_type': rng.choice(['Self-employed in agriculture', 'Regular wage', 'Casual labour', 'Others'], n),
+        'caste': rng.choice(['ST', 'SC', 'OBC', 'Others'], n),
+        'type_rationcard': rng.choice(['AAY', 'BPL', 'APL', 'PHH', 'No ration card'], n),
+        'source_cooking': rng.choice(['LPG', 'Firewood', 'Kerosene', 'Electricity'], n),
+        'source_lighting': rng.choice(['Electricity', 'Kerosene', 'Solar'], n, p=[.9, .07, .03]),
+        'source_water': rng.choice(['Piped water into dwelling', 'Tube well', 'Piped water to yard', 'Well'], n),
+        'level_access_latrine': rng.choice(['Exclusive use', 'Shared', 'No access'], n),
+        'household_reported_monthly_exp': rng.lognormal(9.5, .6, n).round(0),
+        'hh_size': rng.integers(1, 10, n),
+        'avg_edu_years': rng.uniform(0, 15, n).round(1),
+        'multiplier': rng.uniform(50, 5000, n).round(0),
+    })
+    for item in ['cereals', 'pulses', 'milk_products', 'edible_oils', 'egg_fish_meat', 'vegetables', 'fruits_fresh',
+                 'fruits_dry', 'spices', 'salt_sugar', 'beverages', 'served_processed_food', 'packaged_processed_food']:
+        df[f'{item}_monthly_total_value'] = rng.gamma(2, 300, n).round(1)
+    for item in ['fuel_light', 'clothing', 'footwear', 'medical_hospitalisation', 'medical_non_hospitalisation', 'rent',
+                 'imputed_rent', 'conveyance', 'consumer_services', 'entertainment', 'education', 'personal_goods',
+                 'pan', 'tobacco', 'intoxicants']:
+        df[f'{item}_monthly_value'] = rng.gamma(1.5, 200, n).round(1)
+    for col in ['total_meals_daily', 'total_meals_school', 'total_meals_employer', 'total_meals_home',
+                'avg_meals_per_person', 'meal_diversity']:
+        df[col] = rng.uniform(0, 90, n).round(1)
+    for asset in ['bicycle', 'bike', 'car', 'truck', 'animalcart', 'internet', 'mobile', 'laptop', 'computer', 'tv',
+                  'fridge', 'washingmachine', 'ac', 'pmgky']:
+        df[f'has_{asset}'] = rng.integers(0, 2, n)
+    for col in ['is_hhmem_pmjay', 'receieved_subsidy_lpg', 'received_free_electricity', 'used_ration',
+                'online_clothing', 'online_groceries', 'online_expenditure']:
+        df[col] = rng.integers(0, 2, n)
+    df['total_online_expenditure'] = rng.gamma(1, 100, n).round(1)
+    df['unused_notes'] = 'x'
+    df.to_csv(path, index=False)
+    return df
+
+@pytest.fixture
+def survey_file(tmp_path):
+    """Path of a synthetic survey file"""
+    path = tmp_path / 'hces_data_standardized.csv'
+    write_survey(path)
+    return path
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    """
+    Context manager starting the app on a survey file with settings overriding the
+    module ones, yielding a TestClient once the data is ready
+    """
+    @contextlib.contextmanager
+    def start(data_path, **settings):
+        overrides = {
+            'DATA_PATH': str(data_path), 'ROUNDS_DIR': str(tmp_path / 'rounds'), 'CHECKPOINT_DIR': '',
+            'QUARANTINE_DIR': str(tmp_path / 'quarantine'), 'RESULT_STORE_PATH': '', **settings
+        }
+        with monkeypatch.context() as patch:
+            for name, value in overrides.items():
+                patch.setattr(main, name, value)
+            # Each app starts without the coalescing and admission state of earlier ones
+            main.app.state._state.clear()
+            with TestClient(main.app) as client:
+                for _ in range(600):
+                    if client.get('/readyz').json()['status'] in ('ready', 'failed'):
+                        break
+                    time.sleep(0.05)
+                assert client.get('/readyz').json()['status'] == 'ready'
+                yield client
+
+    return start
+
+@pytest.fixture
+def concurrent_gets():
+    """
+    Send identical GETs from n threads while the compute thread is held, so all of
+    them arrive before the first computation can finish; released once ready(),
+    polled in the meantime, holds or after a timeout. Returns the responses.
+    """
+    def send(client, path, n, ready, timeout=10):
+        release = threading.Event()
+        main.compute_pool().submit(release.wait, timeout)
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            futures = [pool.submit(client.get, path) for _ in range(n)]
+            deadline = time.time() + timeout
+            while not ready() and time.time() < deadline:
+                time.sleep(0.01)
+            release.set()
+            return [future.result() for future in futures]
+
+    return send
@@ -0,0 +1,49 @@
+import asyncio
+
+from fastapi import FastAPI
+
+import main
+
+PATH = '/api/household-type-comparison?weighted=true'
+
+def test_identical_requests_share_one_admission(serve, survey_file, concurrent_gets):
+    """Identical concurrent requests wait for the first one's slots instead of taking their own"""
+    n = 20
+    with serve(survey_file) as client:
+        responses = concurrent_gets(
+            client, PATH, n,
+            ready=lambda: main.admission_state()['routes'].get('/api/household-type-comparison', {}).get('joined') == n - 1
+        )
+        assert {response.status_code for response in responses} == {200}
+        assert len({response.content for response in responses}) == 1
+        admission = client.get('/api/metrics').json()['admission']['/api/household-type-comparison']
+        assert admission['admitted'] == 1
+        assert admission['joined'] == n - 1
+        assert admission['shed'] == 0
+        assert main.app.state.single_flight_metrics['get_household_type_comparison']['computations'] == 1
+
+def test_budgets_follow_compute_threads():
+    assert main.ADMISSION_MAX_CONCURRENT == 2 * main.COMPUTE_THREADS == 2 * main.compute_pool()._max_workers
+    # A single route cannot take every slot
+    assert main.ADMISSION_ROUTE_MAX_CONCURRENT == main.COMPUTE_THREADS < main.ADMISSION_MAX_CONCURRENT
+
+def test_slots_released_when_the_response_starts(monkeypatch):
+    """A streamed body (/api/export) is sent without holding the slots, and is not timed"""
+    monkeypatch.setattr(main, 'app', FastAPI())
+    running = []
+
+    async def streaming(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        running.append(main.admission_state()['running'])
+        await asyncio.sleep(0.2)
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def send(message):
+        pass
+
+    scope = {'type': 'http', 'path': '/api/export', 'query_string': b'format=csv'}
+    asyncio.run(main.AdmissionControl(streaming)(scope, None, send))
+    state = main.admission_state()
+    assert running == [0]
+    assert state['routes']['/api/export']['admitted'] == 1
+    assert state['costs']['/api/export'] < 0.2
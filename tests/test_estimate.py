@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import write_survey
+
+METRICS = ['household_reported_monthly_exp', 'food_monthly_value', 'has_internet']
+
+@pytest.fixture
+def large_survey(tmp_path):
+    """A survey large enough for the samples to hold a few hundred households"""
+    path = tmp_path / 'hces_large.csv'
+    write_survey(path, n=20000, seed=1)
+    return path
+
+def exact_means(df, by, weighted, **filters):
+    """Means of METRICS per group computed directly with pandas"""
+    for col, values in filters.items():
+        df = df[df[col].astype(str).isin(values)]
+    w = df[main.WEIGHT_COLUMN] if weighted else np.ones(len(df))
+    weighted_sums = df[METRICS].mul(w, axis=0).groupby(df[by]).sum()
+    return weighted_sums.div(w.groupby(df[by]).sum() if weighted else df.groupby(by).size(), axis=0)
+
+def estimates(client, **params):
+    query = {'metrics': ','.join(METRICS), 'by': 'state', **params}
+    response = client.get('/api/estimate', params=query)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_exact_estimates_have_zero_width(serve, large_survey, weighted):
+    with serve(large_survey) as client:
+        body = estimates(client, weighted=weighted, sector='Rural', state='Kerala,Goa')
+        expected = exact_means(main.survey_round()['df'], 'state', weighted, sector=['Rural'], state=['Kerala', 'Goa'])
+    assert body['approximate'] is False
+    assert body['sampleFraction'] == 1.0
+    assert [row['state'] for row in body['estimates']] == ['Goa', 'Kerala']
+    for row in body['estimates']:
+        for metric in METRICS:
+            assert row[metric] == pytest.approx(expected.at[row['state'], metric], rel=1e-9)
+            assert row[f'{metric}_ci_lower'] == row[metric] == row[f'{metric}_ci_upper']
+
+@pytest.mark.parametrize('weighted', [False, True])
+def test_sample_intervals_cover_exact_answers(serve, large_survey, monkeypatch, weighted):
+    """Over many seeded 5% samples, the intervals hold the exact means about ci_level of the time"""
+    ci_level, covered, total = 0.9, 0, 0
+    with serve(large_survey) as client:
+        partition = main.survey_round()
+        expected = exact_means(partition['df'], 'state', weighted)
+        monkeypatch.setattr(main, 'APPROX_SAMPLE_FRACTIONS', [0.05])
+        for seed in range(40):
+            monkeypatch.setattr(main, 'APPROX_SEED', seed)
+            partition['sample'] = main.stratified_sample(partition['df'])
+            # A loose max_error stops at the sample
+            body = estimates(client, weighted=weighted, approx=True, max_error=100, ci_level=ci_level)
+            assert body['approximate'] is True and body['sampleFraction'] == main.APPROX_SAMPLE_FRACTIONS[0]
+            for row in body['estimates']:
+                for metric in METRICS:
+                    exact = expected.at[row['state'], metric]
+                    covered += row[f'{metric}_ci_lower'] <= exact <= row[f'{metric}_ci_upper']
+                    total += 1
+    assert total == 40 * len(expected) * len(METRICS)
+    assert abs(covered / total - ci_level) < 0.04, covered / total
+
+def test_tight_max_error_scans_everything(serve, large_survey):
+    with serve(large_survey) as client:
+        body = estimates(client, approx=True, max_error=1e-9)
+    assert body['approximate'] is False
+    assert body['targetMet'] is True
+    assert body['householdsScanned'] == 20000
@@ -0,0 +1,34 @@
+import pytest
+
+import main
+
+# Every endpoint with a column manifest, with some of its options
+ENDPOINT_QUERIES = [
+    f"{route}{query}"
+    for route in main.ENDPOINT_COLUMNS
+    for query in ['', '?weighted=true']
+    if not (route == '/api/states' and query)
+]
+
+def test_projected_responses_match_full_load(serve, survey_file):
+    """Loading only the manifest columns changes no response"""
+    responses = {}
+    for project in (False, True):
+        with serve(survey_file, PROJECT_COLUMNS=project) as client:
+            responses[project] = {path: client.get(path) for path in ENDPOINT_QUERIES}
+    for path in ENDPOINT_QUERIES:
+        full, projected = responses[False][path], responses[True][path]
+        assert projected.status_code == full.status_code, path
+        assert projected.json() == full.json(), path
+
+def test_projection_skips_unused_columns(serve, survey_file):
+    with serve(survey_file, PROJECT_COLUMNS=True):
+        projection = main.survey_round()['projection']
+    assert 'unused_notes' in projection['columnsSkipped']
+    assert 'has_computer' not in projection['columnsSkipped']
+
+def test_partials_load_the_columns_they_declare(serve, survey_file):
+    with serve(survey_file, PROJECT_COLUMNS=True):
+        main.survey_round()['df'].drop(columns=['has_fridge'], inplace=True)
+        main.round_partials(None, (), {'weighted': False}, main.household_type_partials)
+        assert 'has_fridge' in main.survey_round()['df'].columns
@@ -0,0 +1,106 @@
+import pytest
+
+import main
+from conftest import write_survey
+
+PATHS = [
+    '/api/expenditure-overview',
+    '/api/expenditure-overview?state=Kerala&weighted=true',
+    '/api/essential-services?sector=Rural',
+    '/api/essential-services?state=Bihar,Goa&weighted=true',
+    '/api/govt-programs',
+    '/api/govt-programs?state=Goa&weighted=true',
+    '/api/rural-urban-comparison',
+    '/api/rural-urban-comparison?weighted=true',
+    '/api/digital-inclusion',
+    '/api/digital-inclusion?weighted=true&social_group=SC,ST',
+    '/api/household-type-comparison',
+    '/api/household-type-comparison?weighted=true&sector=Urban',
+    '/api/household-size-analysis?sector=Rural&hh_type=Regular wage&by_state=true&weighted=true',
+    '/api/distribution',
+    '/api/distribution?metric=per_capita_monthly_exp&state=Kerala&sector=Rural&weighted=true',
+    '/api/distribution?sector=Urban&quantiles=0.05,0.5,0.95&bins=7',
+    '/api/estimate?metrics=household_reported_monthly_exp,has_internet&by=state',
+    '/api/estimate?metrics=food_monthly_value&by=hh_type&state=Punjab,Assam&weighted=true',
+    '/api/estimate?by=state&approx=true&max_error=100',
+    '/api/estimate?by=sector&approx=true&max_error=100&weighted=true&social_group=OBC',
+    '/api/export?format=csv&state=Delhi,Gujarat&columns=state,sector,hh_size,unused_notes',
+    '/api/export?format=ndjson&sector=Urban&columns=state,multiplier&limit=250',
+]
+
+def assert_close(actual, expected, path):
+    """Equal JSON, numbers up to float rounding from summing partials in another order"""
+    if isinstance(expected, float) and isinstance(actual, (int, float)):
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-12), path
+    elif isinstance(expected, dict):
+        assert isinstance(actual, dict) and actual.keys() == expected.keys(), path
+        for key in expected:
+            assert_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, list):
+        assert isinstance(actual, list) and len(actual) == len(expected), path
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            assert_close(a, e, f"{path}[{i}]")
+    else:
+        assert actual == expected, path
+
+def responses(client):
+    """Status and body of every path, following the export cursors to the end"""
+    bodies = {}
+    for path in PATHS:
+        pages, url = [], path
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200, f"{url}: {response.text}"
+            if path.startswith('/api/export'):
+                pages.append((response.headers['X-Total-Rows'], response.text))
+                cursor = response.headers.get('X-Next-Cursor')
+                url = f"{path}&cursor={cursor}" if cursor else None
+            else:
+                pages.append(response.json())
+                url = None
+        bodies[path] = pages
+    return bodies
+
+@pytest.fixture
+def single_process(serve, survey_file):
+    with serve(survey_file) as client:
+        return responses(client)
+
+@pytest.mark.parametrize('shards', [2, 3])
+def test_sharded_responses_match_single_process(serve, survey_file, single_process, monkeypatch, shards):
+    monkeypatch.setattr(main, '_shard_pool', None)
+    monkeypatch.setattr(main, 'STARTUP_PHASES', ['shards', 'load', 'rounds', 'caches'])
+    # Export pages span several chunks, gathered from several shards each
+    monkeypatch.setattr(main, 'EXPORT_CHUNK_ROWS', 70)
+    with serve(survey_file, SHARDS=shards) as client:
+        sharded = responses(client)
+        assert client.get('/api/expenditure-overview?ci=true').status_code == 501
+    for path, pages in single_process.items():
+        if path.startswith('/api/export'):
+            # Cursors are rows in the file when sharded, so only the pages must agree
+            assert [body for _, body in sharded[path]] == [body for _, body in pages], path
+            assert {total for total, _ in sharded[path]} == {total for total, _ in pages}, path
+        else:
+            assert_close(sharded[path], pages, path)
+
+def test_sharded_distribution_not_found(serve, survey_file, monkeypatch):
+    monkeypatch.setattr(main, '_shard_pool', None)
+    with serve(survey_file, SHARDS=2) as client:
+        response = client.get('/api/distribution?state=Nowhere')
+    assert response.status_code == 404
+    assert response.json()['detail'] == "No data found for Nowhere"
+
+def test_sharded_load_checks_numeric_columns_over_the_whole_file(serve, tmp_path, monkeypatch):
+    """A shard whose values of a numeric column are all bad only quarantines its rows"""
+    monkeypatch.setattr(main, '_shard_pool', None)
+    df = write_survey(tmp_path / 'raw.csv')
+    # Goa is the only state of the second of two shards
+    df = df[df['state'].isin(['Kerala', 'Delhi', 'Assam', 'Gujarat', 'Goa'])]
+    assert {main.shard_of(state, 2) for state in df['state']} == {0, 1}
+    df['avg_edu_years'] = df['avg_edu_years'].where(df['state'] != 'Goa', 'unknown')
+    df.to_csv(tmp_path / 'survey.csv', index=False)
+    with serve(tmp_path / 'survey.csv', SHARDS=2):
+        quarantine = main.survey_round()['quarantine']
+    goa = int((df['state'] == 'Goa').sum())
+    assert quarantine['households'] == goa
+    assert quarantine['violations'] == {'avg_edu_years: not numeric': goa}
@@ -0,0 +1,37 @@
+import main
+
+N = 12
+
+def flight_metrics(route):
+    return getattr(main.app.state, 'single_flight_metrics', {}).get(route, {})
+
+def test_concurrent_identical_requests_compute_once(serve, survey_file, concurrent_gets):
+    """N concurrent identical requests share one computation"""
+    with serve(survey_file) as client:
+        responses = concurrent_gets(client, '/api/govt-programs?state=Kerala', N,
+                                    ready=lambda: flight_metrics('get_govt_programs').get('coalesced') == N - 1)
+        assert {response.status_code for response in responses} == {200}
+        assert len({response.content for response in responses}) == 1
+        metrics = client.get('/api/metrics').json()['singleFlight']['get_govt_programs']
+    assert metrics['computations'] == 1
+    assert metrics['coalesced'] == N - 1
+    assert metrics['inFlight'] == 0
+
+def test_different_parameters_compute_separately(serve, survey_file):
+    with serve(survey_file) as client:
+        for state in ['Kerala', 'Goa', 'Kerala']:
+            assert client.get(f'/api/govt-programs?state={state}').status_code == 200
+        metrics = client.get('/api/metrics').json()['singleFlight']['get_govt_programs']
+    # The repeated query is not in flight any more, and the result store is disabled
+    assert metrics['computations'] == 3
+    assert metrics['coalesced'] == 0
+
+def test_stored_responses_are_reused(serve, survey_file, tmp_path):
+    store = str(tmp_path / 'result_store.sqlite')
+    with serve(survey_file, RESULT_STORE_PATH=store) as client:
+        first = client.get('/api/essential-services?weighted=true')
+    with serve(survey_file, RESULT_STORE_PATH=store) as client:
+        second = client.get('/api/essential-services?weighted=true')
+        metrics = client.get('/api/metrics').json()['singleFlight']['get_essential_services']
+    assert second.content == first.content
+    assert metrics == {'computations': 0, 'coalesced': 0, 'stored': 1, 'inFlight': 0}